@@ -0,0 +1,288 @@
+"""
+ExtIO-Python stream benchmark
+
+Runs the IQStream pipeline against the simulated driver (or replays a
+recording) for every combination of sample format, sample rate, block
+size, queue depth and consumer, and reports sustained throughput,
+callback timing percentiles, overruns and CPU use as JSON. No hardware
+or matplotlib needed.
+
+Paced runs (the default) deliver blocks at the sample rate, like a
+radio, and show whether a setting keeps up; --unpaced delivers them as
+fast as the pipeline accepts them (IQRing.BLOCK policy) to measure the
+headroom.
+
+A results file can be stored as a baseline: with --baseline the run
+fails (exit status 1) when a case is slower, has a worse callback p99
+or more overruns than the baseline allows, or when no case of the run
+is in the baseline. Cases the baseline lacks are listed.
+
+	python benchmark.py --rates 2e6,10e6 --consumers none,copy,spectrogram --output results.json
+	python benchmark.py --baseline results.json
+
+Requires numpy https://numpy.org/
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from extio import *
+from extio.iqstream import SAMPLE_DTYPES
+
+CONSUMERS = ('none', 'copy', 'record', 'spectrogram')
+
+class consumerThread (threading.Thread):
+	""" Reads the stream the way one of the CONSUMERS would """
+
+	def __init__(self, stream, kind, recordPath = None):
+		threading.Thread.__init__(self)
+		self.stop = False
+		self.stream = stream
+		self.kind = kind
+		self.recordPath = recordPath
+		self.blocks = 0
+		self.samples = 0
+		self.torn = 0		# blocks the driver overwrote while they were consumed
+		self.gaps = GapDetector()
+
+	def run(self):
+		stream = self.stream
+		kind = self.kind
+		buffer = None
+		writer = None
+		spectrogram = None
+		decoder = None
+		iqComplex = None
+		while True:
+			ring = stream.ring
+			if ring is not None:
+				entry = ring.peek()
+				while entry is not None:
+					seq, block = entry
+					info = ring.info(seq)
+					if info is not None:
+						self.gaps.check(info, block.shape[0])
+					if kind == 'copy':
+						if buffer is None:
+							buffer = np.empty_like(block)
+						np.copyto(buffer, block)
+					elif kind == 'record':
+						if writer is None:
+							writer = WavWriter(self.recordPath, stream.type, stream.sampleRate)
+						writer.write(block)
+					elif kind == 'spectrogram':
+						if decoder is None:
+							decoder = Decoder(stream.type)
+							spectrogram = Spectrogram(1024)
+							iqComplex = np.empty(block.shape[0], dtype = np.complex64)
+						spectrogram.push(decoder.decode(block, iqComplex))
+					# the view is only good if the slot still holds block seq
+					if not ring.isValid(seq):
+						self.torn += 1
+					ring.advance(seq)
+					self.blocks += 1
+					self.samples += block.shape[0]
+					entry = ring.peek()
+			if self.stop:
+				break
+			stream.wait(timeout = 0.5)
+		if writer is not None:
+			writer.close()
+
+
+def caseKey(case):
+	return (case['driver'], case['hwtype'], case['sampleRate'], case['iqPairs'], case['queueEntries'], case['consumer'], case['paced'])
+
+def runCase(driver, hwtype, sampleRate, iqPairs, queueEntries, consumer, paced, duration, warmup, workDir):
+	""" Streams one configuration for duration seconds, returns its result dict """
+	if driver == 'sim':
+		extIO = SimulatedExtIO(hwtype = ExtIO.ExtHWtype[hwtype], sampleRates = [sampleRate], iqPairs = iqPairs,
+			signal = SimulatedExtIO.NOISE, paced = paced)
+	else:
+		extIO = ReplayExtIO(driver, iqPairs = iqPairs, paced = paced, loop = True)
+	extIO.InitHW()
+
+	policy = IQRing.DROP_NEWEST if paced else IQRing.BLOCK
+	iqStream = IQStream(extIO, list(SAMPLE_DTYPES), queueEntries = queueEntries, policy = policy)
+	extIO.SetCallback(iqStream.iqStreamCallback)
+	extIO.OpenHW()
+	iqStream.type = extIO.hwtype
+	iqStream.sampleRate = iqStream.capabilities.refresh().sampleRate
+
+	recordPath = os.path.join(workDir, 'benchmark.wav')
+	reader = consumerThread(iqStream, consumer, recordPath)
+	reader.start()
+
+	extIO.StartHW(7000000)
+	iqStream.initBuffers()
+	iqStream.enabled = True
+
+	time.sleep(warmup)
+	# measure from here on
+	iqStream.stats.reset()
+	overruns = iqStream.overruns
+	lostSamples = iqStream.lostSamples
+	samples = reader.samples
+	start = time.perf_counter()
+	cpuStart = time.process_time()
+	time.sleep(duration)
+	elapsed = time.perf_counter() - start
+	cpu = time.process_time() - cpuStart
+	samples = reader.samples - samples
+	overruns = iqStream.overruns - overruns
+	lostSamples = iqStream.lostSamples - lostSamples
+	stats = iqStream.stats.snapshot()
+
+	iqStream.enabled = False
+	extIO.StopHW()
+	reader.stop = True
+	iqStream.wake()
+	reader.join()
+	extIO.CloseHW()
+	if os.path.exists(recordPath):
+		os.remove(recordPath)
+
+	execution = stats['execution']
+	return {
+		'driver': 'sim' if driver == 'sim' else 'replay',
+		'hwtype': hwtype if driver == 'sim' else str(extIO.hwtype.name),
+		'sampleRate': iqStream.sampleRate,
+		'iqPairs': extIO.iqPairs,
+		'queueEntries': queueEntries,
+		'consumer': consumer,
+		'paced': paced,
+		'seconds': elapsed,
+		'msps': samples / elapsed / 1e6,
+		'callbackMsps': stats['samplesPerSecond'] / 1e6,
+		'callbackP50Us': (execution['p50'] or 0.0) / 1e3,
+		'callbackP99Us': (execution['p99'] or 0.0) / 1e3,
+		'callbackMaxUs': execution['max'] / 1e3,
+		'deadlineMisses': stats['misses'],
+		'overruns': overruns,
+		'lostSamples': lostSamples,
+		'gaps': reader.gaps.gaps,
+		'tornBlocks': reader.torn,
+		'cpu': cpu / elapsed,
+	}
+
+def caseName(case):
+	return '/'.join(str(value) for value in caseKey(case))
+
+def compare(results, baseline, tolerance, p99SlackUs, overrunSlack):
+	"""
+	Returns (regression descriptions, names of the cases the baseline does
+	not have), both empty if every case was compared and none regressed
+	"""
+	reference = {caseKey(case): case for case in baseline['cases']}
+	regressions = []
+	missing = []
+	for case in results['cases']:
+		base = reference.get(caseKey(case))
+		name = caseName(case)
+		if base is None:
+			missing.append(name)
+			continue
+		if case['msps'] < base['msps'] * (1.0 - tolerance):
+			regressions.append(name + ': ' + format(case['msps'], '.3f') + ' MS/s, baseline ' + format(base['msps'], '.3f'))
+		limit = max(base['callbackP99Us'] * (1.0 + tolerance), base['callbackP99Us'] + p99SlackUs)
+		if case['callbackP99Us'] > limit:
+			regressions.append(name + ': callback p99 ' + format(case['callbackP99Us'], '.1f') + ' us, baseline ' + format(base['callbackP99Us'], '.1f'))
+		if case['overruns'] > base['overruns'] + overrunSlack:
+			regressions.append(name + ': ' + str(case['overruns']) + ' overruns, baseline ' + str(base['overruns']))
+	return regressions, missing
+
+def listOf(kind, text):
+	return [kind(item) for item in text.split(',') if item]
+
+"""
+	Main
+"""
+
+parser = argparse.ArgumentParser(description = 'Benchmark the ExtIO stream pipeline without hardware')
+parser.add_argument('--replay', help = 'replay this recording instead of the simulated radio (hwtype and rate come from it)')
+parser.add_argument('--hwtypes', default = 'USBdata16', help = 'comma separated ExtHWtype names (default USBdata16)')
+parser.add_argument('--rates', default = '2e6', help = 'comma separated sample rates (default 2e6)')
+parser.add_argument('--iqpairs', default = '16384', help = 'comma separated I/Q pairs per callback (default 16384)')
+parser.add_argument('--queues', default = '64', help = 'comma separated ring depths (default 64)')
+parser.add_argument('--consumers', default = ','.join(CONSUMERS), help = 'comma separated consumers from ' + ', '.join(CONSUMERS))
+parser.add_argument('--unpaced', action = 'store_true', help = 'deliver blocks as fast as possible instead of at the sample rate')
+parser.add_argument('--duration', type = float, default = 2.0, help = 'measured seconds per case (default 2)')
+parser.add_argument('--warmup', type = float, default = 0.5, help = 'unmeasured seconds before each case (default 0.5)')
+parser.add_argument('--output', help = 'write the JSON results to this file')
+parser.add_argument('--baseline', help = 'compare with this results file, exit with status 1 on a regression')
+parser.add_argument('--tolerance', type = float, default = 0.1, help = 'allowed relative throughput / p99 change (default 0.1)')
+parser.add_argument('--p99-slack-us', type = float, default = 50.0, help = 'callback p99 increase always allowed, in us (default 50)')
+parser.add_argument('--overrun-slack', type = int, default = 0, help = 'extra overruns allowed per case (default 0)')
+args = parser.parse_args()
+
+consumers = listOf(str, args.consumers)
+for consumer in consumers:
+	if consumer not in CONSUMERS:
+		parser.error('unknown consumer ' + consumer)
+if args.replay:
+	hwtypes = [None]
+	rates = [None]
+	driver = args.replay
+else:
+	hwtypes = listOf(str, args.hwtypes)
+	for hwtype in hwtypes:
+		if hwtype not in ExtIO.ExtHWtype.__members__ or ExtIO.ExtHWtype[hwtype] not in SAMPLE_DTYPES:
+			parser.error('unsupported hwtype ' + hwtype)
+	rates = listOf(float, args.rates)
+	driver = 'sim'
+
+results = {
+	'environment': {
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'platform': platform.platform(),
+		'processor': platform.processor(),
+		'cpus': os.cpu_count(),
+	},
+	'cases': [],
+}
+
+workDir = tempfile.mkdtemp(prefix = 'extio-benchmark-')
+try:
+	for hwtype, rate, iqPairs, queueEntries, consumer in itertools.product(hwtypes, rates, listOf(int, args.iqpairs), listOf(int, args.queues), consumers):
+		case = runCase(driver, hwtype, rate, iqPairs, queueEntries, consumer, not args.unpaced, args.duration, args.warmup, workDir)
+		results['cases'].append(case)
+		print(case['hwtype'] + ' ' + format(case['sampleRate'] / 1e6, 'g') + ' MS/s ' + str(case['iqPairs']) + ' pairs x ' +
+			str(case['queueEntries']) + ' ' + case['consumer'] + ': ' + format(case['msps'], '.3f') + ' MS/s, p99 ' +
+			format(case['callbackP99Us'], '.1f') + ' us, overruns ' + str(case['overruns']) + ', cpu ' + format(case['cpu'] * 100, '.0f') + '%',
+			file = sys.stderr)
+finally:
+	shutil.rmtree(workDir, ignore_errors = True)
+
+if args.output:
+	with open(args.output, 'w') as outputFile:
+		json.dump(results, outputFile, indent = 2)
+else:
+	print(json.dumps(results, indent = 2))
+
+if args.baseline:
+	with open(args.baseline) as baselineFile:
+		baseline = json.load(baselineFile)
+	regressions, missing = compare(results, baseline, args.tolerance, args.p99_slack_us, args.overrun_slack)
+	for name in missing:
+		print('NOT IN BASELINE ' + name, file = sys.stderr)
+	for regression in regressions:
+		print('REGRESSION ' + regression, file = sys.stderr)
+	if regressions:
+		exit(1)
+	compared = len(results['cases']) - len(missing)
+	if compared == 0:
+		# a baseline of a different matrix proves nothing
+		print('No case matches ' + args.baseline + ', nothing was compared', file = sys.stderr)
+		exit(1)
+	print('No regressions against ' + args.baseline + ' (' + str(compared) + ' of ' + str(len(results['cases'])) + ' cases compared)', file = sys.stderr)
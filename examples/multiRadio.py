@@ -0,0 +1,129 @@
+"""
+Example use of ExtIO-Python to record several radios at once
+
+Every radio gets its own stream, ring and WAV file. The first sample of
+each recording is stamped on the shared session clock, so the files can
+be lined up afterwards (printed at the end as sample offsets). Next to
+every WAV file a <file>.json sidecar records the radio's sample index
+of the first sample and when it was taken, on the session clock and as
+UTC wall clock time.
+
+	python multiRadio.py <Frequency in Hertz> <Duration in Seconds> <Path for Record Files> <ExtIO DLL, sim[:hwtype] or replay:file>...
+
+Requires numpy https://numpy.org/
+"""
+
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+from extio import *
+
+class recorderThread (threading.Thread):
+	""" Record one radio's IQ data into a file """
+
+	def __init__(self, radio, fileName):
+		threading.Thread.__init__(self)
+		self.stop = False
+		self.radio = radio
+		self.fileName = fileName
+		self.firstSample = None		# sampleIndex of the first recorded sample
+		self.written = 0
+
+	def run(self):
+		stream = self.radio.stream
+		writer = WavWriter(self.fileName, stream.type, stream.sampleRate)
+		while True:
+			ring = stream.ring
+			if ring is not None:
+				entry = ring.peek()
+				while entry is not None:
+					seq, block = entry
+					if self.firstSample is None:
+						info = ring.info(seq)
+						if info is not None:
+							# blocks written before the first BlockInfo precede it without gaps
+							self.firstSample = info.sampleIndex - self.written
+					writer.write(block)
+					self.written += block.shape[0]
+					ring.advance(seq)
+					entry = ring.peek()
+			if self.stop:
+				break
+			stream.wait(timeout = 1.0)
+		writer.close()
+
+	def writeSidecar(self, session):
+		""" Writes <file>.json with where the recording starts on the shared clock """
+		stream = self.radio.stream
+		startNs = self.radio.timeBase.sampleTimeNs(self.firstSample) if self.firstSample is not None else None
+		meta = {
+			'radio': self.radio.name,
+			'device': str(self.radio.extIO.name),
+			'hwtype': stream.type.name,
+			'sample_rate': stream.sampleRate,
+			'frequency': stream.loFreq,
+			'samples': self.written,
+			'first_sample_index': self.firstSample,
+			'session_start': isoTime(session.startTimeNs),
+			'start_clock_ns': startNs,
+			'start_time': isoTime(session.wallTimeNs(startNs)) if startNs is not None else None,
+		}
+		with open(self.fileName + '.json', 'w') as sidecar:
+			json.dump(meta, sidecar, indent = 2)
+
+def isoTime(timeNs):
+	""" UTC ISO 8601 text of a wall clock time in ns since the epoch """
+	when = datetime.datetime.fromtimestamp(timeNs / 1e9, datetime.timezone.utc)
+	return when.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+"""
+	Main
+"""
+
+if len(sys.argv) < 5:
+	print('usage: python multiRadio.py <Frequency in Hertz> <Duration in Seconds> <Path for Record Files> <ExtIO DLL, sim[:hwtype] or replay:file>...')
+	exit()
+
+frequency = int(sys.argv[1])
+duration = float(sys.argv[2])
+path = sys.argv[3]
+
+with Session(queueEntries = 2048, watermark = 8) as session:
+	for device in sys.argv[4:]:
+		radio = session.add(device)
+		print(radio.name + ': ' + radio.extIO.name + ' ' + str(radio.stream.type) + ' ' + str(radio.stream.sampleRate) + ' S/s')
+
+	recorders = []
+	for radio in session:
+		recorder = recorderThread(radio, os.path.join(path, radio.name + '_' + str(frequency) + 'Hz.wav'))
+		recorder.start()
+		recorders.append(recorder)
+
+	session.start(frequency)
+	print('Recording...')
+	time.sleep(duration)
+	session.stop()
+	for recorder in recorders:
+		recorder.stop = True
+		recorder.radio.stream.wake()
+		recorder.join()
+	print('done.')
+
+	print(session.report())
+	for recorder in recorders:
+		recorder.writeSidecar(session)
+	# when each recording starts on the shared clock, relative to the first radio
+	first = recorders[0]
+	for recorder in recorders:
+		if recorder.firstSample is None:
+			continue
+		startNs = recorder.radio.timeBase.sampleTimeNs(recorder.firstSample)
+		print(recorder.fileName + ' starts at ' + format(startNs / 1e6, '.3f') + ' ms (session clock)')
+		if first.firstSample is not None and recorder is not first:
+			# sample of this file recorded at the same moment as the first file's first sample
+			offset = session.align(first.radio.name, first.firstSample, recorder.radio.name) - recorder.firstSample
+			print('  aligned with ' + first.fileName + ' at sample ' + format(offset, '.1f'))
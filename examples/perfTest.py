@@ -17,77 +17,56 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from extio import *
-import iqStream
 
 class consumerThread (threading.Thread):
 	""" Record IQ data from the queue into a file """
 	""" TODO: Mechanism to handle sample rate/format changes mid stream """
-	global iqStream
 
-	def __init__(self):
+	def __init__(self, stream):
 		threading.Thread.__init__(self)
 		self.stop = False
+		self.stream = stream
 
 	def run(self):
 
+		tempBuffer = None
 		while not(self.stop):
-			while (iqStream.tail != iqStream.head):
-				tempBuffer = np.copy(iqStream.buffer[iqStream.tail])
-				newTail = iqStream.tail + 1
-				if (newTail >= iqStream.queueEntries):
-					newTail = 0
-				iqStream.tail = newTail
-			time.sleep(0.05)
-
+			ring = self.stream.ring
+			if ring is not None:
+				entry = ring.get(tempBuffer)
+				while entry is not None:
+					seq, tempBuffer = entry
+					entry = ring.get(tempBuffer)
+			self.stream.wait(timeout = 1.0)
 
-def extIoCallback(cnt, status, IQoffs, IQdata):
-	""" main function wrapper for the IQ Stream callback method """
-	global iqStream
-	global timeStamp
-	global stampCount
-	global stampMark
-	global callbackTime
-	global deltaTimeMisses
-
-	t1 = time.perf_counter()
-	iqStream.iqStreamCallback(cnt, status, IQoffs, IQdata)
-	if iqStream.enabled:
-		if (cnt > 0):
-			t2 = time.perf_counter()
-			timeStamp.append(t2)
-			dT = t2 - t1
-			callbackTime.append(dT)
-			# miss counts are recorded in iqStream
 
 def perfCallback(cnt, status, IQoffs, IQdata):
-	""" main function wrapper for the IQ Stream callback method """
+	""" callback that only measures itself, the baseline for the stream callback """
 	global iqStream
-	global timeStamp
-	global stampCount
-	global stampMark
-	global callbackTime
-	global deltaTimeMisses
+	global perfStats
 
-	t1 = time.perf_counter()
+	t1 = time.perf_counter_ns()
 	if iqStream.enabled:
 		if (cnt > 0):
-			t2 = time.perf_counter()
-			timeStamp.append(t2)
-			dT = t2 - t1
-			callbackTime.append(dT)
-			if dT > deltaTimeExpected:
-				deltaTimeMisses += 1
+			perfStats.record(t1, time.perf_counter_ns() - t1, extIO.iqPairs)
 
 """
 	Globals
 """
 
 extIO = None
-timeStamp = []
-hwTypesSupported = [ExtIO.ExtHWtype.USBdata16]
+hwTypesSupported = [
+	ExtIO.ExtHWtype.USBdataU8,
+	ExtIO.ExtHWtype.USBdataS8,
+	ExtIO.ExtHWtype.USBdata16,
+	ExtIO.ExtHWtype.USBdata24,
+	ExtIO.ExtHWtype.USBdata32,
+	ExtIO.ExtHWtype.FullPCM32,
+	ExtIO.ExtHWtype.USBfloat32,
+]
 useConsumer = False
-callbackTime = []
-deltaTimeMisses = 0
+# fixed memory histograms, however long the test runs
+perfStats = CallbackStats()
 
 
 """
@@ -95,7 +74,7 @@ deltaTimeMisses = 0
 """
 
 if (len(sys.argv) == 6):
-	extIO = ExtIO(sys.argv[1])
+	extIO = openExtIO(sys.argv[1])
 	frequency = int(sys.argv[2])
 	duration = float(sys.argv[3])	
 	if sys.argv[4] == 'c':
@@ -105,7 +84,7 @@ if (len(sys.argv) == 6):
 	sampleRateIndex = int(sys.argv[5])
 
 else:
-	print('usage: python perfTest.py <ExtIO DLL> <Frequency in Hertz> <Duration in Seconds> <p or c> <sample rate index>')
+	print('usage: python perfTest.py <ExtIO DLL, sim[:hwtype] or replay:file> <Frequency in Hertz> <Duration in Seconds> <p or c> <sample rate index>')
 	exit()
 
 # TODO: Support non-default sample rates
@@ -121,10 +100,10 @@ if extIO.hwtype not in hwTypesSupported:
 	print('[main] Unsupported Hardware Type') 
 	exit()
 
-iqStream.init(_extIO = extIO, _typesSupported = hwTypesSupported, _queueEntries = 2048)
+iqStream = IQStream(extIO, hwTypesSupported, queueEntries = 2048)
 
 if useConsumer:
-	extIO.SetCallback(extIoCallback)
+	extIO.SetCallback(iqStream.iqStreamCallback)
 else:
 	extIO.SetCallback(perfCallback)
 
@@ -134,14 +113,15 @@ extIO.OpenHW()
 # note: some radios allow these to change while streaming
 # the handler would be notified
 iqStream.type = extIO.hwtype
-extIO.ExtIoSetSrate(sampleRateIndex)
-iqStream.sampleRate = extIO.ExtIoGetSrates(extIO.ExtIoGetActualSrateIdx())
+iqStream.capabilities.refresh()
+iqStream.capabilities.setSampleRate(sampleRateIndex)
+iqStream.sampleRate = iqStream.capabilities.sampleRate
 
 print('Sample Rate: ' + str(iqStream.sampleRate))
 
 if useConsumer:
 	print('Using consumer callback')
-	consumer = consumerThread()
+	consumer = consumerThread(iqStream)
 	consumer.start()
 else:
 	print('Using performance callback')
@@ -150,8 +130,8 @@ extIO.StartHW(frequency)
 
 iqStream.initBuffers()
 
-deltaTimeExpected = (extIO.iqPairs)/ iqStream.sampleRate  
 deltaTimeExpectedUs = (extIO.iqPairs * 1e6)/ iqStream.sampleRate  
+perfStats.deadlineNs = iqStream.deltaNsExpected
 print('Delta Time Expected (us) = ' + str(deltaTimeExpectedUs))
 
 iqStream.enabled = True
@@ -166,6 +146,7 @@ extIO.StopHW()
 
 if useConsumer:
 	consumer.stop = True
+	iqStream.wake()
 	consumer.join()
 	print('Callback Hits = ' + str(iqStream.callbackHits))
 	print('Callback Info = ' + str(iqStream.callbackInfo))
@@ -175,40 +156,26 @@ if useConsumer:
 	print('Samples for second = ' + str((extIO.iqPairs * iqStream.callbackData) / duration))
 	print('Overruns = ' + str(iqStream.overruns))
 	print('Delta Time Misses = ' + str(iqStream.callbackMisses))
+	print('Ingest ns per Callback = ' + str(int(iqStream.nsPerCallback)))
+	stats = iqStream.stats
 else:
-	print('Delta Time Misses = ' + str(deltaTimeMisses))
+	stats = perfStats
 
-extIO.CloseHW()
+print(stats.report())
 
-deltaTime = []
-for i in range(1, len(timeStamp)):
-	deltaTime.append(timeStamp[i] - timeStamp[i-1])
-
-"""
-print('deltaTime = [', end='')
-for t in deltaTime[:len(deltaTime)-1]:
-	print(f'{t},', end = '')
-print(f'{deltaTime[-1]}]')
-
-print()
-"""
+extIO.CloseHW()
 
 fig = 0
 
-figure, ax = plt.subplots(3)
-ax[0].set_title('Figure ' + str(fig) + ': Time Stamps (s)')
-fig += 1
-ax[0].plot(timeStamp,'.-')
-
-dT = np.array(deltaTime) * 1.0e6 # microseconds
-ax[1].set_title('Figure ' + str(fig) + ': Delta Times (us)')
-fig += 1
-ax[1].plot(dT,'.-')
-
-cT = np.array(callbackTime) * 1.0e6  # change to microsecond display
-ax[2].set_title('Figure ' + str(fig) + ': Callback Execution Times (us)')
-fig += 1
-ax[2].plot(cT,'.-')
-ax[2].plot(np.full((len(cT),),deltaTimeExpectedUs), 'k-', lw=1,dashes=[2, 2])
-ax[2].set_ylim(top = 2 * deltaTimeExpectedUs, bottom = 0)
+figure, ax = plt.subplots(2)
+for name, histogram in (('Callback Execution Times (us)', stats.execution), ('Delta Times (us)', stats.interval)):
+	buckets = histogram.buckets()
+	ax[fig].set_title('Figure ' + str(fig) + ': ' + name)
+	if buckets:
+		low, width, count = np.array(buckets, dtype = np.float64).T
+		ax[fig].bar(low / 1e3, count, width = width / 1e3, align = 'edge')
+		ax[fig].set_xscale('log')
+		ax[fig].set_yscale('log')
+	ax[fig].axvline(deltaTimeExpectedUs, color = 'k', lw = 1, dashes = [2, 2])
+	fig += 1
 plt.show()
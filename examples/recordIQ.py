@@ -4,7 +4,7 @@ Example use of ExtIO-Python to record IQ data as a WAV file
 Uses mandatory ExtIO DLL calls, and requires support of the optional
 ExtIoSetSrate, ExtIoGetSrates, and ExtIoGetActualSrateIdx calls
 
-Works with a limited set of harware types
+Works with all IQ hardware types (8, 16, 24, 32 bit and float)
 
 Requires numpy https://numpy.org/
 """
@@ -16,92 +16,77 @@ from ctypes import *
 import threading
 import queue
 from datetime import datetime
-import struct
 
 import numpy as np
 from extio import *
-import iqStream
-
-class waveHeader():
-	def __init__(self):
-		self.ckID = b'RIFF'
-		self.ckSize = 0
-		self.formType = b'WAVE'
-		self.fmtHeader = b'fmt '
-		self.fmtChunkSize = 16
-		self.fmtFormatType = 1
-		self.fmtChannels = 2
-		self.fmtSampleRate = 0
-		self.fmtBytesPerSecond = 0
-		self.fmtBlockAlignment = 0
-		self.fmtBitsPerSample = 0
-		self.dataHeader = b'data'
-		self.dataSize = 0
-
-	def to_bytes(self):
-		format = '<4sI4s4sIHHIIHH4sI'
-		buf = struct.pack(format,
-		self.ckID,
-		self.ckSize,
-		self.formType,
-		self.fmtHeader,
-		self.fmtChunkSize,
-		self.fmtFormatType,
-		self.fmtChannels,
-		self.fmtSampleRate,
-		self.fmtBytesPerSecond,
-		self.fmtBlockAlignment,
-		self.fmtBitsPerSample,
-		self.dataHeader,
-		self.dataSize)
-		return buf
-
 
 class recorderThread (threading.Thread):
 	""" Record IQ data from the queue into a file """
 	""" TODO: Mechanism to handle sample rate/format changes mid stream """
-	global iqStream
 
-	def __init__(self, fileHandle):
+	def __init__(self, writer, stream):
 		threading.Thread.__init__(self)
 		self.stop = False
-		self.fileHandle = fileHandle
+		self.writer = writer
+		self.stream = stream
+		# a fanout stream has no queue of its own, each consumer reads through a Subscriber
+		self.subscriber = stream.subscribe(name = 'recorder') if stream.fanout else None
 
 	def run(self):
 
-		while not(self.stop):
-			while (iqStream.tail != iqStream.head):
-				tempBuffer = np.copy(iqStream.buffer[iqStream.tail])
-				newTail = iqStream.tail + 1
-				if (newTail >= iqStream.queueEntries):
-					newTail = 0
-				iqStream.tail = newTail
-				self.fileHandle.write(tempBuffer.tobytes())
-			time.sleep(0.05)
+		while True:
+			ring = self.subscriber if self.subscriber is not None else self.stream.ring
+			if ring is not None:
+				# get() copies a block and skips slots the driver reused meanwhile,
+				# a view from peek() could be overwritten while it is written out
+				entry = ring.get()
+				while entry is not None:
+					# the writer gathers blocks into large chunks before they reach the disk
+					seq, block = entry
+					self.writer.write(block)
+					entry = ring.get(block)
+			# drain what is left before stopping
+			if self.stop:
+				break
+			# sleep until the callback signals a watermark of blocks (or stop calls wake())
+			self.stream.wait(timeout = 1.0, reader = self.subscriber)
+		if self.subscriber is not None:
+			self.stream.unsubscribe(self.subscriber)
 
 """
 	Globals
 """
 
-hwTypesSupported = [ExtIO.ExtHWtype.USBdata16]
+hwTypesSupported = [
+	ExtIO.ExtHWtype.USBdataU8,
+	ExtIO.ExtHWtype.USBdataS8,
+	ExtIO.ExtHWtype.USBdata16,
+	ExtIO.ExtHWtype.USBdata24,
+	ExtIO.ExtHWtype.USBdata32,
+	ExtIO.ExtHWtype.FullPCM32,
+	ExtIO.ExtHWtype.USBfloat32,
+]
 extIO = None
 
 """
 	Main
 """
 
-if (len(sys.argv) == 6):
-	extIO = ExtIO(sys.argv[1])
+if (len(sys.argv) == 6 or len(sys.argv) == 7):
+	extIO = openExtIO(sys.argv[1])
 	sampleRateIndex = int(sys.argv[2])
 	frequency = int(sys.argv[3])
 	duration = float(sys.argv[4])	
 	filePath = sys.argv[5]
 	fileName = filePath + os.path.sep + 'IQ_'
 	fileName += datetime.utcnow().strftime('%Y%m%d_%H%M%SZ')
-	fileName += '_' + str(frequency) + 'Hz.wav'
+	fileName += '_' + str(frequency) + 'Hz'
+	# optional codec (zlib or lzma) records a compressed .iqz file instead of a WAV
+	codec = sys.argv[6] if len(sys.argv) == 7 else None
+	fileName += '.iqz' if codec else '.wav'
 
 else:
-	print('usage: python recordIQ.py <ExtIO DLL> <Sample Rate Index> <Frequency in Hertz> <Duration in Seconds> <Path for Record File>')
+	print('usage: python recordIQ.py <ExtIO DLL, sim[:hwtype] or replay:file> <Sample Rate Index> <Frequency in Hertz> <Duration in Seconds> <Path for Record File> [zlib | lzma]')
 	exit()
 
 # TODO: Support non-default sample rates
@@ -117,7 +102,7 @@ if extIO.hwtype not in hwTypesSupported:
 	print('[main] Unsupported Hardware Type') 
 	exit()
 
-iqStream.init(_extIO = extIO, _typesSupported = hwTypesSupported, _queueEntries = 2048)
+iqStream = IQStream(extIO, hwTypesSupported, queueEntries = 2048, watermark = 8)
 
 extIO.SetCallback(iqStream.iqStreamCallback)
 extIO.OpenHW()
@@ -126,16 +111,20 @@ extIO.OpenHW()
 # note: some radios allow these to change while streaming
 # the handler would be notified
 iqStream.type = extIO.hwtype
-extIO.ExtIoSetSrate(sampleRateIndex)
-iqStream.sampleRate = extIO.ExtIoGetSrates(extIO.ExtIoGetActualSrateIdx())
-
-# create a default header
-# will fill in details after capture
-fileHeader = waveHeader()
-wavFile = open(fileName, 'wb')
-wavFile.write(fileHeader.to_bytes())
+iqStream.capabilities.refresh()
+iqStream.capabilities.setSampleRate(sampleRateIndex)
+iqStream.sampleRate = iqStream.capabilities.sampleRate
+
+# header is kept up to date while recording, and switches
+# to RF64 if the capture grows past 4 GiB
+if codec:
+	# delta coding helps whole-word integer samples, not packed 24-bit or float data
+	delta = iqStream.type in (ExtIO.ExtHWtype.USBdataU8, ExtIO.ExtHWtype.USBdataS8, ExtIO.ExtHWtype.USBdata16, ExtIO.ExtHWtype.USBdata32, ExtIO.ExtHWtype.FullPCM32)
+	wavWriter = CompressedWriter(fileName, iqStream.type, iqStream.sampleRate, frequency, codec = codec, delta = delta)
+else:
+	wavWriter = WavWriter(fileName, iqStream.type, iqStream.sampleRate)
 
-recorder = recorderThread(wavFile)
+recorder = recorderThread(wavWriter, iqStream)
 recorder.start()
 
 extIO.StartHW(frequency)
@@ -153,12 +142,13 @@ iqStream.enabled = False
 extIO.StopHW()
 
 recorder.stop = True
+iqStream.wake()
 recorder.join()
 
 extIO.CloseHW()
 
-# close file
-wavFile.close()
+# flush and finalize the header
+wavWriter.close()
 
 print('Callback Hits = ' + str(iqStream.callbackHits))
 print('Callback Info = ' + str(iqStream.callbackInfo))
@@ -168,40 +158,4 @@ print('Total IQ Pairs = ' + str(extIO.iqPairs * iqStream.callbackData))
 print('Samples for second = ' + str((extIO.iqPairs * iqStream.callbackData) / duration))
 print('Overruns = ' + str(iqStream.overruns))
 print('Delta Time Misses = ' + str(iqStream.callbackMisses))
-
-# update file header information
-	
-# TODO: handle multiple IQ formats...
-
-# fill in the values we need
-fileSize = os.stat(fileName).st_size
-fileHeader.ckSize = fileSize - 8
-fileHeader.fmtSampleRate = int(iqStream.sampleRate)
-fileHeader.dataSize = fileSize - len(fileHeader.to_bytes())
-
-if iqStream.type == ExtIO.ExtHWtype.USBdataU8:
-	fileHeader.fmtBlockAlignment = 2
-	fileHeader.fmtBitsPerSample = 8
-
-elif iqStream.type == ExtIO.ExtHWtype.USBdata16:
-	fileHeader.fmtBlockAlignment = 4
-	fileHeader.fmtBitsPerSample = 16
-
-elif iqStream.type == ExtIO.ExtHWtype.USBdata24:
-	# TODO - check for WAV support	
-	pass
-
-elif iqStream.type == ExtIO.ExtHWtype.USBdata32:
-	fileHeader.fmtBlockAlignment = 8
-	fileHeader.fmtBitsPerSample = 32
-
-elif iqStream.type == ExtIO.ExtHWtype.USBfloat32:
-	# TODO - check for WAV support
-	pass
-
-fileHeader.fmtBytesPerSecond = int(iqStream.sampleRate) * fileHeader.fmtBitsPerSample
-
-# rewrite the header
-wavFile = open(fileName, 'rb+')
-wavFile.write(fileHeader.to_bytes())
-wavFile.close()
+print('Ingest ns per Callback = ' + str(int(iqStream.nsPerCallback)))
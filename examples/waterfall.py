@@ -3,12 +3,12 @@
 """
 Adapted from pysdr.org and David Cherkus
 
-This is pretty messy right now, with a bunch of code in the 
-display section that was used for debugging performance
-problems.
+The waterfall is computed while the data arrives, with one batched
+FFT per stream block (see extio.Spectrogram).
 
-If you start getting log10(zero) errors, most likely you're 
-losing data and there are discontinuities in the IQ stream.
+Blocks lost to overruns are detected from the sample index the stream
+stores with every block; the spectrogram restarts its framing after a
+gap instead of joining discontinuous data into one FFT.
 """
 
 import sys
@@ -19,13 +19,20 @@ import time
 
 import numpy as np
 from extio import *
-import iqStream
 
 """
 	Globals
 """
 
-hwTypesSupported = [ExtIO.ExtHWtype.USBdata16]
+hwTypesSupported = [
+	ExtIO.ExtHWtype.USBdataU8,
+	ExtIO.ExtHWtype.USBdataS8,
+	ExtIO.ExtHWtype.USBdata16,
+	ExtIO.ExtHWtype.USBdata24,
+	ExtIO.ExtHWtype.USBdata32,
+	ExtIO.ExtHWtype.FullPCM32,
+	ExtIO.ExtHWtype.USBfloat32,
+]
 extIO = None
 
 """
@@ -33,11 +40,11 @@ extIO = None
 """
 
 if (len(sys.argv) == 4):
-	extIO = ExtIO(sys.argv[1])
+	extIO = openExtIO(sys.argv[1])
 	sampleRateIndex = int(sys.argv[2])
 	frequency = int(sys.argv[3])
 else:
-	print('usage: python waterfall.py <ExtIO DLL> <Sample Rate Index> <Frequency in Hertz>')
+	print('usage: python waterfall.py <ExtIO DLL, sim[:hwtype] or replay:file> <Sample Rate Index> <Frequency in Hertz>')
 	exit()
 
 # TODO: Support non-default sample rates
@@ -49,7 +56,7 @@ if extIO.hwtype not in hwTypesSupported:
 	print('[main] Unsupported Hardware Type') 
 	exit()
 
-iqStream.init(_extIO = extIO, _typesSupported = hwTypesSupported, _queueEntries = 2048)
+iqStream = IQStream(extIO, hwTypesSupported, queueEntries = 2048)
 
 extIO.SetCallback(iqStream.iqStreamCallback)
 extIO.OpenHW()
@@ -59,8 +66,9 @@ extIO.OpenHW()
 # the handler would be notified
 #extIO.ExtIoSetSrate(6)
 iqStream.type = extIO.hwtype
-extIO.ExtIoSetSrate(sampleRateIndex)
-iqStream.sampleRate = extIO.ExtIoGetSrates(extIO.ExtIoGetActualSrateIdx())
+iqStream.capabilities.refresh()
+iqStream.capabilities.setSampleRate(sampleRateIndex)
+iqStream.sampleRate = iqStream.capabilities.sampleRate
 
 sample_rate = int(iqStream.sampleRate)
 center_freq = int(frequency)
@@ -70,27 +78,43 @@ extIO.StartHW(frequency)
 
 iqStream.initBuffers()
 
+# a fanout stream has no queue of its own, the display reads through a Subscriber
+subscriber = iqStream.subscribe(name = 'waterfall') if iqStream.fanout else None
+
 num_samps = round(1e6 / extIO.iqPairs) * extIO.iqPairs
-bytesPerBuffer = extIO.iqPairs * 4
-sampleBuffer = np.empty(num_samps * 4, np.uint8)
-sampleIndex = 0
+
+# Waterfall is computed live, one stream block at a time
+spectrogram = Spectrogram(fft_size, window = 'rect', floor = -150.0)
+decoder = Decoder(iqStream.type)
+iqComplex = np.empty(extIO.iqPairs, dtype = np.complex64)
+gapDetector = GapDetector()
+
+num_slices = int(np.floor(num_samps/fft_size))  # 1M/1024 = 976
+waterfall = np.zeros((num_slices, fft_size), dtype = np.float32)
+row = 0
 
 iqStream.enabled = True
 
 done = False
 while not done:
-	while not done and (iqStream.tail != iqStream.head):
-		tempBuffer = np.copy(iqStream.buffer[iqStream.tail])
-		tempView = tempBuffer.view(np.uint8)
-		newTail = iqStream.tail + 1
-		if (newTail >= iqStream.queueEntries):
-			newTail = 0
-		iqStream.tail = newTail
-		sampleBuffer[sampleIndex:sampleIndex + bytesPerBuffer] = tempView
-		sampleIndex += bytesPerBuffer
-		if (sampleIndex >= len(sampleBuffer)):
+	reader = subscriber if subscriber is not None else iqStream.ring
+	entry = reader.peek()
+	while not done and entry is not None:
+		seq, block = entry
+		info = reader.info(seq)
+		if info is not None and gapDetector.check(info, extIO.iqPairs) is not None:
+			spectrogram.reset()
+		decoder.decode(block, iqComplex)
+		reader.advance(seq)
+		rows = spectrogram.push(iqComplex)
+		count = min(len(rows), num_slices - row)
+		waterfall[row:row + count] = rows[:count]
+		row += count
+		if (row >= num_slices):
 			done = True
-	time.sleep(0.05)
+		entry = reader.peek()
+	if not done:
+		iqStream.wait(timeout = 1.0, reader = subscriber)
 
 iqStream.enabled = False
 
@@ -104,122 +128,17 @@ print('IQ Pairs per Callback = ' + str(extIO.iqPairs))
 print('Total IQ Pairs = ' + str(extIO.iqPairs * iqStream.callbackData))
 #print('Samples for second = ' + str((extIO.iqPairs * iqStream.callbackData) / duration))
 print('Overruns = ' + str(iqStream.overruns))
+print('Gaps = ' + str(gapDetector.gaps) + ' (' + str(gapDetector.lostSamples) + ' samples)')
 print('Delta Time Misses = ' + str(iqStream.callbackMisses))
-
-# view it as signed 16 bit integers
-iqSigned = sampleBuffer.view(np.int16)
-
-# reformat as an I,Q array
-iqArray = np.reshape(iqSigned, (int(iqSigned.size / 2), 2))
-
-# convert to complex
-# dot product give us complex float I Q values
-# scaled by 32767
-complexArray = np.array([1.0 / 32767.0 + 0.0j, 0.0 + 1.0j / 32767.0], dtype = np.complex128)
-#complexArray = np.array([1.0 + 0.0j, 0.0 + 1.0j], dtype = np.complex128)
-iqComplex = iqArray.dot(complexArray)
-
-# Create Waterfall matrix
-num_slices = int(np.floor(num_samps/fft_size))  # 1M/1024 = 976
-waterfall = np.zeros((num_slices, fft_size))
+print('Ingest ns per Callback = ' + str(int(iqStream.nsPerCallback)))
 
 # Waterfall parameters
-time_per_row = 1.0/sample_rate * fft_size
+time_per_row = spectrogram.rowTime(sample_rate)
 fmin = (center_freq - sample_rate/2.0)/1e6 # MHz
 fmax = (center_freq + sample_rate/2.0)/1e6 # MHz
-f = np.arange(fmin,fmax,(fmax - fmin)/fft_size)
-
-np.seterr(all='raise')
 
 fig = 1
 
-for i in range(0,num_slices):
-
-	data = iqComplex[i*fft_size:(i+1)*fft_size]
-
-	if False:
-		data = data * np.hamming(fft_size)
-		offset = 0.0
-		threshold = -10
-	else:
-		offset = 0 #1e-20
-		threshold = -20
-
-	S = np.fft.fftshift(np.fft.fft(data))
-	waterfall[i,:] = np.log10(np.fft.fftshift(np.abs(np.fft.fft(data))**2) + offset)
-
-	if False:
-		""" debug code """
-		# if (i == 0) or (len(np.where(waterfall <= threshold)[0]) != 0):
-		if (len(np.where(waterfall[i] <= threshold)[0]) != 0):
-			"""
-			print(f'*** {i} ***')
-
-			print('[', end = '')
-			for z in iqArray[i*fft_size:(i+1)*fft_size-1]:
-				print(f'[{z[0]},{z[1]}],', end = '')
-			print(f'[{iqArray[(i+1)*fft_size-1][0]},{iqArray[(i+1)*fft_size-1][1]}]]')
-			print()
-
-			print('[', end = '')
-			for z in iqComplex[i*fft_size:(i+1)*fft_size-1]:
-				print(f'{z},', end = '')
-			print(f'{iqComplex[(i+1)*fft_size-1]}]')
-
-			print()
-
-			print('[', end = '')
-			for z in waterfall[i][:-1]:
-				print(f'{z},', end = '')
-			print(f'{waterfall[i][-1]}]')
-
-			print()
-			"""
-
-			figure, ax = plt.subplots(2)
-
-			D_Real = np.real(data)
-			D_Imag = np.imag(data)
-
-			ax[0].set_title('Figure ' + str(fig) + ': I')
-			fig += 1
-			ax[0].plot(D_Real,'.')
-
-			ax[1].set_title('Figure ' + str(fig) + ': Q')
-			fig += 1
-			ax[1].plot(D_Imag,'.')
-
-
-			"""
-			S_mag = np.abs(S)
-			S_phase = np.angle(S)
-
-			ax[2].set_title('Figure ' + str(fig) + ': FFT Magnitude')
-			fig += 1
-			ax[2].plot(f, S_mag,'.')
-
-			ax[3].set_title('Figure ' + str(fig) + ': FFT Phase')
-			fig += 1
-			ax[3].plot(f, S_phase,'.')
-
-			ax[4].set_title('Figure ' + str(fig) + ': FFT Power')
-			fig += 1
-			ax[4].plot(f,waterfall[i],'.')
-
-			"""
-
-			if (len(np.where(waterfall[i] <= threshold)[0]) != 0):
-				print(f'Anomaly at slice {i}')
-				if (i > 0):
-					plt.figure('Figure ' + str(fig) + ': Waterfall')
-					fig += 1
-					plt.imshow(waterfall[:i], extent=[fmin, fmax, time_per_row*i, 0], aspect='auto', cmap=plt.get_cmap('jet'))
-					plt.xlabel('Frequency [MHz]')
-					plt.ylabel('Time [seconds]')
-
-				plt.show()
-				exit()
-
 # Plot waterfall
 plt.figure('Figure ' + str(fig) + ': Waterfall')
 fig += 1
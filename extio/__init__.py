@@ -1,9 +1,23 @@
-import os
-
-if os.name != 'nt':
-	raise ImportError ('extio is only supported under Windows')
-else:
-	from .extio import *
-	from .extio_constants import *
-	
-
+from .extio import *
+from .extio_constants import *
+from .iqring import IQRing, BlockInfo, Gap, GapDetector
+from .iqstream import IQStream, StreamEvent
+from .decode import Decoder
+from .wavwriter import WavWriter
+from .spectrogram import Spectrogram
+from .psd import PSDAccumulator
+from .sigmf import SigMFRecorder
+from .reader import IQFileReader
+from .simulated import SimulatedExtIO, openExtIO
+from .replay import ReplayExtIO
+from .channelizer import Channelizer
+from .resample import Resampler, ResamplerChain, decimator
+from .nco import NCO
+from .aiostream import AsyncIQStream, AsyncRadio
+from .fanout import FanoutRing, Subscriber
+from .shmring import SharedRing, SharedRingReader
+from .stats import LatencyHistogram, CallbackStats
+from .capabilities import DeviceCapabilities
+from .scan import Scanner, Sweep, frequencyPlan
+from .session import Session, Radio, TimeBase
+from .compressed import CompressedWriter, CompressedReader
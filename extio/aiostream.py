@@ -0,0 +1,219 @@
+"""
+asyncio interface to an ExtIO stream
+
+The driver callback keeps copying blocks into the IQStream ring; the
+only thing it does for asyncio is schedule a wakeup with
+call_soon_threadsafe(), and only when none is already pending (or
+once every batch blocks), so a busy stream costs one loop wakeup per
+burst rather than one per callback. Status events are queued straight
+from the callback thread (the loop is only woken for them), so a busy
+consumer that never awaits still sees each one before its blocks.
+
+Backpressure and dropping are handled by the ring policy: DROP_NEWEST
+or DROP_OLDEST keep the driver running when the loop falls behind
+(check the seq numbers for gaps), BLOCK makes the driver wait.
+
+	radio = AsyncRadio(openExtIO('sim'))
+	await radio.open()
+	await radio.start(frequency)
+	async for seq, block in radio.stream():
+		...
+
+Requires numpy https://numpy.org/
+"""
+
+import asyncio
+import collections
+
+from .fanout import Subscriber
+from .iqring import IQRing
+from .iqstream import IQStream, SAMPLE_DTYPES
+
+
+class AsyncIQStream():
+	""" Async iteration over the blocks and status events of an IQStream """
+
+	def __init__(self, stream, loop = None, batch = 1, maxLatency = 0.1, copy = True, policy = Subscriber.DROP_OLDEST):
+		"""
+		loop		event loop to deliver to, defaults to the running loop
+		batch		blocks queued before the driver wakes the loop
+		maxLatency	longest a consumer waits for a partial batch, in seconds
+		copy		yield a copy of each block; False yields the ring slot itself,
+				valid until the next iteration (and under DROP_OLDEST only while
+				the ring (or Subscriber) reports isValid(seq))
+		policy		Subscriber policy, when the stream is a fanout stream
+		"""
+		self.stream = stream
+		self.loop = loop if loop is not None else asyncio.get_running_loop()
+		self.batch = batch
+		self.maxLatency = maxLatency
+		self.copy = copy
+
+		self.ready = asyncio.Event()
+		self.events = collections.deque()
+		self.scheduled = False
+		self.unsignalled = 0
+		self.closed = False
+		self.subscriber = stream.subscribe(policy) if stream.fanout else None
+
+		stream.addDataListener(self.dataReady)
+		stream.addListener(self.eventReady)
+
+	def close(self):
+		""" Ends the iterators once they have delivered what is queued """
+		if not self.closed:
+			self.closed = True
+			self.stream.removeDataListener(self.dataReady)
+			self.stream.removeListener(self.eventReady)
+			if self.subscriber is not None:
+				self.stream.unsubscribe(self.subscriber)
+			self.ready.set()
+
+	# Callback thread side
+
+	def dataReady(self, seq):
+		self.unsignalled += 1
+		if self.unsignalled >= self.batch and not self.scheduled:
+			self.unsignalled = 0
+			self.scheduled = True
+			self.threadsafe(self.wake)
+
+	def eventReady(self, event):
+		# deque.append is thread-safe, and the event must be queued before the
+		# block it applies to is committed: a call_soon_threadsafe() callback
+		# would not run while blocks() keeps finding data
+		self.events.append(event)
+		if not self.scheduled:
+			self.scheduled = True
+			self.threadsafe(self.wake)
+
+	def threadsafe(self, callback, *args):
+		try:
+			self.loop.call_soon_threadsafe(callback, *args)
+		except RuntimeError:
+			# loop closed under a running driver
+			pass
+
+	# Loop side
+
+	def wake(self):
+		self.scheduled = False
+		self.ready.set()
+
+	async def wait(self):
+		self.ready.clear()
+		try:
+			await asyncio.wait_for(self.ready.wait(), self.maxLatency)
+		except asyncio.TimeoutError:
+			pass
+
+	async def blocks(self, withEvents = False):
+		"""
+		Yields (seq, block) for every block, block being an (iqPairs, 2)
+		array of raw samples. With withEvents the StreamEvents of status
+		callbacks are yielded too, each before the first block it applies to.
+		"""
+		while True:
+			ring = self.subscriber if self.subscriber is not None else self.stream.ring
+			entry = None
+			if ring is not None:
+				entry = ring.get() if self.copy else ring.peek()
+
+			if withEvents:
+				events = self.events
+				while events and (entry is None or events[0].seq <= entry[0]):
+					yield events.popleft()
+
+			if entry is not None:
+				yield entry
+				if not self.copy:
+					ring.advance(entry[0])
+			elif self.closed:
+				return
+			else:
+				await self.wait()
+
+	async def statusEvents(self):
+		""" Yields a StreamEvent for every status callback """
+		while True:
+			if self.events:
+				yield self.events.popleft()
+			elif self.closed:
+				return
+			else:
+				await self.wait()
+
+
+class AsyncRadio():
+	""" ExtIO radio driven from an asyncio event loop """
+
+	def __init__(self, extIO, typesSupported = None, queueEntries = 64, policy = IQRing.DROP_OLDEST, batch = 1, maxLatency = 0.1, copy = True):
+		"""
+		policy		what the ring does when the loop falls behind (see IQRing)
+		batch, maxLatency and copy are passed to AsyncIQStream
+		"""
+		self.extIO = extIO
+		if typesSupported is None:
+			typesSupported = list(SAMPLE_DTYPES)
+		self.iqStream = IQStream(extIO, typesSupported, queueEntries, policy)
+		self.options = {'batch': batch, 'maxLatency': maxLatency, 'copy': copy}
+		self.aio = None
+
+	async def call(self, function, *args):
+		""" Runs a (possibly slow) driver call in the default executor """
+		return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+	async def open(self, sampleRateIndex = None):
+		""" InitHW, SetCallback and OpenHW, plus ExtIoSetSrate when sampleRateIndex is given """
+		extIO = self.extIO
+		await self.call(extIO.InitHW)
+		if extIO.hwtype not in self.iqStream.typesSupported:
+			raise ValueError('Unsupported hardware type ' + str(extIO.hwtype))
+		self.aio = AsyncIQStream(self.iqStream, **self.options)
+		extIO.SetCallback(self.iqStream.iqStreamCallback)
+		if not await self.call(extIO.OpenHW):
+			raise OSError('OpenHW failed')
+		capabilities = self.iqStream.capabilities
+		await self.call(capabilities.refresh)
+		if sampleRateIndex is not None:
+			await self.call(capabilities.setSampleRate, sampleRateIndex)
+		self.iqStream.type = extIO.hwtype
+		self.iqStream.sampleRate = capabilities.sampleRate
+
+	async def start(self, frequency):
+		""" StartHW and enable the stream, returns the I/Q pairs per block """
+		iqPairs = await self.call(self.extIO.StartHW, frequency)
+		self.iqStream.initBuffers()
+		self.iqStream.enabled = True
+		return iqPairs
+
+	async def stop(self):
+		self.iqStream.enabled = False
+		await self.call(self.extIO.StopHW)
+
+	async def close(self):
+		""" Closes the radio and ends the iterators """
+		if self.iqStream.enabled:
+			await self.stop()
+		await self.call(self.extIO.CloseHW)
+		if self.aio is not None:
+			self.aio.close()
+
+	async def setLO(self, frequency):
+		return await self.call(self.iqStream.setLO, frequency)
+
+	def stream(self, withEvents = False):
+		""" Async iterator of (seq, block), see AsyncIQStream.blocks() """
+		return self.aio.blocks(withEvents)
+
+	def events(self):
+		""" Async iterator of StreamEvents (do not combine with stream(withEvents = True)) """
+		return self.aio.statusEvents()
+
+	@property
+	def sampleRate(self):
+		return self.iqStream.sampleRate
+
+	@property
+	def overruns(self):
+		return self.iqStream.overruns
@@ -0,0 +1,125 @@
+"""
+Cached device capabilities
+
+ExtIoGetSrates(), ExtIoGetSetting() and ExtIoGetFreqRanges() enumerate
+through the DLL one index at a time, and every call is a round trip
+into the driver. DeviceCapabilities reads the sample rates, the current
+rate index, the settings, the LO limits and the hardware type once
+after OpenHW() and keeps them until the driver reports, through a
+status callback, that one of them changed. Only that part is read again,
+and only when it is next used, so the callback thread makes one
+ExtIoGetActualSrateIdx() call on Changed_SampleRate instead of
+enumerating rates.
+"""
+
+from .extio import ExtIO
+
+# status code -> parts of the cache it invalidates
+INVALIDATES = {
+	ExtIO.ExtHWstatus.Changed_SRATES.value:		('sampleRates', 'srateIdx'),
+	ExtIO.ExtHWstatus.Changed_SampleRate.value:	('srateIdx',),
+	ExtIO.ExtHWstatus.Changed_SETTINGS.value:	('settings',),
+	ExtIO.ExtHWstatus.Changed_FREQRANGES.value:	('loLimits',),
+}
+
+PARTS = ('sampleRates', 'srateIdx', 'settings', 'loLimits')
+
+
+def optional(function, *args):
+	""" Calls an optional driver function, None if the DLL does not export it """
+	try:
+		return function(*args)
+	except AttributeError:
+		return None
+
+
+class DeviceCapabilities():
+	""" What the driver reports about the radio, read once and refreshed on status changes """
+
+	def __init__(self, extIO):
+		self.extIO = extIO
+		self.hwtype = extIO.hwtype
+		self.cache = {}
+		self.stale = set(PARTS)
+		self.reads = 0			# driver enumerations made, for checking the cache works
+
+	def refresh(self):
+		""" Reads everything from the driver, call after OpenHW() """
+		self.hwtype = self.extIO.hwtype
+		self.stale = set(PARTS)
+		for part in PARTS:
+			self.get(part)
+		return self
+
+	def invalidate(self, *parts):
+		""" Marks parts (default all) to be read again on next use """
+		self.stale.update(parts or PARTS)
+
+	def statusChanged(self, status):
+		""" Handles a status callback, returns True if it invalidated anything """
+		parts = INVALIDATES.get(status)
+		if parts is None:
+			return False
+		self.stale.update(parts)
+		return True
+
+	def get(self, part):
+		if part in self.stale:
+			self.stale.discard(part)
+			self.cache[part] = self.read(part)
+			self.reads += 1
+		return self.cache[part]
+
+	def read(self, part):
+		extIO = self.extIO
+		if part == 'sampleRates':
+			return optional(extIO.ExtIoGetSrates) or []
+		if part == 'srateIdx':
+			return optional(extIO.ExtIoGetActualSrateIdx)
+		if part == 'settings':
+			return optional(extIO.ExtIoGetSetting) or []
+		if part == 'loLimits':
+			return optional(extIO.ExtIoGetFreqRanges) or []
+		raise KeyError(part)
+
+	@property
+	def sampleRates(self):
+		""" Selectable sample rates, in driver index order """
+		return self.get('sampleRates')
+
+	@property
+	def srateIdx(self):
+		""" Index of the current sample rate, None if the driver does not say """
+		return self.get('srateIdx')
+
+	@property
+	def sampleRate(self):
+		""" Current sample rate in Hertz, None if unknown """
+		idx = self.srateIdx
+		sampleRates = self.sampleRates
+		if idx is None or not (0 <= idx < len(sampleRates)):
+			return None
+		return sampleRates[idx]
+
+	@property
+	def settings(self):
+		""" List of {'description', 'value'} dicts, as ExtIoGetSetting() returns them """
+		return self.get('settings')
+
+	@property
+	def loLimits(self):
+		""" List of (low, high) LO ranges in Hertz """
+		return self.get('loLimits')
+
+	def setSampleRate(self, idx):
+		""" ExtIoSetSrate(idx), keeping the cached index in step, False if the driver refused """
+		if not self.extIO.ExtIoSetSrate(idx):
+			return False
+		self.cache['srateIdx'] = idx
+		self.stale.discard('srateIdx')
+		return True
+
+	def loInRange(self, frequency):
+		""" True if frequency is inside one of the LO ranges (or the driver reports none) """
+		ranges = self.loLimits
+		return not ranges or any(low <= frequency <= high for low, high in ranges)
@@ -0,0 +1,156 @@
+"""
+Polyphase filter bank channelizer
+
+Splits one wideband complex stream into channels equally spaced
+sampleRate / channels apart, each decimated to sampleRate / decimation.
+One prototype filter folded into polyphase branches plus one batched
+inverse FFT per block replaces a separate mix, filter and decimate
+chain for every channel. Filter history and the output phase are
+carried between blocks, so the channels are seamless across stream
+blocks of any size.
+
+Requires numpy https://numpy.org/
+"""
+
+import math
+
+import numpy as np
+
+from .spectrogram import FFT_OUT
+
+def prototypeFilter(channels, tapsPerChannel = 12, window = 'blackman', bandwidth = 1.0):
+	"""
+	Windowed sinc lowpass for channels channels, tapsPerChannel * channels
+	taps long, cut off at bandwidth / 2 channel spacings and with unity DC gain
+	"""
+	length = channels * tapsPerChannel
+	t = (np.arange(length) - (length - 1) / 2.0) * bandwidth / channels
+	functions = {'blackman': np.blackman, 'hamming': np.hamming, 'hann': np.hanning}
+	taps = np.sinc(t) * functions[window](length)
+	return (taps / np.sum(taps)).astype(np.float32)
+
+
+class Channelizer():
+	""" Streaming polyphase channelizer """
+
+	def __init__(self, channels, oversample = 1, taps = None, tapsPerChannel = 12, sinks = None):
+		"""
+		channels	number of channels, channel k is centered on k * sampleRate / channels
+				(k above channels / 2 are the negative frequencies, as in an FFT)
+		oversample	output rate in channel spacings, channels must be a multiple of it
+		taps		prototype lowpass (length a multiple of channels), default prototypeFilter()
+		sinks		optional list of objects with put(block), one per channel (None
+				to skip one), fed the (n, 2) float32 view of each channel's output.
+				n varies from push to push with the input block size and the
+				carried history, so a sink must take blocks of any length
+				(IQRing, with its fixed slot size, cannot be one)
+		"""
+		if channels % oversample:
+			raise ValueError('channels must be a multiple of oversample')
+		self.channels = channels
+		self.oversample = oversample
+		self.decimation = channels // oversample
+		if taps is None:
+			taps = prototypeFilter(channels, tapsPerChannel)
+		taps = np.asarray(taps, dtype = np.float32)
+		if taps.size % channels:
+			taps = np.concatenate([taps, np.zeros(channels - taps.size % channels, dtype = np.float32)])
+		self.taps = taps
+		self.length = taps.size
+		self.branches = taps.size // channels
+		# samples run oldest to newest in each window, the taps newest first
+		self.reversed = taps[::-1].copy()
+
+		# output n needs exp(-2j pi k n D / M), which repeats every M / gcd(D, M) outputs
+		period = channels // math.gcd(self.decimation, channels)
+		n = np.arange(period)[:, None]
+		k = np.arange(channels)[None, :]
+		self.rotation = np.exp(-2j * np.pi * ((k * n * self.decimation) % channels) / channels).astype(np.complex64)
+		self.rotate = period > 1
+		self.outputIndex = 0
+
+		self.sinks = sinks
+		self.history = np.zeros(0, dtype = np.complex64)
+		self.historyCount = 0
+		self.work = None
+		self.folded = None
+		self.spectrum = None
+		self.out = None
+		self.reset()
+
+	def reset(self):
+		""" Clears the filter history (zeros), e.g. after a gap in the stream """
+		self.historyCount = self.length - 1
+		if self.history.size < self.historyCount:
+			self.history = np.zeros(self.historyCount, dtype = np.complex64)
+		self.history[:self.historyCount] = 0
+		self.outputIndex = 0
+
+	def outputRate(self, sampleRate):
+		return sampleRate / self.decimation
+
+	def centerFrequencies(self, sampleRate, centerFrequency = 0.0):
+		""" Center frequency of each channel in Hertz """
+		return centerFrequency + np.fft.fftfreq(self.channels, 1.0 / sampleRate)
+
+	def buffers(self, outputs):
+		if self.work is None or self.work.shape[0] < outputs:
+			self.work = np.empty((outputs, self.length), dtype = np.complex64)
+			self.folded = np.empty((outputs, self.channels), dtype = np.complex64)
+			self.spectrum = np.empty((outputs, self.channels), dtype = np.complex64)
+			self.out = np.empty((self.channels, outputs), dtype = np.complex64)
+
+	def push(self, iq):
+		"""
+		Adds a block of complex samples and returns the new channel
+		samples, shape (channels, n). The array is reused by the next
+		call, copy it to keep it.
+		"""
+		iq = np.asarray(iq, dtype = np.complex64)
+		total = self.historyCount + iq.size
+		if self.history.size < total:
+			grown = np.empty(max(total, 2 * self.history.size), dtype = np.complex64)
+			grown[:self.historyCount] = self.history[:self.historyCount]
+			self.history = grown
+		self.history[self.historyCount:total] = iq
+		samples = self.history[:total]
+
+		outputs = 0 if total < self.length else (total - self.length) // self.decimation + 1
+		if outputs == 0:
+			self.historyCount = total
+			return np.empty((self.channels, 0), dtype = np.complex64)
+		self.buffers(outputs)
+
+		# filter: every output is a window of the input times the taps, folded into the branches
+		windows = np.lib.stride_tricks.sliding_window_view(samples, self.length)[::self.decimation][:outputs]
+		work = self.work[:outputs]
+		np.multiply(windows, self.reversed, out = work)
+		folded = self.folded[:outputs]
+		np.sum(work.reshape(outputs, self.branches, self.channels), axis = 1, out = folded)
+
+		# the newest sample sits in the last column, flip so column m holds delay m (mod channels)
+		spectrum = self.spectrum[:outputs]
+		if FFT_OUT:
+			np.fft.ifft(folded[:, ::-1], axis = 1, norm = 'forward', out = spectrum)
+		else:
+			spectrum[...] = np.fft.ifft(folded[:, ::-1], axis = 1, norm = 'forward')
+		if self.rotate:
+			period = self.rotation.shape[0]
+			index = (self.outputIndex + np.arange(outputs)) % period
+			spectrum *= self.rotation[index]
+		self.outputIndex = (self.outputIndex + outputs) % self.rotation.shape[0]
+
+		out = self.out[:, :outputs]
+		out[...] = spectrum.T
+
+		# keep the samples the next window starts with
+		consumed = outputs * self.decimation
+		remaining = total - consumed
+		self.history[:remaining] = self.history[consumed:total]
+		self.historyCount = remaining
+
+		if self.sinks is not None:
+			for channel, sink in enumerate(self.sinks):
+				if sink is not None:
+					sink.put(out[channel].view(np.float32).reshape(outputs, 2))
+		return out
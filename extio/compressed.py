@@ -0,0 +1,372 @@
+"""
+Compressed IQ recordings with a chunk index
+
+CompressedWriter has the WavWriter interface (write() raw blocks,
+close()) but gathers the stream into fixed-size chunks and compresses
+each one with zlib or lzma in a thread pool. Both codecs release the
+GIL, so several chunks compress at once on separate cores while the
+consumer thread keeps draining the ring; the ExtIO callback never waits
+on compression. Chunks can first be delta coded (each I and Q sample
+minus the previous one, in wrapping integer arithmetic) and byte
+shuffled (all first bytes of the samples, then all second bytes...),
+which typically makes 16-bit IQ noticeably more compressible. Every
+chunk is independent, so CompressedReader can seek to any sample and
+decompress chunks in parallel.
+
+File layout (little endian):
+
+	'EXTIOIQZ', version (u32), metadata length (u32), metadata (JSON)
+	chunks:		'IQZC', stored bytes (u32), raw bytes (u32), first sample (u64), data
+	index:		(offset, stored bytes, raw bytes, first sample) (4 x u64) per chunk
+	trailer:	'IQZINDEX', index offset (u64), chunk count (u64)
+
+A recording that was never closed has no index; the reader rebuilds it
+from the chunk headers.
+
+Requires numpy https://numpy.org/
+"""
+
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import datetime
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .extio import ExtIO
+from .decode import asBytes, Decoder, SAMPLE_BYTES
+from .iqstream import SAMPLE_DTYPES
+
+MAGIC = b'EXTIOIQZ'
+VERSION = 1
+CHUNK_TAG = b'IQZC'
+CHUNK_HEADER = struct.Struct('<4sIIQ')
+INDEX_ENTRY = struct.Struct('<QQQQ')
+TRAILER_TAG = b'IQZINDEX'
+TRAILER = struct.Struct('<8sQQ')
+
+CODECS = ('zlib', 'lzma', 'none')
+
+# unsigned views for delta coding, by sample size
+DELTA_DTYPES = {1: np.dtype(np.uint8), 2: np.dtype('<u2'), 4: np.dtype('<u4')}
+
+def compressChunk(raw, sampleBytes, codec, level, delta, shuffle):
+	""" Filters and compresses one chunk (a uint8 array of whole I/Q pairs), returns bytes """
+	data = raw
+	if delta:
+		values = raw.view(DELTA_DTYPES[sampleBytes]).reshape(-1, 2)
+		coded = np.empty_like(values)
+		coded[0] = values[0]
+		np.subtract(values[1:], values[:-1], out = coded[1:])
+		data = coded.view(np.uint8).reshape(-1)
+	if shuffle and sampleBytes > 1:
+		data = np.ascontiguousarray(data.reshape(-1, sampleBytes).T).reshape(-1)
+	if codec == 'zlib':
+		return zlib.compress(data, level)
+	if codec == 'lzma':
+		return lzma.compress(data, preset = level)
+	return data.tobytes()
+
+def decompressChunk(stored, rawBytes, sampleBytes, codec, delta, shuffle):
+	""" Inverse of compressChunk(), returns a uint8 array of rawBytes """
+	if codec == 'zlib':
+		stored = zlib.decompress(stored, bufsize = rawBytes)
+	elif codec == 'lzma':
+		stored = lzma.decompress(stored)
+	data = np.frombuffer(stored, dtype = np.uint8)
+	if data.size != rawBytes:
+		raise ValueError('Corrupt chunk: ' + str(data.size) + ' bytes instead of ' + str(rawBytes))
+	if shuffle and sampleBytes > 1:
+		data = np.ascontiguousarray(data.reshape(sampleBytes, -1).T).reshape(-1)
+	if delta:
+		coded = data.view(DELTA_DTYPES[sampleBytes]).reshape(-1, 2)
+		data = np.cumsum(coded, axis = 0, dtype = coded.dtype).view(np.uint8).reshape(-1)
+	elif not data.flags.writeable:
+		data = data.copy()
+	return data
+
+
+class CompressedWriter():
+	""" Writes raw IQ blocks of one hardware type as a chunked, compressed recording """
+
+	def __init__(self, fileName, hwtype, sampleRate, frequency = None, codec = 'zlib', level = None, delta = False,
+			shuffle = True, chunkBytes = 4 * 1024 * 1024, workers = None, metadata = None):
+		"""
+		codec		'zlib', 'lzma' or 'none'
+		level		codec level / preset (default 1 for zlib, 0 for lzma: fast enough for live rates)
+		delta		delta code the samples before compression (integer sample formats)
+		shuffle		byte shuffle the samples before compression
+		chunkBytes	raw bytes per chunk, the unit of compression and of seeking
+		workers		compression threads (default os.cpu_count())
+		metadata	extra JSON serializable items for the header
+		"""
+		if hwtype not in SAMPLE_DTYPES:
+			raise ValueError('No sample format for hardware type ' + str(hwtype))
+		if codec not in CODECS:
+			raise ValueError('Unknown codec ' + str(codec))
+		self.sampleBytes = SAMPLE_BYTES[hwtype]
+		if delta and self.sampleBytes not in DELTA_DTYPES:
+			raise ValueError('Delta coding needs 1, 2 or 4 byte samples')
+		if level is None:
+			level = 0 if codec == 'lzma' else 1
+
+		self.fileName = fileName
+		self.hwtype = hwtype
+		self.sampleRate = sampleRate
+		self.codec = codec
+		self.level = level
+		self.delta = delta
+		self.shuffle = shuffle
+		self.blockAlign = 2 * self.sampleBytes
+		self.chunkBytes = max(self.blockAlign, chunkBytes - chunkBytes % self.blockAlign)
+
+		self.workers = workers or os.cpu_count() or 1
+		self.pool = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = 'CompressedWriter')
+		# chunks being compressed, written to the file in order
+		self.pending = collections.deque()
+		self.maxPending = 2 * self.workers
+		self.spare = []
+		self.chunk = np.empty(self.chunkBytes, dtype = np.uint8)
+		self.fill = 0
+
+		self.samplesQueued = 0		# I/Q pairs handed to the pool
+		self.rawBytes = 0		# raw bytes on disk (compressed)
+		self.storedBytes = 0		# compressed bytes on disk
+		self.index = []
+
+		header = {
+			'hwtype': hwtype.name,
+			'sampleRate': sampleRate,
+			'frequency': frequency,
+			'codec': codec,
+			'level': level,
+			'delta': delta,
+			'shuffle': shuffle,
+			'chunkBytes': self.chunkBytes,
+			'datetime': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+		}
+		if metadata:
+			header.update(metadata)
+		header = json.dumps(header).encode('utf-8')
+		self.file = open(fileName, 'wb')
+		self.file.write(MAGIC + struct.pack('<II', VERSION, len(header)) + header)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	@property
+	def samples(self):
+		""" I/Q pairs written so far, including data not yet compressed """
+		return self.samplesQueued + self.fill // self.blockAlign
+
+	@property
+	def ratio(self):
+		""" Raw bytes per stored byte of the chunks written so far """
+		return self.rawBytes / self.storedBytes if self.storedBytes else None
+
+	def write(self, block):
+		""" Queues one raw block (ndarray or bytes-like in the hardware format) """
+		src = asBytes(block)
+		offset = 0
+		while offset < src.size:
+			count = min(src.size - offset, self.chunk.size - self.fill)
+			self.chunk[self.fill:self.fill + count] = src[offset:offset + count]
+			self.fill += count
+			offset += count
+			if self.fill == self.chunk.size:
+				self.submit()
+
+	def submit(self):
+		""" Hands the gathered chunk to the pool """
+		if self.fill == 0:
+			return
+		chunk = self.chunk[:self.fill]
+		firstSample = self.samplesQueued
+		self.samplesQueued += self.fill // self.blockAlign
+		future = self.pool.submit(compressChunk, chunk, self.sampleBytes, self.codec, self.level, self.delta, self.shuffle)
+		self.pending.append((future, self.chunk, chunk.size, firstSample))
+		self.chunk = self.spare.pop() if self.spare else np.empty(self.chunkBytes, dtype = np.uint8)
+		self.fill = 0
+		self.drain(False)
+		# do not let the backlog (and memory) grow without bound
+		while len(self.pending) >= self.maxPending:
+			self.drain(True)
+
+	def drain(self, wait):
+		""" Writes the finished chunks at the head of the queue, the first one even if unfinished when wait """
+		while self.pending and (wait or self.pending[0][0].done()):
+			future, buffer, rawBytes, firstSample = self.pending.popleft()
+			stored = future.result()
+			offset = self.file.tell()
+			self.file.write(CHUNK_HEADER.pack(CHUNK_TAG, len(stored), rawBytes, firstSample))
+			self.file.write(stored)
+			self.index.append((offset, len(stored), rawBytes, firstSample))
+			self.rawBytes += rawBytes
+			self.storedBytes += len(stored)
+			self.spare.append(buffer)
+			wait = False
+
+	def flush(self):
+		""" Compresses and writes everything written so far (ends the current chunk early) """
+		self.submit()
+		while self.pending:
+			self.drain(True)
+		self.file.flush()
+
+	def close(self):
+		""" Writes the remaining chunks, the index and the trailer """
+		if self.file is None:
+			return
+		self.flush()
+		self.pool.shutdown()
+		indexOffset = self.file.tell()
+		self.file.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+		self.file.write(TRAILER.pack(TRAILER_TAG, indexOffset, len(self.index)))
+		self.file.close()
+		self.file = None
+
+
+class CompressedReader():
+	""" Random access and parallel decompression of a CompressedWriter recording """
+
+	def __init__(self, path, workers = None):
+		self.path = path
+		self.file = open(path, 'rb')
+		magic = self.file.read(len(MAGIC))
+		if magic != MAGIC:
+			raise ValueError(path + ' is not a compressed IQ recording')
+		version, length = struct.unpack('<II', self.file.read(8))
+		if version != VERSION:
+			raise ValueError('Compressed recording version ' + str(version) + ' is not supported')
+		self.metadata = json.loads(self.file.read(length).decode('utf-8'))
+		self.dataOffset = len(MAGIC) + 8 + length
+
+		self.hwtype = ExtIO.ExtHWtype[self.metadata['hwtype']]
+		self.sampleRate = self.metadata['sampleRate']
+		self.frequency = self.metadata['frequency']
+		self.codec = self.metadata['codec']
+		self.delta = self.metadata['delta']
+		self.shuffle = self.metadata['shuffle']
+		self.sampleBytes = SAMPLE_BYTES[self.hwtype]
+		self.blockAlign = 2 * self.sampleBytes
+		self.dtype = SAMPLE_DTYPES[self.hwtype]
+		self.decoder = Decoder(self.hwtype)
+		self.workers = workers or os.cpu_count() or 1
+		self.pool = None
+
+		self.index = self.readIndex()
+		if self.index is None:
+			# never closed, walk the chunk headers instead
+			self.index = self.scanChunks()
+		self.starts = [entry[3] for entry in self.index]
+		last = self.index[-1] if self.index else None
+		self.samples = last[3] + last[2] // self.blockAlign if last else 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def __len__(self):
+		return self.samples
+
+	@property
+	def chunkCount(self):
+		return len(self.index)
+
+	def close(self):
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
+		self.file.close()
+
+	def readIndex(self):
+		""" Index from the trailer, None if the file has none """
+		size = os.fstat(self.file.fileno()).st_size
+		if size < self.dataOffset + TRAILER.size:
+			return None
+		self.file.seek(size - TRAILER.size)
+		tag, indexOffset, count = TRAILER.unpack(self.file.read(TRAILER.size))
+		if tag != TRAILER_TAG:
+			return None
+		self.file.seek(indexOffset)
+		data = self.file.read(count * INDEX_ENTRY.size)
+		return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(count)]
+
+	def scanChunks(self):
+		""" Rebuilds the index from the chunk headers, stopping at a truncated chunk """
+		index = []
+		size = os.fstat(self.file.fileno()).st_size
+		offset = self.dataOffset
+		while offset + CHUNK_HEADER.size <= size:
+			self.file.seek(offset)
+			tag, storedBytes, rawBytes, firstSample = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))
+			if tag != CHUNK_TAG or offset + CHUNK_HEADER.size + storedBytes > size:
+				break
+			index.append((offset, storedBytes, rawBytes, firstSample))
+			offset += CHUNK_HEADER.size + storedBytes
+		return index
+
+	def readChunk(self, number):
+		""" Raw I/Q pairs of chunk number, shape (n, 2) in the hardware format """
+		offset, storedBytes, rawBytes, firstSample = self.index[number]
+		# os.pread keeps parallel readers off each other's file position
+		if hasattr(os, 'pread'):
+			stored = os.pread(self.file.fileno(), storedBytes, offset + CHUNK_HEADER.size)
+		else:
+			with open(self.path, 'rb') as chunkFile:
+				chunkFile.seek(offset + CHUNK_HEADER.size)
+				stored = chunkFile.read(storedBytes)
+		data = decompressChunk(stored, rawBytes, self.sampleBytes, self.codec, self.delta, self.shuffle)
+		return data.view(self.dtype).reshape(-1, 2)
+
+	def chunks(self, first = 0, last = None):
+		""" Yields (first sample, raw pairs) of each chunk, decompressing ahead in a thread pool """
+		if self.pool is None:
+			self.pool = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = 'CompressedReader')
+		numbers = range(first, len(self.index) if last is None else last)
+		# map() keeps every chunk in flight, bound the read ahead instead
+		ahead = collections.deque()
+		for number in numbers:
+			ahead.append((number, self.pool.submit(self.readChunk, number)))
+			if len(ahead) > 2 * self.workers:
+				done, future = ahead.popleft()
+				yield self.starts[done], future.result()
+		while ahead:
+			done, future = ahead.popleft()
+			yield self.starts[done], future.result()
+
+	def chunkOf(self, sample):
+		""" Number of the chunk holding sample """
+		if not 0 <= sample < self.samples:
+			raise IndexError('sample ' + str(sample) + ' outside the recording')
+		return bisect.bisect_right(self.starts, sample) - 1
+
+	def read(self, start, count):
+		""" Raw I/Q pairs start to start + count (clipped to the recording), shape (n, 2) """
+		count = max(0, min(count, self.samples - start))
+		out = np.empty((count, 2), dtype = self.dtype)
+		if count == 0:
+			return out
+		first = self.chunkOf(start)
+		last = self.chunkOf(start + count - 1) + 1
+		filled = 0
+		for chunkStart, pairs in self.chunks(first, last):
+			begin = max(start - chunkStart, 0)
+			take = min(pairs.shape[0] - begin, count - filled)
+			out[filled:filled + take] = pairs[begin:begin + take]
+			filled += take
+		return out
+
+	def decode(self, start, count, out = None):
+		""" Complex64 samples start to start + count """
+		return self.decoder.decode(self.read(start, count), out)
@@ -0,0 +1,190 @@
+"""
+Vectorized sample decoding for every ExtHWtype with IQ data
+
+Turns the raw blocks delivered by the ExtIO callback (or stored in an
+IQRing) into complex64 samples scaled to +/-1.0, or into int16 I/Q
+pairs. All work is done with NumPy ufuncs writing into preallocated
+buffers, so a Decoder can be reused for every block without allocating.
+
+Requires numpy https://numpy.org/
+"""
+
+import numpy as np
+
+from .extio import ExtIO
+from .iqstream import SAMPLE_DTYPES
+
+HWtype = ExtIO.ExtHWtype
+
+# bytes used by one I or Q sample
+SAMPLE_BYTES = {hwtype: dtype.itemsize for hwtype, dtype in SAMPLE_DTYPES.items()}
+
+# multiplier bringing full scale to +/-1.0
+SCALES = {
+	HWtype.USBdataU8:	1.0 / 127.5,
+	HWtype.USBdataS8:	1.0 / 128.0,
+	HWtype.USBdata16:	1.0 / 32768.0,
+	HWtype.USBdata24:	1.0 / 8388608.0,
+	HWtype.USBdata32:	1.0 / 8388608.0,		# 32-bit container, 24-bit range
+	HWtype.FullPCM32:	1.0 / 2147483648.0,
+	HWtype.USBfloat32:	1.0,
+}
+
+# DC offset removed before scaling (unsigned 8-bit is centered on 127.5)
+OFFSETS = {
+	HWtype.USBdataU8:	127.5,
+}
+
+# integer range of each format, used when encoding
+LIMITS = {
+	HWtype.USBdataU8:	(0, 255),
+	HWtype.USBdataS8:	(-128, 127),
+	HWtype.USBdata16:	(-32768, 32767),
+	HWtype.USBdata24:	(-8388608, 8388607),
+	HWtype.USBdata32:	(-8388608, 8388607),
+	HWtype.FullPCM32:	(-2147483648, 2147483647),
+}
+
+def asBytes(raw):
+	""" Returns a flat uint8 view of an ndarray or bytes-like block """
+	if isinstance(raw, np.ndarray):
+		return raw.reshape(-1).view(np.uint8)
+	return np.frombuffer(raw, dtype = np.uint8)
+
+
+class Decoder():
+	""" Reusable decoder for one hardware type and block size """
+
+	def __init__(self, hwtype, iqPairs = None):
+		if hwtype not in SAMPLE_DTYPES:
+			raise ValueError('No sample format for hardware type ' + str(hwtype))
+		self.hwtype = hwtype
+		self.sampleBytes = SAMPLE_BYTES[hwtype]
+		self.dtype = SAMPLE_DTYPES[hwtype]
+		self.scale = np.float32(SCALES[hwtype])
+		self.offset = OFFSETS.get(hwtype)
+		self.iqPairs = None
+		self.scratch = None
+		self.floatScratch = None
+		if iqPairs is not None:
+			self.allocate(iqPairs)
+
+	def allocate(self, iqPairs):
+		""" Sizes the internal scratch buffer (only used for 24-bit data) """
+		self.iqPairs = iqPairs
+		if self.hwtype == HWtype.USBdata24:
+			self.scratch = np.zeros((iqPairs * 2, 4), dtype = np.uint8)
+
+	def pairs(self, raw):
+		""" Number of I/Q pairs in a raw block """
+		return asBytes(raw).size // (2 * self.sampleBytes)
+
+	def samples(self, raw):
+		""" Returns the raw block as a flat array of I,Q,I,Q... integers or floats (no copy when possible) """
+		u8 = asBytes(raw)
+		if self.hwtype != HWtype.USBdata24:
+			return u8.view(self.dtype)
+
+		n = u8.size // 3
+		if self.scratch is None or self.scratch.shape[0] < n:
+			self.allocate(n // 2)
+		work = self.scratch[:n]
+		# place the 3 bytes in the top of an int32 and shift down to sign extend
+		work[:, 1:] = u8.reshape(n, 3)
+		values = work.view('<i4').reshape(n)
+		np.right_shift(values, 8, out = values)
+		return values
+
+	def decode(self, raw, out = None):
+		""" Decodes a raw block into complex64 samples, out must hold at least pairs(raw) values """
+		values = self.samples(raw)
+		n = values.size // 2
+		if out is None:
+			out = np.empty(n, dtype = np.complex64)
+		else:
+			out = out[:n]
+		flat = out.view(np.float32)
+
+		if self.offset is not None:
+			np.subtract(values, np.float32(self.offset), out = flat, dtype = np.float32, casting = 'unsafe')
+			np.multiply(flat, self.scale, out = flat)
+		elif self.scale != 1.0:
+			np.multiply(values, self.scale, out = flat, dtype = np.float32, casting = 'unsafe')
+		else:
+			np.copyto(flat, values, casting = 'unsafe')
+		return out
+
+	def toInt16(self, raw, out = None):
+		""" Converts a raw block to int16 I/Q pairs of shape (n, 2), keeping the most significant bits """
+		hwtype = self.hwtype
+		if hwtype == HWtype.USBdata24:
+			# the top two bytes of each 24-bit sample are already an int16
+			u8 = asBytes(raw)
+			n = u8.size // 3
+			if out is None:
+				out = np.empty((n // 2, 2), dtype = np.int16)
+			out.reshape(-1).view(np.uint8).reshape(n, 2)[...] = u8.reshape(n, 3)[:, 1:]
+			return out
+
+		values = self.samples(raw)
+		if out is None:
+			out = np.empty((values.size // 2, 2), dtype = np.int16)
+		flat = out.reshape(-1)
+
+		if hwtype == HWtype.USBdata16:
+			np.copyto(flat, values)
+		elif hwtype == HWtype.USBdataU8:
+			# (v - 127.5) * 256, the OFFSETS centre decode() uses, is exact in int16
+			np.subtract(values, 128, out = flat, dtype = np.int16, casting = 'unsafe')
+			np.left_shift(flat, 8, out = flat)
+			np.add(flat, 128, out = flat)
+		elif hwtype == HWtype.USBdataS8:
+			np.left_shift(values, 8, out = flat, dtype = np.int16, casting = 'unsafe')
+		elif hwtype == HWtype.USBdata32:
+			np.right_shift(values, 8, out = flat, casting = 'unsafe')
+		elif hwtype == HWtype.FullPCM32:
+			np.right_shift(values, 16, out = flat, casting = 'unsafe')
+		else:
+			# float samples are already scaled to +/-1.0
+			if self.floatScratch is None or self.floatScratch.size < values.size:
+				self.floatScratch = np.empty(values.size, dtype = np.float32)
+			work = self.floatScratch[:values.size]
+			np.multiply(values, np.float32(32767.0), out = work)
+			np.clip(work, -32768.0, 32767.0, out = work)
+			np.copyto(flat, work, casting = 'unsafe')
+		return out
+
+
+def decode(raw, hwtype, out = None):
+	""" Decodes one raw block of hwtype into complex64 samples """
+	return Decoder(hwtype).decode(raw, out)
+
+def toInt16(raw, hwtype, out = None):
+	""" Converts one raw block of hwtype into int16 I/Q pairs """
+	return Decoder(hwtype).toInt16(raw, out)
+
+def encode(iq, hwtype, out = None):
+	"""
+	Encodes complex samples scaled to +/-1.0 into the raw byte layout of
+	hwtype (the inverse of decode), returns a uint8 array
+	"""
+	iq = np.asarray(iq, dtype = np.complex64)
+	flat = iq.view(np.float32)
+	scale = 1.0 / SCALES[hwtype]
+	offset = OFFSETS.get(hwtype, 0.0)
+
+	if hwtype == HWtype.USBfloat32:
+		values = flat.astype('<f4')
+	else:
+		lo, hi = LIMITS[hwtype]
+		values = np.clip(np.rint(flat.astype(np.float64) * scale + offset), lo, hi)
+		if hwtype == HWtype.USBdata24:
+			values = values.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3]
+		else:
+			values = values.astype(SAMPLE_DTYPES[hwtype])
+
+	raw = np.ascontiguousarray(values).reshape(-1).view(np.uint8)
+	if out is None:
+		return raw
+	out.reshape(-1).view(np.uint8)[:raw.size] = raw
+	return out
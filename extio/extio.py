@@ -1,3 +1,4 @@
+import os
 from ctypes import *
 from .extio_constants import *
 """
@@ -9,10 +10,53 @@ http://www.hdsdr.de/download/LC_ExtIO_Types.h
 
 """
 
+# void ExtIOCallback(int cnt, int status, float IQoffs, void *IQdata)
+CALLBACK_TYPE = CFUNCTYPE(None, c_int, c_int, c_float, c_void_p)
+
+# ExtIO exports: restype, argtypes (see LC_ExtIO_Types.h)
+PROTOTYPES = {
+	# mandatory
+	'InitHW':			(c_bool, (c_char_p, c_char_p, POINTER(c_int))),
+	'OpenHW':			(c_bool, ()),
+	'CloseHW':			(None, ()),
+	'StartHW':			(c_int, (c_long,)),
+	'StopHW':			(None, ()),
+	'SetCallback':			(None, (CALLBACK_TYPE,)),
+	'SetHWLO':			(c_int, (c_long,)),
+	'GetHWLO':			(c_long, ()),
+	# optional
+	'GetStatus':			(c_int, ()),
+	'StartHW64':			(c_int, (c_int64,)),
+	'SetHWLO64':			(c_int64, (c_int64,)),
+	'GetHWLO64':			(c_int64, ()),
+	'GetHWSR':			(c_long, ()),
+	'ExtIoGetSrates':		(c_int, (c_int, POINTER(c_double))),
+	'ExtIoGetActualSrateIdx':	(c_int, ()),
+	'ExtIoSetSrate':		(c_int, (c_int,)),
+	'ExtIoGetSetting':		(c_int, (c_int, c_char_p, c_char_p)),
+	'ExtIoGetFreqRanges':		(c_int, (c_int, POINTER(c_int64), POINTER(c_int64))),
+	'ShowGUI':			(None, ()),
+	'HideGUI':			(None, ()),
+	'SwitchGUI':			(None, ()),
+}
+
+# a DLL must export each of these, or one of the alternatives in the tuple
+MANDATORY = ('InitHW', 'OpenHW', 'CloseHW', ('StartHW64', 'StartHW'), 'StopHW', 'SetCallback', ('SetHWLO64', 'SetHWLO'), ('GetHWLO64', 'GetHWLO'))
+
+
+class FunctionTable(dict):
+	""" Prototyped DLL functions by export name, a missing export raises AttributeError like ctypes does """
+
+	def __missing__(self, name):
+		raise AttributeError(name + ' is not exported by the ExtIO DLL')
+
+
 class ExtIO():
 	""" ExtIO Class """
 	def __init__(self, dllName):
 		""" Create the ExtIO object and load the DLL """
+		if os.name != 'nt':
+			raise OSError('ExtIO DLLs are only supported under Windows (use SimulatedExtIO elsewhere)')
 		self.extIo = WinDLL(dllName)
 		self.name = None
 		self.model = None
@@ -20,6 +64,43 @@ class ExtIO():
 		self.callback = None
 		self.iqPairs = None
 		self.extLOfreq = None
+		self.resolve()
+
+	def resolve(self):
+		"""
+		Looks every known export up once and sets its argtypes / restype,
+		so later calls go straight to the DLL without attribute lookups,
+		argument guessing or exceptions
+
+		self.functions	FunctionTable of the exports found
+		self.exports	export name -> True if the DLL has it (the capability map)
+		"""
+		self.functions = FunctionTable()
+		for name, (restype, argtypes) in PROTOTYPES.items():
+			try:
+				function = getattr(self.extIo, name)
+			except AttributeError:
+				continue
+			function.restype = restype
+			function.argtypes = argtypes
+			self.functions[name] = function
+		self.exports = {name: name in self.functions for name in PROTOTYPES}
+
+		for names in MANDATORY:
+			if isinstance(names, str):
+				names = (names,)
+			if not any(self.exports[name] for name in names):
+				raise OSError('ExtIO DLL does not export ' + ' or '.join(names))
+
+		# prefer the 64-bit frequency versions
+		functions = self.functions
+		self.startHW = functions.get('StartHW64') or functions['StartHW']
+		self.setHWLO = functions.get('SetHWLO64') or functions['SetHWLO']
+		self.getHWLO = functions.get('GetHWLO64') or functions['GetHWLO']
+
+	def supports(self, name):
+		""" True if the DLL exports function name """
+		return self.exports.get(name, False)
 
 	# Mandatory Functions - all radios should support these
 
@@ -28,7 +109,7 @@ class ExtIO():
 		name = create_string_buffer(EXTIO_MAX_NAME_LEN)
 		model = create_string_buffer(EXTIO_MAX_MODEL_LEN)
 		hwtype = c_int()
-		self.extIo.InitHW(byref(name), byref(model), byref(hwtype))
+		self.functions['InitHW'](name, model, byref(hwtype))
 		self.name = name.value.decode('utf-8')
 		self.model = model.value.decode('utf-8')
 		self.hwtype = self.ExtHWtype(hwtype.value)
@@ -43,13 +124,12 @@ class ExtIO():
 		With C call looking like this:
 		ExtIOCallback(int cnt, int status, float IQoffs, void *IQdata) 
 		"""
-		callbackType = CFUNCTYPE(None, c_int, c_int, c_float, c_void_p)
-		self.callback = callbackType(callbackFunction)
-		self.extIo.SetCallback(self.callback)
+		self.callback = CALLBACK_TYPE(callbackFunction)
+		self.functions['SetCallback'](self.callback)
 
 	def OpenHW(self):
 		""" Open radio, returns True if successfull """
-		return c_bool(self.extIo.OpenHW()).value
+		return self.functions['OpenHW']()
 
 	def StartHW(self, extLOfreq):
 		""" 
@@ -58,34 +138,29 @@ class ExtIO():
 		one that takes a 32-bit frequency, and another that
 		takes a 64-bit frequency
 
-		This function will attempt to call the 64-bit version
-		first
+		The 64-bit version is used when the DLL exports it
 
 		Returns the number of I/Q pairs that will be returned
 		with each callback call
 		"""
-
-		try:
-			self.iqPairs = c_int(self.extIo.StartHW64(c_int64(extLOfreq))).value
-		except:
-			self.iqPairs = c_int(self.extIo.StartHW(c_long(extLOfreq))).value
-
+		self.iqPairs = self.startHW(int(extLOfreq))
 		self.extLOfreq = extLOfreq
 		return self.iqPairs
 
 	def StopHW(self):
-		self.extIo.StopHW()
+		self.functions['StopHW']()
 
 	def CloseHW(self):
-		""" Close radio, returns True if successfull """
-		return c_bool(self.extIo.CloseHW()).value
+		""" Close radio, always True (the DLL call returns nothing) """
+		self.functions['CloseHW']()
+		return True
 
 	def SetHWLO(self, extLOfreq):
 		"""
 		Sets the local oscillator
 
-		Attempts to call the 64-bit version first,
-		then falls back to the 32-bit version
+		Calls the 64-bit version when the DLL exports it,
+		otherwise the 32-bit version
 	
 		Returns:
 			== 0: The function did complete without errors.
@@ -98,19 +173,26 @@ class ExtIO():
 				that the hardware is capable to generate. The value
 				of N indicates what is the maximum supported by the HW.
 		"""
-		try:
-			retVal = c_int64(self.extIo.SetHWLO64(c_int64(extLOfreq))).value
-		except:
-			retVal = c_int(self.extIo.SetHWLO(c_int(extLOfreq))).value
-
+		retVal = self.setHWLO(int(extLOfreq))
 		self.extLOfreq = extLOfreq
 		return retVal
 
+	def GetHWLO(self):
+		"""
+		Returns the local oscillator frequency (in Hertz)
+
+		Calls the 64-bit version when the DLL exports it,
+		otherwise the 32-bit version
+		"""
+		self.extLOfreq = self.getHWLO()
+		return self.extLOfreq
+
 	# Optional Functions - not all radios will support these
+	# (calling one the DLL does not export raises AttributeError, see supports())
 
 	def foo(self):
 		""" used to verify exception catching of non-existent DLL functions """
-		self.extIo.FooBar(c_int(10))
+		self.functions['FooBar'](c_int(10))
 
 
 	def ExtIoGetSrates(self, idx = None):
@@ -118,40 +200,29 @@ class ExtIO():
 		    which is slightly different than the original C call
 		    but probably what they would have done if it was as easy as Python
 		"""
-		retVal = None
+		getSrates = self.functions['ExtIoGetSrates']
+		sampleRateValue = c_double()
 		if idx != None:
-			sampleRateValue = c_double()		
-			ret = c_int(self.extIo.ExtIoGetSrates(c_int(idx), byref(sampleRateValue))).value
-			if ret == 0:
-				retVal = sampleRateValue.value
-			else:
-				retVal = None
-		else:
-			sampleRateValue = c_double()		
-			self.sRates = []
-			ret = 0
-			index = 0
-			while ret == 0:
-				ret = c_int(self.extIo.ExtIoGetSrates(c_int(index), byref(sampleRateValue))).value
-				if ret == 0:
-					self.sRates.append(sampleRateValue.value)
-					index += 1
-			retVal = self.sRates
-		return retVal
+			if getSrates(idx, byref(sampleRateValue)) == 0:
+				return sampleRateValue.value
+			return None
+		self.sRates = []
+		index = 0
+		while getSrates(index, byref(sampleRateValue)) == 0:
+			self.sRates.append(sampleRateValue.value)
+			index += 1
+		return self.sRates
 
 	def ExtIoGetActualSrateIdx(self):
 		""" Returns index of sample rate setting """
-		self.actualSrateIdx = c_int(self.extIo.ExtIoGetActualSrateIdx()).value
+		self.actualSrateIdx = self.functions['ExtIoGetActualSrateIdx']()
 		if self.actualSrateIdx == -1:
 			self.actualSrateIdx = None 
 		return self.actualSrateIdx
 
 	def ExtIoSetSrate(self, idx):
 		""" Sets sample rate index to idx , False if an error """
-		if c_int(self.extIo.ExtIoSetSrate(c_int(idx))).value != -1:
-			return True
-		else:
-			return False
+		return self.functions['ExtIoSetSrate'](idx) != -1
 
 	def ShowGUI(self):
 		""" 
@@ -159,47 +230,54 @@ class ExtIO():
 		May require additional DLLs somewhere in the path
 		Will also require a window handler in your application code (see examples)
 		"""
-		self.extIo.ShowGUI()
+		self.functions['ShowGUI']()
 
-	def ShowGUI(self):
+	def HideGUI(self):
 		""" 
 		Hides the radio's GUI, if it has one
 		"""
-		self.extIo.HideGUI()
+		self.functions['HideGUI']()
 
-	def ShowGUI(self):
+	def SwitchGUI(self):
 		""" 
 		Switch visbility of the radio's GUI, if it has one
 		"""
-		self.extIo.SwitchGUI()
+		self.functions['SwitchGUI']()
 
 	def ExtIoGetSetting(self, idx = None):
 		""" Get optional setting description and value at index idx
 			or an ordered list of all the settings
 		"""
+		getSetting = self.functions['ExtIoGetSetting']
 		# max buffer size specified in header file, but no define was given
 		description = create_string_buffer(1024)
 		value = create_string_buffer(1024)
-		retDescription = None
-		retValue = None
+		if idx != None:
+			if getSetting(idx, description, value) == 0:
+				return description.value.decode('utf-8'), value.value.decode('utf-8')
+			return None, None
 		settings = []
-		result = None
+		idx = 0
+		while getSetting(idx, description, value) == 0:
+			settings.append({'description': description.value.decode('utf-8'), 'value': value.value.decode('utf-8')})
+			idx += 1
+		return settings
+
+	def ExtIoGetFreqRanges(self, idx = None):
+		""" Returns (low, high) of frequency range idx in Hertz, or an ordered list of all the ranges """
+		getFreqRanges = self.functions['ExtIoGetFreqRanges']
+		low = c_int64()
+		high = c_int64()
 		if idx != None:
-			ret = c_int(self.extIo.ExtIoGetSetting(c_int(idx), byref(description), byref(value))).value
-			if ret == 0:
-				retDescription = description.value.decode('utf-8')
-				retValue = value.value
-			result = retDescription, retValue.decode('utf-8')
-		else:
-			idx = 0
-			ret = 0
-			while ret == 0:
-				ret = c_int(self.extIo.ExtIoGetSetting(c_int(idx), byref(description), byref(value))).value
-				if ret == 0:
-					settings.append({'description': description.value.decode('utf-8'), 'value': value.value.decode('utf-8')})
-					idx += 1
-			result = settings
-		return result
+			if getFreqRanges(idx, byref(low), byref(high)) == 0:
+				return low.value, high.value
+			return None
+		ranges = []
+		idx = 0
+		while getFreqRanges(idx, byref(low), byref(high)) == 0:
+			ranges.append((low.value, high.value))
+			idx += 1
+		return ranges
 
 	class ExtHWtype(Enum):
 		NotDefined 		= 0
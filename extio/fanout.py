@@ -0,0 +1,216 @@
+"""
+Single producer, multi consumer ring for IQ blocks
+
+FanoutRing keeps the producer side of IQRing (writeAddress() /
+commit(), so IQStream can fill it with one memmove per callback) but
+never waits and never drops: the producer always writes the next slot
+and each Subscriber follows the stream with its own cursor. A consumer
+that falls a whole ring behind loses blocks by its own policy without
+slowing the producer or the other consumers, so a recorder, a display
+and a detector can all read one radio without copying the data for
+each of them.
+
+Subscribers offer the consumer side of IQRing (peek / advance / get /
+isValid), so code written for an IQRing can read a Subscriber.
+
+Requires numpy https://numpy.org/
+"""
+
+import threading
+
+import numpy as np
+
+from .iqring import alignedEmpty, CACHE_LINE, BlockInfo
+
+
+class Subscriber():
+	""" One consumer's cursor into a FanoutRing """
+
+	DROP_OLDEST = 'drop-oldest'		# when lapped, lose the overwritten blocks and resume at the oldest one left
+	SKIP_TO_LATEST = 'skip-to-latest'	# when lapped, jump to the newest block (lowest latency, for displays)
+
+	POLICIES = (DROP_OLDEST, SKIP_TO_LATEST)
+
+	def __init__(self, policy = DROP_OLDEST, name = None):
+		if policy not in self.POLICIES:
+			raise ValueError('Unknown overrun policy: ' + str(policy))
+		self.policy = policy
+		self.name = name
+		self.ring = None
+		self.cursor = 0			# sequence number of the next block to read
+		self.overruns = 0		# blocks lost to being lapped
+		self.maxLag = 0
+
+	def __len__(self):
+		""" Blocks published but not yet read (may exceed what the ring still holds) """
+		return self.lag
+
+	@property
+	def lag(self):
+		ring = self.ring
+		return ring.nextSeq - self.cursor if ring is not None else 0
+
+	@property
+	def iqPairs(self):
+		return self.ring.iqPairs
+
+	@property
+	def dtype(self):
+		return self.ring.dtype
+
+	def empty(self):
+		return self.lag <= 0
+
+	def catchUp(self):
+		""" Moves a lapped cursor back into the ring according to the policy """
+		ring = self.ring
+		nextSeq = ring.nextSeq
+		if self.policy == self.SKIP_TO_LATEST:
+			cursor = nextSeq - 1
+		else:
+			# slot nextSeq % entries may be being written, the one after it is the oldest intact
+			cursor = nextSeq - ring.entries + 1
+		if cursor > self.cursor:
+			self.overruns += cursor - self.cursor
+			self.cursor = cursor
+
+	def locate(self):
+		""" Returns the slot of the next block, or None if there is none yet """
+		ring = self.ring
+		if ring is None:
+			return None
+		lag = ring.nextSeq - self.cursor
+		if lag <= 0:
+			return None
+		if lag > self.maxLag:
+			self.maxLag = lag
+		if lag >= ring.entries or ring.seq[self.cursor % ring.entries] != self.cursor:
+			self.catchUp()
+		return self.cursor % ring.entries
+
+	def peek(self):
+		"""
+		Returns (seq, view) of the next block without copying, or None if
+		there is none yet. Check isValid(seq) after using the view: the
+		producer does not wait and may have reused the slot.
+		"""
+		slot = self.locate()
+		if slot is None:
+			return None
+		return self.cursor, self.ring.buffer[slot]
+
+	def isValid(self, seq):
+		ring = self.ring
+		return ring is not None and seq >= 0 and ring.seq[seq % ring.entries] == seq
+
+	def info(self, seq):
+		""" BlockInfo of block seq, None if it is gone """
+		return self.ring.info(seq) if self.ring is not None else None
+
+	def advance(self, seq = None):
+		""" Releases the block returned by peek() """
+		if seq is None or seq == self.cursor:
+			self.cursor += 1
+
+	def get(self, out = None):
+		"""
+		Copies the next block into out (allocated if None), returns
+		(seq, out) or None if there is none yet
+		"""
+		while True:
+			slot = self.locate()
+			if slot is None:
+				return None
+			seq = self.cursor
+			ring = self.ring
+			if out is None:
+				out = np.empty((ring.iqPairs, 2), dtype = ring.dtype)
+			np.copyto(out, ring.buffer[slot])
+			# the producer invalidates a slot before rewriting it
+			if ring.seq[slot] == seq:
+				self.cursor = seq + 1
+				return seq, out
+
+
+class FanoutRing():
+	""" Non-blocking ring read through any number of Subscribers """
+
+	def __init__(self, entries, iqPairs, dtype = np.int16, alignment = CACHE_LINE, firstSeq = 0):
+		if entries < 2:
+			raise ValueError('FanoutRing needs at least 2 entries')
+		self.entries = entries
+		self.iqPairs = iqPairs
+		self.dtype = np.dtype(dtype)
+
+		self.buffer = alignedEmpty((entries, iqPairs, 2), self.dtype, alignment)
+		self.seq = [-1] * entries
+		self.infos = [None] * entries
+		self.slotBytes = iqPairs * 2 * self.dtype.itemsize
+		self.addresses = [self.buffer[i].ctypes.data for i in range(entries)]
+		self.nextSeq = firstSeq
+
+		self.lock = threading.Lock()
+		self.subscribers = []
+
+	@property
+	def overruns(self):
+		""" Blocks lost, summed over the subscribers """
+		return sum(subscriber.overruns for subscriber in self.subscribers)
+
+	def subscribe(self, policy = Subscriber.DROP_OLDEST, name = None):
+		""" New Subscriber starting at the next block published """
+		return self.adopt(Subscriber(policy, name))
+
+	def adopt(self, subscriber):
+		""" Attaches an existing Subscriber (e.g. from a replaced ring), starting at the next block """
+		with self.lock:
+			subscriber.ring = self
+			subscriber.cursor = self.nextSeq
+			if subscriber not in self.subscribers:
+				self.subscribers.append(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		with self.lock:
+			self.subscribers.remove(subscriber)
+			subscriber.ring = None
+
+	def reset(self):
+		""" Moves every subscriber to the next block, keeps the sequence counter running """
+		with self.lock:
+			for subscriber in self.subscribers:
+				subscriber.cursor = self.nextSeq
+
+	# Producer side, same calls as IQRing
+
+	def writeSlot(self):
+		""" Returns the slot array to fill next, visible to subscribers after commit() """
+		slot = self.nextSeq % self.entries
+		self.seq[slot] = -1
+		return self.buffer[slot]
+
+	def writeAddress(self):
+		""" Same as writeSlot() but returns the slot's memory address, for memmove() """
+		slot = self.nextSeq % self.entries
+		self.seq[slot] = -1
+		return self.addresses[slot]
+
+	def commit(self, info = None):
+		seq = self.nextSeq
+		slot = seq % self.entries
+		self.infos[slot] = info
+		self.seq[slot] = seq
+		self.nextSeq = seq + 1
+		return seq
+
+	def put(self, block, info = None):
+		slot = self.writeSlot()
+		slot[...] = np.reshape(block, slot.shape)
+		return self.commit(info)
+
+	def info(self, seq):
+		slot = seq % self.entries
+		info = self.infos[slot]
+		if info is None or self.seq[slot] != seq:
+			return None
+		return BlockInfo(seq, *info)
@@ -0,0 +1,265 @@
+"""
+Contiguous ring buffer for IQ blocks
+
+All slots live in one preallocated, cache-aligned NumPy array of
+shape (entries, iqPairs, 2), so the producer (the ExtIO callback)
+never allocates and consumers can read slots without copying.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+import threading
+
+import numpy as np
+
+CACHE_LINE = 64
+
+# what the producer knew about a block when it was queued: sampleIndex
+# counts I/Q pairs since the stream started (lost blocks included) and
+# timeNs is the perf_counter_ns() ingest time
+BlockInfo = collections.namedtuple('BlockInfo', ['seq', 'sampleIndex', 'timeNs', 'frequency', 'sampleRate'])
+
+# samples missing between two blocks a consumer received
+Gap = collections.namedtuple('Gap', ['seq', 'sampleIndex', 'lostSamples', 'lostBlocks'])
+
+def alignedEmpty(shape, dtype, alignment = CACHE_LINE):
+	""" Returns an uninitialized array whose first byte sits on an alignment boundary """
+	dtype = np.dtype(dtype)
+	nbytes = int(np.prod(shape)) * dtype.itemsize
+	raw = np.empty(nbytes + alignment, dtype = np.uint8)
+	offset = (-raw.ctypes.data) % alignment
+	return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+class IQRing():
+	""" Single producer, single consumer ring of fixed size IQ blocks """
+
+	DROP_NEWEST = 'drop-newest'		# discard the incoming block when full (original iqStream behavior)
+	DROP_OLDEST = 'drop-oldest'		# overwrite the oldest unread block when full
+	BLOCK = 'block'					# make the producer wait for room (up to blockTimeout seconds)
+
+	POLICIES = (DROP_NEWEST, DROP_OLDEST, BLOCK)
+
+	def __init__(self, entries, iqPairs, dtype = np.int16, policy = DROP_NEWEST, blockTimeout = None, alignment = CACHE_LINE, firstSeq = 0):
+		"""
+		Allocates entries slots of iqPairs I/Q pairs each
+
+		firstSeq lets a replacement ring continue the sequence numbers of
+		the one it replaces
+		"""
+		if entries < 2:
+			raise ValueError('IQRing needs at least 2 entries')
+		if policy not in self.POLICIES:
+			raise ValueError('Unknown overrun policy: ' + str(policy))
+
+		self.entries = entries
+		self.iqPairs = iqPairs
+		self.dtype = np.dtype(dtype)
+		self.policy = policy
+		self.blockTimeout = blockTimeout
+
+		self.buffer = alignedEmpty((entries, iqPairs, 2), self.dtype, alignment)
+		self.seq = [-1] * entries		# a list is cheaper to update from the callback than an ndarray
+		self.infos = [None] * entries		# (sampleIndex, timeNs, frequency, sampleRate) per slot
+		self.slotBytes = iqPairs * 2 * self.dtype.itemsize
+		self.addresses = [self.buffer[i].ctypes.data for i in range(entries)]
+
+		# block seq always lives in slot seq % entries
+		self.nextSeq = firstSeq		# sequence number given to the next committed block
+		self.head = firstSeq % entries	# next slot the producer writes
+		self.tail = self.head		# next slot the consumer reads
+		self.overruns = 0		# blocks lost to a full ring
+
+		self.lock = threading.Lock()
+		self.notFull = threading.Condition(self.lock)
+		self.producerWaiting = False
+
+	def __len__(self):
+		""" Number of committed blocks not yet consumed """
+		return (self.head - self.tail) % self.entries
+
+	def empty(self):
+		return self.head == self.tail
+
+	def full(self):
+		return (self.head + 1) % self.entries == self.tail
+
+	def reset(self):
+		""" Discards all queued blocks, keeps the sequence counter running """
+		with self.lock:
+			# block seq always lives in slot seq % entries
+			self.head = self.nextSeq % self.entries
+			self.tail = self.head
+			self.seq[:] = [-1] * self.entries
+			self.notFull.notify_all()
+
+	# Producer side
+
+	def reserve(self):
+		"""
+		Makes room for the next block, returns False if the block has
+		to be dropped (ring full under drop-newest, or the block
+		timeout expired)
+		"""
+		newHead = self.head + 1
+		if newHead == self.entries:
+			newHead = 0
+		if newHead == self.tail:
+			if self.policy == self.DROP_NEWEST:
+				self.overruns += 1
+				return False
+
+			elif self.policy == self.DROP_OLDEST:
+				with self.lock:
+					if newHead == self.tail:
+						self.tail = (self.tail + 1) % self.entries
+						self.overruns += 1
+
+			else:
+				with self.notFull:
+					self.producerWaiting = True
+					ok = self.notFull.wait_for(lambda: newHead != self.tail, self.blockTimeout)
+					self.producerWaiting = False
+				if not ok:
+					self.overruns += 1
+					return False
+
+		# invalidate the slot so a consumer lapped by drop-oldest can tell
+		self.seq[self.head] = -1
+		return True
+
+	def writeSlot(self):
+		"""
+		Returns the slot array the producer should fill next, or None
+		if the block has to be dropped
+
+		The block is only visible to consumers after commit()
+		"""
+		if not self.reserve():
+			return None
+		return self.buffer[self.head]
+
+	def writeAddress(self):
+		""" Same as writeSlot() but returns the slot's memory address, for memmove() """
+		if not self.reserve():
+			return None
+		return self.addresses[self.head]
+
+	def commit(self, info = None):
+		"""
+		Publishes the slot returned by writeSlot(), returns its sequence
+		number. info is the (sampleIndex, timeNs, frequency, sampleRate)
+		tuple info() reports for the block.
+		"""
+		seq = self.nextSeq
+		head = self.head
+		self.infos[head] = info
+		self.seq[head] = seq
+		self.nextSeq = seq + 1
+		head += 1
+		if head == self.entries:
+			head = 0
+		self.head = head
+		return seq
+
+	def put(self, block, info = None):
+		""" Copies one block into the ring, returns its sequence number or None if dropped """
+		slot = self.writeSlot()
+		if slot is None:
+			return None
+		slot[...] = np.reshape(block, slot.shape)
+		return self.commit(info)
+
+	# Consumer side
+
+	def peek(self):
+		"""
+		Returns (seq, view) of the oldest unread block without copying,
+		or None if the ring is empty
+
+		The view stays valid until advance(); under drop-oldest a fast
+		producer may reuse the slot, which isValid(seq) reports
+		"""
+		tail = self.tail
+		if tail == self.head:
+			return None
+		return self.seq[tail], self.buffer[tail]
+
+	def isValid(self, seq):
+		""" True if block seq is still held in its slot """
+		return seq >= 0 and self.seq[seq % self.entries] == seq
+
+	def info(self, seq):
+		""" BlockInfo of block seq, None if it is gone or was queued without one """
+		slot = seq % self.entries
+		info = self.infos[slot]
+		if info is None or self.seq[slot] != seq:
+			return None
+		return BlockInfo(seq, *info)
+
+	def advance(self, seq = None):
+		"""
+		Releases the block returned by peek()
+
+		Passing its seq avoids skipping an extra block when drop-oldest
+		already moved the tail past it
+		"""
+		with self.lock:
+			if self.tail != self.head and (seq is None or self.tail == seq % self.entries):
+				self.tail = (self.tail + 1) % self.entries
+			if self.producerWaiting:
+				self.notFull.notify()
+
+	def get(self, out = None):
+		"""
+		Copies the oldest unread block into out (allocated if None) and
+		releases it, returns (seq, out) or None if the ring is empty
+		"""
+		while True:
+			with self.lock:
+				tail = self.tail
+				if tail == self.head:
+					return None
+				seq = self.seq[tail]
+			if out is None:
+				out = np.empty((self.iqPairs, 2), dtype = self.dtype)
+			np.copyto(out, self.buffer[tail])
+			with self.lock:
+				# drop-oldest may have overwritten the slot while we copied
+				if self.tail == tail and self.seq[tail] == seq:
+					self.tail = (tail + 1) % self.entries
+					if self.producerWaiting:
+						self.notFull.notify()
+					return seq, out
+
+
+class GapDetector():
+	""" Turns the BlockInfo of consecutive blocks into Gap records """
+
+	def __init__(self):
+		self.lastSeq = None
+		self.nextIndex = None
+		self.gaps = 0
+		self.lostSamples = 0
+
+	def reset(self):
+		""" Forgets the last block, e.g. after the stream was restarted """
+		self.lastSeq = None
+		self.nextIndex = None
+
+	def check(self, info, pairs):
+		"""
+		Call with the BlockInfo of every block received, in order, and its
+		I/Q pair count. Returns a Gap if samples are missing before it,
+		else None.
+		"""
+		gap = None
+		if self.nextIndex is not None and info.sampleIndex != self.nextIndex:
+			lost = info.sampleIndex - self.nextIndex
+			gap = Gap(info.seq, self.nextIndex, lost, -(-lost // pairs))
+			self.gaps += 1
+			self.lostSamples += lost
+		self.lastSeq = info.seq
+		self.nextIndex = info.sampleIndex + pairs
+		return gap
@@ -0,0 +1,361 @@
+"""
+IQ stream handling for ExtIO callbacks
+
+Each IQStream owns its own ring buffer and counters, so several
+streams (one per radio) can run in the same process.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+import sys
+import threading
+from ctypes import memmove
+from time import perf_counter_ns
+
+import numpy as np
+
+from .extio import ExtIO
+from .iqring import IQRing
+from .fanout import FanoutRing, Subscriber
+from .shmring import SharedRing
+from .stats import CallbackStats
+from .capabilities import DeviceCapabilities
+
+# storage type of one I or Q sample for each hardware type
+SAMPLE_DTYPES = {
+	ExtIO.ExtHWtype.USBdataU8:	np.dtype(np.uint8),
+	ExtIO.ExtHWtype.USBdataS8:	np.dtype(np.int8),
+	ExtIO.ExtHWtype.USBdata16:	np.dtype('<i2'),
+	ExtIO.ExtHWtype.USBdata24:	np.dtype('V3'),		# packed little endian 3 byte integers
+	ExtIO.ExtHWtype.USBdata32:	np.dtype('<i4'),
+	ExtIO.ExtHWtype.FullPCM32:	np.dtype('<i4'),
+	ExtIO.ExtHWtype.USBfloat32:	np.dtype('<f4'),
+}
+
+# sample format status codes and the hardware type they switch to
+FORMAT_STATUS = {
+	ExtIO.ExtHWstatus.SampleFmt_IQ_UINT8.value:	ExtIO.ExtHWtype.USBdataU8,
+	ExtIO.ExtHWstatus.SampleFmt_IQ_INT16.value:	ExtIO.ExtHWtype.USBdata16,
+	ExtIO.ExtHWstatus.SampleFmt_IQ_INT24.value:	ExtIO.ExtHWtype.USBdata24,
+	ExtIO.ExtHWstatus.SampleFmt_IQ_INT32.value:	ExtIO.ExtHWtype.USBdata32,
+	ExtIO.ExtHWstatus.SampleFmt_IQ_FLT32.value:	ExtIO.ExtHWtype.USBfloat32,
+}
+
+CHANGED_SAMPLERATE = ExtIO.ExtHWstatus.Changed_SampleRate.value
+CHANGED_LO = ExtIO.ExtHWstatus.Changed_LO.value
+CHANGED_SRATES = ExtIO.ExtHWstatus.Changed_SRATES.value
+
+NEVER = sys.maxsize
+
+# a status callback, seq is the first block it applies to and the
+# other fields are the stream state after the change
+StreamEvent = collections.namedtuple('StreamEvent', ['seq', 'status', 'sampleRate', 'frequency', 'hwtype'])
+
+
+class IQStream():
+	""" Moves IQ data from the ExtIO callback into an IQRing """
+
+	def __init__(self, extIO, typesSupported, queueEntries = 64, policy = IQRing.DROP_NEWEST, fanout = False, shared = None, watermark = 1,
+			capabilities = None):
+		"""
+		watermark	blocks wait() and read() gather by default, the callback
+				wakes a waiting consumer once that many are queued
+		fanout		use a FanoutRing read through subscribe() by any number of
+				consumers (policy is then per Subscriber) instead of an IQRing
+		shared		publish into a SharedRing for SharedRingReaders in other
+				processes: True, or the shared memory name to use
+		capabilities	DeviceCapabilities to keep up to date from the status
+				callbacks, one is created when None (fill it with
+				capabilities.refresh() after OpenHW())
+		"""
+		self.extIO = extIO
+		self.typesSupported = typesSupported
+		self.queueEntries = queueEntries
+		self.policy = policy
+		self.fanout = fanout
+		self.shared = shared
+		self.capabilities = capabilities if capabilities is not None else DeviceCapabilities(extIO)
+		self.subscribers = []
+		self.watermark = watermark
+
+		# consumers sleep on dataReady until block wakeSeq is committed
+		self.dataReady = threading.Condition()
+		self.wakeSeq = NEVER
+		self.interrupts = 0
+
+		self.callbackHits = 0
+		self.callbackInfo = 0
+		self.callbackData = 0
+		self.callbackMisses = 0
+		self.ingestNs = 0			# total time spent in data callbacks
+		self.ingestMaxNs = 0
+		self.stats = CallbackStats()		# timing histograms, query with stats.snapshot() / stats.report()
+		self.sampleIndex = 0			# I/Q pairs received while enabled, dropped blocks included
+		self.lostSamples = 0			# I/Q pairs dropped before reaching the ring
+		self.type = extIO.hwtype
+		self.sampleRate = None
+		self.loFreq = extIO.extLOfreq
+		self.enabled = False
+		self.unsupportedType = None		# set when the driver switched to a format not in typesSupported
+		self.listeners = []
+		self.dataListeners = []
+
+		self.ring = None
+		self.entrySize = None
+		self.bytesPerCallback = None
+		self.deltaTimeExpected = None
+		self.deltaNsExpected = None
+
+		self.debugCallbackData = False
+		self.debugCallbackInfo = False
+
+	@property
+	def overruns(self):
+		return self.ring.overruns if self.ring is not None else 0
+
+	@property
+	def nsPerCallback(self):
+		""" Average cost of a data callback in nanoseconds """
+		if self.callbackData == 0:
+			return 0.0
+		return self.ingestNs / self.callbackData
+
+	def setDeltaTimeExpected(self):
+		self.deltaTimeExpected = self.entrySize / self.sampleRate
+		self.deltaNsExpected = int(self.deltaTimeExpected * 1e9)
+		self.stats.deadlineNs = self.deltaNsExpected
+
+	def initBuffers(self):
+		""" Allocates the ring, call after StartHW() once iqPairs and sampleRate are known """
+		if self.type not in SAMPLE_DTYPES:
+			raise ValueError('No sample format for hardware type ' + str(self.type))
+
+		self.entrySize = self.extIO.iqPairs
+		self.loFreq = self.extIO.extLOfreq
+		firstSeq = self.ring.nextSeq if self.ring is not None else 0
+		if self.fanout:
+			ring = FanoutRing(self.queueEntries, self.entrySize, SAMPLE_DTYPES[self.type], firstSeq = firstSeq)
+			for subscriber in self.subscribers:
+				ring.adopt(subscriber)
+			self.ring = ring
+		elif self.shared:
+			dtype = SAMPLE_DTYPES[self.type]
+			if self.ring is not None and self.entrySize * 2 * dtype.itemsize <= self.ring.slotCapacity:
+				# readers follow an in place reformat without reattaching
+				self.ring.reformat(self.entrySize, dtype)
+			else:
+				if self.ring is not None:
+					self.ring.close()
+				name = self.shared if isinstance(self.shared, str) else None
+				self.ring = SharedRing(self.queueEntries, self.entrySize, dtype, name, firstSeq)
+			self.ring.describe(self.type, self.sampleRate, self.loFreq)
+		else:
+			self.ring = IQRing(self.queueEntries, self.entrySize, SAMPLE_DTYPES[self.type], self.policy, firstSeq = firstSeq)
+		self.bytesPerCallback = self.ring.slotBytes
+		self.setDeltaTimeExpected()
+		# waiting consumers move over to the new ring
+		self.signal()
+
+	def close(self):
+		""" Releases the ring, removing the shared memory of a shared stream """
+		if self.shared and self.ring is not None:
+			self.ring.close()
+		self.ring = None
+		self.wake()
+
+	# Consumer wakeups
+
+	def signal(self):
+		""" Wakes the waiting consumers, called by the callback when block wakeSeq arrives """
+		with self.dataReady:
+			self.wakeSeq = NEVER
+			self.dataReady.notify_all()
+
+	def wake(self):
+		""" Makes every current wait() return now, e.g. to let consumer threads see a stop flag """
+		with self.dataReady:
+			self.interrupts += 1
+			self.dataReady.notify_all()
+
+	def wait(self, count = None, timeout = None, reader = None):
+		"""
+		Blocks until count blocks (default the watermark) are queued for
+		reader, timeout seconds pass or wake() is called. reader is the
+		ring by default; fanout and shared streams need one (a Subscriber,
+		or a SharedRingReader), they have no queue of their own. Returns
+		the number of blocks queued.
+		"""
+		if reader is None and (self.fanout or self.shared):
+			raise ValueError('wait() and read() on a fanout or shared stream need a reader (subscribe() or a SharedRingReader)')
+		if count is None:
+			count = self.watermark
+		# a full ring holds queueEntries - 1 blocks
+		count = min(count, self.queueEntries - 1)
+		interrupts = self.interrupts
+
+		def ready():
+			current = reader if reader is not None else self.ring
+			queued = len(current) if current is not None else 0
+			if queued >= count or self.interrupts != interrupts:
+				return True
+			# ask the callback for a signal when the missing blocks are in
+			wakeSeq = self.ring.nextSeq + count - queued - 1 if self.ring is not None else 0
+			if wakeSeq < self.wakeSeq:
+				self.wakeSeq = wakeSeq
+			return False
+
+		with self.dataReady:
+			self.dataReady.wait_for(ready, timeout)
+		current = reader if reader is not None else self.ring
+		return len(current) if current is not None else 0
+
+	def read(self, count = None, timeout = None, reader = None):
+		"""
+		Waits like wait(), then returns a list of up to count (seq, block)
+		copies, an empty list if nothing arrived before the timeout
+		"""
+		if count is None:
+			count = self.watermark
+		self.wait(count, timeout, reader)
+		current = reader if reader is not None else self.ring
+		blocks = []
+		while current is not None and len(blocks) < count:
+			entry = current.get()
+			if entry is None:
+				break
+			blocks.append(entry)
+		return blocks
+
+	def subscribe(self, policy = Subscriber.DROP_OLDEST, name = None):
+		"""
+		New reader of a fanout stream, usable before initBuffers() and
+		carried over to the new ring when a format change replaces it
+		"""
+		if not self.fanout:
+			raise ValueError('subscribe() needs an IQStream created with fanout = True')
+		subscriber = Subscriber(policy, name)
+		self.subscribers.append(subscriber)
+		if self.ring is not None:
+			self.ring.adopt(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		self.subscribers.remove(subscriber)
+		if subscriber.ring is not None:
+			subscriber.ring.unsubscribe(subscriber)
+
+	def addListener(self, listener):
+		"""
+		listener(event) is called from the callback thread with a StreamEvent
+		for every status callback. A format event whose hwtype is not in
+		typesSupported means the stream has disabled itself.
+		"""
+		self.listeners.append(listener)
+
+	def removeListener(self, listener):
+		self.listeners.remove(listener)
+
+	def addDataListener(self, listener):
+		""" listener(seq) is called from the callback thread after block seq is queued, keep it short """
+		self.dataListeners.append(listener)
+
+	def removeDataListener(self, listener):
+		self.dataListeners.remove(listener)
+
+	def notify(self, status):
+		""" Sends a StreamEvent for status to the listeners """
+		event = StreamEvent(self.ring.nextSeq if self.ring is not None else 0, status, self.sampleRate, self.loFreq, self.type)
+		for listener in self.listeners:
+			listener(event)
+
+	def setLO(self, extLOfreq):
+		""" Retunes through the driver and reports it to the listeners as a Changed_LO event """
+		retVal = self.extIO.SetHWLO(extLOfreq)
+		if retVal == 0:
+			self.loFreq = extLOfreq
+			if self.shared and self.ring is not None:
+				self.ring.describe(self.type, self.sampleRate, self.loFreq)
+			self.notify(CHANGED_LO)
+		return retVal
+
+	def iqStreamCallback(self, cnt, status, IQoffs, IQdata):
+		"""
+		callback function, pass to ExtIO.SetCallback()
+
+		Data blocks are copied with a single memmove from the driver
+		pointer into the preallocated address of the next ring slot,
+		so no ctypes array types or NumPy views are created per call
+		"""
+		#  (int cnt, int status, float IQoffs, void *IQdata);
+		t1 = perf_counter_ns()
+
+		self.callbackHits += 1
+
+		if cnt > 0:
+			# we have data
+			if self.enabled:
+				self.callbackData += 1
+
+				ring = self.ring
+				if ring is not None:
+					sampleIndex = self.sampleIndex
+					self.sampleIndex = sampleIndex + self.entrySize
+					address = ring.writeAddress()
+					if address is None:
+						self.lostSamples += self.entrySize
+					else:
+						memmove(address, IQdata, self.bytesPerCallback)
+						seq = ring.commit((sampleIndex, t1, self.loFreq, self.sampleRate))
+						if seq >= self.wakeSeq:
+							self.signal()
+						for listener in self.dataListeners:
+							listener(seq)
+
+				dT = perf_counter_ns() - t1
+				self.ingestNs += dT
+				if dT > self.ingestMaxNs:
+					self.ingestMaxNs = dT
+				if self.deltaNsExpected is not None and dT > self.deltaNsExpected:
+					self.callbackMisses += 1
+				self.stats.record(t1, dT, cnt)
+
+		elif cnt == -1:
+			# we have driver info
+			self.callbackInfo += 1
+
+			# listeners (recorders) get every status change along with the
+			# sequence number of the first block it applies to
+
+			# the cache only goes back to the driver for what the status invalidated
+			self.capabilities.statusChanged(status)
+
+			if status == CHANGED_SAMPLERATE or status == CHANGED_SRATES:
+				self.sampleRate = self.capabilities.sampleRate
+				if self.entrySize is not None:
+					self.setDeltaTimeExpected()
+
+			elif status in FORMAT_STATUS:
+				self.type = FORMAT_STATUS[status]
+				self.capabilities.hwtype = self.type
+				if self.type not in self.typesSupported:
+					# no printing in the driver thread, the listeners get the
+					# format event (event.hwtype not in typesSupported) below
+					self.unsupportedType = self.type
+					self.enabled = False
+				elif self.ring is not None and SAMPLE_DTYPES[self.type] != self.ring.dtype:
+					# sample size changed, consumers pick up the new ring
+					self.initBuffers()
+
+			elif status == CHANGED_LO:
+				self.loFreq = self.extIO.GetHWLO()
+
+			if self.shared and self.ring is not None:
+				self.ring.describe(self.type, self.sampleRate, self.loFreq)
+			if self.listeners:
+				self.notify(status)
+
+		# this is really slow, and if enabled (especially for data)
+		# may cause data loss
+		if (self.debugCallbackData) or (self.debugCallbackInfo and cnt < 0):
+			print('[Callback] ' + str(cnt) + ' ' + str(status) + ' ' + str(IQoffs) + ' ' + str(IQdata))
@@ -0,0 +1,88 @@
+"""
+Numerically controlled oscillator for software tuning
+
+NCO shifts complex blocks in frequency without retuning the radio. A
+block-long table of exp(j w n) is built once per frequency, so each
+block costs one complex multiply per sample plus one scalar phasor
+update; np.exp is never evaluated per sample. The phase is carried
+from block to block and across frequency changes, so the output stays
+continuous when the offset moves.
+
+Requires numpy https://numpy.org/
+"""
+
+import math
+import threading
+
+import numpy as np
+
+
+class NCO():
+	""" Phase continuous complex mixer """
+
+	def __init__(self, sampleRate, frequency = 0.0, tableSize = 4096):
+		"""
+		frequency	shift applied in Hertz: a signal at +frequency offset is brought to 0 Hz by frequency = -offset
+		tableSize	samples per table pass, longer blocks are processed in tableSize pieces
+		"""
+		self.sampleRate = float(sampleRate)
+		self.tableSize = tableSize
+		self.phase = 0.0
+		self.lock = threading.Lock()
+		self.pending = None
+		self.out = np.empty(0, dtype = np.complex64)
+		self.scratch = np.empty(tableSize, dtype = np.complex64)
+		self.setTable(frequency)
+
+	def setTable(self, frequency):
+		self.frequency = float(frequency)
+		self.step = 2.0 * math.pi * self.frequency / self.sampleRate
+		# built in double precision so the table end lines up with the scalar phase update
+		self.table = np.exp(1j * self.step * np.arange(self.tableSize)).astype(np.complex64)
+
+	def setFrequency(self, frequency):
+		""" Changes the shift from the next sample pushed on, the phase carries on from where it is (any thread) """
+		with self.lock:
+			self.pending = float(frequency)
+
+	def tune(self, offset):
+		""" Brings the signal offset Hertz away from the center down to 0 Hz """
+		self.setFrequency(-offset)
+
+	def setSampleRate(self, sampleRate):
+		""" Keeps the shift in Hertz after a sample rate change """
+		with self.lock:
+			self.sampleRate = float(sampleRate)
+			self.pending = self.frequency if self.pending is None else self.pending
+
+	def reset(self, phase = 0.0):
+		self.phase = phase
+
+	def push(self, iq, out = None):
+		"""
+		Returns iq shifted by frequency. Without out, the returned array
+		is reused by the next call; out may be iq itself.
+		"""
+		with self.lock:
+			if self.pending is not None:
+				self.setTable(self.pending)
+				self.pending = None
+
+		iq = np.asarray(iq, dtype = np.complex64)
+		if out is None:
+			if self.out.size < iq.size:
+				self.out = np.empty(iq.size, dtype = np.complex64)
+			out = self.out[:iq.size]
+
+		tableSize = self.tableSize
+		phase = self.phase
+		step = self.step
+		for start in range(0, iq.size, tableSize):
+			n = min(tableSize, iq.size - start)
+			# one scalar exp per piece, the table carries the per sample rotation
+			phasor = np.complex64(complex(math.cos(phase), math.sin(phase)))
+			np.multiply(self.table[:n], phasor, out = self.scratch[:n])
+			np.multiply(iq[start:start + n], self.scratch[:n], out = out[start:start + n])
+			phase = math.fmod(phase + step * n, 2.0 * math.pi)
+		self.phase = phase
+		return out
@@ -0,0 +1,123 @@
+"""
+Streaming Welch power spectral density
+
+PSDAccumulator takes IQ blocks as they come out of the stream and keeps
+a running mean, an exponential average, and min-hold / max-hold spectra
+of the windowed, overlapped periodograms. Memory use is a few
+fftSize-long arrays no matter how long it runs, and snapshot() can be
+called from any thread while blocks keep arriving.
+
+Requires numpy https://numpy.org/
+"""
+
+import threading
+
+import numpy as np
+
+from .spectrogram import Spectrogram
+
+
+class PSDAccumulator():
+	""" Long running averaged power spectrum """
+
+	def __init__(self, fftSize = 1024, overlap = None, window = 'hann', alpha = 0.1, floor = -200.0):
+		"""
+		overlap		samples shared by consecutive frames (default half a frame, as in Welch's method)
+		alpha		weight of each new frame in the exponential average
+		floor		lowest dB value reported
+		"""
+		if overlap is None:
+			overlap = fftSize // 2
+		self.framer = Spectrogram(fftSize, overlap, window, floor = floor)
+		self.fftSize = fftSize
+		self.alpha = alpha
+		# dBFS: a full scale complex tone reads 0 dB
+		self.scale = self.framer.scale
+		self.floorPower = self.framer.floorPower
+		self.lock = threading.Lock()
+
+		self.total = np.zeros(fftSize, dtype = np.float64)
+		self.exponential = np.zeros(fftSize, dtype = np.float32)
+		self.minHold = np.full(fftSize, np.inf, dtype = np.float32)
+		self.maxHold = np.zeros(fftSize, dtype = np.float32)
+		self.frames = 0
+
+		self.reduced = np.empty(fftSize, dtype = np.float32)
+		self.weights = np.empty(0, dtype = np.float32)
+		self.weightsCount = 0
+
+	def reset(self):
+		""" Clears all averages """
+		with self.lock:
+			self.total.fill(0.0)
+			self.exponential.fill(0.0)
+			self.minHold.fill(np.inf)
+			self.maxHold.fill(0.0)
+			self.frames = 0
+		self.framer.reset()
+
+	def frameWeights(self, count):
+		""" alpha * (1 - alpha)^(count - 1 - k), so one dot product applies count EMA steps """
+		if count != self.weightsCount:
+			decay = 1.0 - self.alpha
+			self.weights = (self.alpha * decay ** np.arange(count - 1, -1, -1)).astype(np.float32)
+			self.weightsCount = count
+		return self.weights
+
+	def push(self, iq):
+		""" Adds a block of complex samples, returns the number of new frames """
+		power = self.framer.pushPower(iq)
+		count = power.shape[0]
+		if count == 0:
+			return 0
+
+		reduced = self.reduced
+		with self.lock:
+			np.add.reduce(power, axis = 0, out = reduced)
+			self.total += reduced
+
+			if self.frames == 0:
+				# start the exponential average from the first frame instead of zero
+				self.exponential[...] = power[0]
+			self.exponential *= np.float32((1.0 - self.alpha) ** count)
+			self.exponential += np.dot(self.frameWeights(count), power)
+
+			np.minimum.reduce(power, axis = 0, out = reduced)
+			np.minimum(self.minHold, reduced, out = self.minHold)
+			np.maximum.reduce(power, axis = 0, out = reduced)
+			np.maximum(self.maxHold, reduced, out = self.maxHold)
+			self.frames += count
+		return count
+
+	def toDb(self, power):
+		""" Scaled, fftshifted dB values of an |FFT|^2 spectrum """
+		power = np.fft.fftshift(power.astype(np.float32) * self.scale)
+		np.maximum(power, self.floorPower, out = power)
+		return 10.0 * np.log10(power)
+
+	def snapshot(self):
+		"""
+		Returns a dict of dB spectra with DC in the middle: 'mean',
+		'exponential', 'min' and 'max', plus the 'frames' count
+		"""
+		with self.lock:
+			frames = self.frames
+			total = self.total.copy()
+			exponential = self.exponential.copy()
+			minHold = self.minHold.copy()
+			maxHold = self.maxHold.copy()
+
+		if frames == 0:
+			empty = np.full(self.fftSize, self.framer.floor, dtype = np.float32)
+			return {'frames': 0, 'mean': empty, 'exponential': empty.copy(), 'min': empty.copy(), 'max': empty.copy()}
+		return {
+			'frames': frames,
+			'mean': self.toDb(total / frames),
+			'exponential': self.toDb(exponential),
+			'min': self.toDb(minHold),
+			'max': self.toDb(maxHold),
+		}
+
+	def frequencies(self, sampleRate, centerFrequency = 0.0):
+		""" Frequency of each snapshot value in Hertz """
+		return self.framer.frequencies(sampleRate, centerFrequency)
@@ -0,0 +1,262 @@
+"""
+Memory-mapped reader for IQ recordings
+
+IQFileReader maps WAV, RF64, SigMF and headerless raw captures into
+memory instead of reading them, so opening a multi-GB file is instant
+and memory use stays constant however much of it is processed. Raw
+sample views are zero-copy; decoded complex64 blocks reuse one buffer.
+
+Requires numpy https://numpy.org/
+"""
+
+import datetime
+import json
+import os
+import struct
+
+import numpy as np
+
+from .extio import ExtIO
+from .decode import Decoder, SAMPLE_BYTES
+from .iqstream import SAMPLE_DTYPES
+from .sigmf import SAMPLE_RATE_KEY, HWTYPE_KEY, IQPAIRS_KEY
+from .wavwriter import WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE, RIFF_MAX
+
+HWtype = ExtIO.ExtHWtype
+
+# SigMF datatype to hardware type (ci32_le is taken as full range unless the meta says otherwise)
+SIGMF_HWTYPES = {
+	'cu8':		HWtype.USBdataU8,
+	'ci8':		HWtype.USBdataS8,
+	'ci16_le':	HWtype.USBdata16,
+	'ci32_le':	HWtype.FullPCM32,
+	'cf32_le':	HWtype.USBfloat32,
+}
+
+def parseTime(text):
+	""" Parses a SigMF ISO 8601 datetime """
+	return datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+
+class IQFileReader():
+	""" Random access and block iteration over a recorded IQ file """
+
+	def __init__(self, path, hwtype = None, sampleRate = None, frequency = None):
+		"""
+		path		.wav / .rf64, .sigmf-meta / .sigmf-data (or the SigMF base name), or a raw file
+		hwtype		sample format, required for raw files
+		sampleRate	required for raw files
+		"""
+		self.path = path
+		self.hwtype = hwtype
+		self.sampleRate = sampleRate
+		self.frequency = frequency
+		self.startTime = None
+		self.iqPairs = None		# callback block size, if the recording kept it
+		self.captures = []		# (sampleStart, sampleRate, frequency, datetime or None)
+		self.annotations = []
+		self.dataOffset = 0
+		self.dataBytes = None
+
+		base, ext = os.path.splitext(path)
+		ext = ext.lower()
+		if ext in ('.wav', '.rf64'):
+			dataPath = path
+			self.parseWav(path)
+		elif ext in ('.sigmf-meta', '.sigmf-data') or os.path.exists(path + '.sigmf-meta'):
+			if ext not in ('.sigmf-meta', '.sigmf-data'):
+				base = path
+			dataPath = base + '.sigmf-data'
+			self.parseSigMF(base + '.sigmf-meta')
+		else:
+			if hwtype is None or sampleRate is None:
+				raise ValueError('hwtype and sampleRate are needed for raw files')
+			dataPath = path
+
+		if self.hwtype not in SAMPLE_DTYPES:
+			raise ValueError('Unsupported sample format ' + str(self.hwtype))
+		if not self.captures:
+			self.captures.append((0, self.sampleRate, self.frequency, self.startTime))
+
+		self.blockAlign = 2 * SAMPLE_BYTES[self.hwtype]
+		fileSize = os.path.getsize(dataPath)
+		if self.dataBytes is None or self.dataOffset + self.dataBytes > fileSize:
+			# missing or stale size (crashed recording), use what is on disk
+			self.dataBytes = fileSize - self.dataOffset
+		self.samples = self.dataBytes // self.blockAlign
+
+		if self.samples > 0:
+			self.map = np.memmap(dataPath, dtype = np.uint8, mode = 'r', offset = self.dataOffset, shape = (self.samples * self.blockAlign,))
+		else:
+			self.map = np.zeros(0, dtype = np.uint8)
+		self.pairs = self.map.view(SAMPLE_DTYPES[self.hwtype]).reshape(self.samples, 2)
+		self.decoder = Decoder(self.hwtype)
+		self.position = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def __len__(self):
+		return self.samples
+
+	def close(self):
+		self.pairs = None
+		self.map = None
+
+	# Header parsing
+
+	def parseWav(self, path):
+		with open(path, 'rb') as wavFile:
+			riff, riffSize, wave = struct.unpack('<4sI4s', wavFile.read(12))
+			if riff not in (b'RIFF', b'RF64') or wave != b'WAVE':
+				raise ValueError(path + ' is not a WAV file')
+			ds64DataSize = None
+			while True:
+				header = wavFile.read(8)
+				if len(header) < 8:
+					raise ValueError(path + ' has no data chunk')
+				chunkId, size = struct.unpack('<4sI', header)
+				if chunkId == b'data':
+					self.dataOffset = wavFile.tell()
+					if riff == b'RF64' and size == RIFF_MAX:
+						self.dataBytes = ds64DataSize
+					else:
+						self.dataBytes = size
+					break
+				body = wavFile.read(size + (size & 1))
+				if chunkId == b'ds64':
+					riffSize64, ds64DataSize = struct.unpack('<QQ', body[:16])
+				elif chunkId == b'fmt ':
+					self.parseFmt(body)
+
+	def parseFmt(self, body):
+		tag, channels, sampleRate, byteRate, blockAlign, bits = struct.unpack('<HHIIHH', body[:16])
+		validBits = bits
+		if tag == WAVE_FORMAT_EXTENSIBLE:
+			cbSize, validBits, channelMask = struct.unpack('<HHI', body[16:24])
+			tag = struct.unpack('<H', body[24:26])[0]
+		if channels != 2:
+			raise ValueError('IQ WAV files need 2 channels, found ' + str(channels))
+		self.sampleRate = float(sampleRate)
+
+		if tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+			self.hwtype = HWtype.USBfloat32
+		elif tag == WAVE_FORMAT_PCM and bits == 8:
+			self.hwtype = HWtype.USBdataU8
+		elif tag == WAVE_FORMAT_PCM and bits == 16:
+			self.hwtype = HWtype.USBdata16
+		elif tag == WAVE_FORMAT_PCM and bits == 24:
+			self.hwtype = HWtype.USBdata24
+		elif tag == WAVE_FORMAT_PCM and bits == 32:
+			self.hwtype = HWtype.USBdata32 if validBits == 24 else HWtype.FullPCM32
+		else:
+			raise ValueError('Unsupported WAV format ' + hex(tag) + ' with ' + str(bits) + ' bits')
+
+	def parseSigMF(self, metaPath):
+		with open(metaPath) as metaFile:
+			meta = json.load(metaFile)
+		header = meta['global']
+		datatype = header['core:datatype']
+		if HWTYPE_KEY in header:
+			self.hwtype = HWtype[header[HWTYPE_KEY]]
+			if self.hwtype == HWtype.USBdata24:
+				# the recorder widens 24-bit samples to ci32_le
+				self.hwtype = HWtype.USBdata32
+		elif datatype in SIGMF_HWTYPES:
+			self.hwtype = SIGMF_HWTYPES[datatype]
+		else:
+			raise ValueError('Unsupported SigMF datatype ' + datatype)
+		self.sampleRate = float(header['core:sample_rate'])
+		self.iqPairs = header.get(IQPAIRS_KEY)
+		self.meta = meta
+
+		rate = self.sampleRate
+		for capture in meta.get('captures', []):
+			rate = float(capture.get(SAMPLE_RATE_KEY, rate))
+			when = parseTime(capture['core:datetime']) if 'core:datetime' in capture else None
+			self.captures.append((capture['core:sample_start'], rate, capture.get('core:frequency'), when))
+		if self.captures:
+			self.frequency = self.captures[0][2]
+			self.startTime = self.captures[0][3]
+		self.annotations = meta.get('annotations', [])
+
+	# Time and position
+
+	def timeOf(self, index):
+		""" Seconds from the start of the recording to sample index """
+		seconds = 0.0
+		for i, (start, rate, frequency, when) in enumerate(self.captures):
+			end = self.captures[i + 1][0] if i + 1 < len(self.captures) else None
+			if end is None or index < end:
+				return seconds + (index - start) / rate
+			seconds += (end - start) / rate
+		return seconds
+
+	def indexOf(self, when):
+		""" Sample index at a time, given as seconds from the start or as a datetime """
+		if isinstance(when, datetime.datetime):
+			if self.startTime is None:
+				raise ValueError('Recording has no start time')
+			when = (when - self.startTime).total_seconds()
+		seconds = 0.0
+		for i, (start, rate, frequency, stamp) in enumerate(self.captures):
+			end = self.captures[i + 1][0] if i + 1 < len(self.captures) else None
+			duration = (end - start) / rate if end is not None else None
+			if duration is None or when < seconds + duration:
+				return min(self.samples, max(0, start + int(round((when - seconds) * rate))))
+			seconds += duration
+		return self.samples
+
+	def seek(self, index):
+		""" Moves to sample index (negative counts from the end) """
+		if index < 0:
+			index += self.samples
+		self.position = min(max(0, index), self.samples)
+		return self.position
+
+	def seekTime(self, when):
+		""" Moves to a time, seconds from the start or a datetime """
+		return self.seek(self.indexOf(when))
+
+	def tell(self):
+		return self.position
+
+	# Data access
+
+	def raw(self, start, count):
+		""" Zero-copy (count, 2) view of the stored samples from start """
+		return self.pairs[start:start + count]
+
+	def decode(self, start, count, out = None):
+		""" Decodes count samples from start into complex64 """
+		return self.decoder.decode(self.raw(start, count), out)
+
+	def read(self, count, out = None):
+		""" Decodes count samples from the current position and advances """
+		data = self.decode(self.position, count, out)
+		self.position += data.size
+		return data
+
+	def blocks(self, size, overlap = 0, raw = False, start = None):
+		"""
+		Iterates over blocks of size samples, each starting size - overlap
+		samples after the previous one. Yields (index, block); decoded
+		blocks share one buffer, so copy them to keep them. The last
+		block may be shorter.
+		"""
+		step = size - overlap
+		if step <= 0:
+			raise ValueError('overlap must be smaller than size')
+		index = self.position if start is None else start
+		out = None if raw else np.empty(size, dtype = np.complex64)
+		while index < self.samples:
+			count = min(size, self.samples - index)
+			if raw:
+				yield index, self.raw(index, count)
+			else:
+				yield index, self.decoder.decode(self.raw(index, count), out)
+			index += step
+			self.position = min(index, self.samples)
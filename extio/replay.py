@@ -0,0 +1,143 @@
+"""
+Replay of recorded captures through the ExtIO callback interface
+
+ReplayExtIO behaves like a radio whose data comes from a file read by
+IQFileReader: the registered callback receives blocks of the original
+size and sample format straight from the memory map, either paced at
+the recorded sample rate or as fast as the callback returns. LO and
+sample rate changes and status annotations stored in a SigMF capture
+are sent as status callbacks at the samples where they happened.
+
+Pair unpaced replay with an IQStream using the IQRing.BLOCK policy so
+the replay waits for the consumer instead of overrunning the ring.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+
+import numpy as np
+
+from .extio import ExtIO
+from .iqstream import FORMAT_STATUS
+from .reader import IQFileReader
+from .simulated import SimulatedExtIO
+
+DEFAULT_IQPAIRS = 16384
+
+# annotations that are replayed from the capture segments instead
+SEGMENT_STATUS = (ExtIO.ExtHWstatus.Changed_SampleRate.name, ExtIO.ExtHWstatus.Changed_LO.name)
+
+
+class ReplayExtIO(SimulatedExtIO):
+	""" ExtIO compatible player for IQ recordings """
+
+	def __init__(self, path, iqPairs = None, paced = True, jitter = 0.0, loop = False, hwtype = None, sampleRate = None, frequency = None):
+		"""
+		path		any capture IQFileReader can open (hwtype / sampleRate / frequency describe raw files)
+		iqPairs		I/Q pairs per callback, defaults to the recorded block size
+		paced		True to deliver at the recorded sample rate, False for as fast as possible
+		jitter		standard deviation of the callback period jitter in seconds (paced only)
+		loop		start over at the end instead of stopping
+		"""
+		self.reader = IQFileReader(path, hwtype, sampleRate, frequency)
+		reader = self.reader
+		rates = []
+		for start, rate, freq, when in reader.captures:
+			if rate not in rates:
+				rates.append(rate)
+
+		SimulatedExtIO.__init__(self, hwtype = reader.hwtype, sampleRates = rates, srateIdx = rates.index(reader.captures[0][1]),
+			iqPairs = iqPairs or reader.iqPairs or DEFAULT_IQPAIRS, jitter = jitter, paced = paced,
+			loLimits = (0, 2 ** 63 - 1))
+		self.name = 'Replay'
+		self.model = str(path)
+		self.loop = loop
+		self.loFreq = reader.frequency
+		self.tailBlock = np.zeros((self.simIqPairs, 2), dtype = reader.pairs.dtype)
+		self.schedule = collections.deque()
+		self.position = 0
+
+	def StartHW(self, extLOfreq):
+		""" Starts replay from the current position, the LO comes from the recording when it has one """
+		self.rewindSchedule()
+		iqPairs = SimulatedExtIO.StartHW(self, extLOfreq if self.loFreq is None else self.loFreq)
+		return iqPairs
+
+	def SetHWLO(self, extLOfreq):
+		""" Recorded data cannot be retuned, only the reported LO changes """
+		self.extLOfreq = extLOfreq
+		return 0
+
+	def ExtIoSetSrate(self, idx):
+		""" The rate is set by the recording """
+		return idx == self.srateIdx
+
+	def seek(self, index):
+		""" Moves the replay position to sample index """
+		self.position = self.reader.seek(index)
+		self.rewindSchedule()
+
+	def renderTable(self):
+		# blocks come straight from the file
+		pass
+
+	def rewindSchedule(self):
+		""" Lists (sample index, status, rate, LO) changes from the current position on """
+		reader = self.reader
+		schedule = []
+		for start, rate, freq, when in reader.captures[1:]:
+			schedule.append((start, self.ExtHWstatus.Changed_SampleRate.value, rate, None))
+			schedule.append((start, self.ExtHWstatus.Changed_LO.value, None, freq))
+		for annotation in reader.annotations:
+			name = annotation.get('core:comment')
+			if name not in self.ExtHWstatus.__members__ or name in SEGMENT_STATUS:
+				continue
+			status = self.ExtHWstatus[name].value
+			if status in FORMAT_STATUS:
+				# the sample format is the reader's hwtype, a recorded switch
+				# describes the source radio, not the file being replayed
+				continue
+			schedule.append((annotation['core:sample_start'], status, None, None))
+		schedule.sort(key = lambda item: item[0])
+		self.schedule = collections.deque(item for item in schedule if item[0] >= self.position)
+
+		# state in effect at the current position
+		for start, rate, freq, when in reader.captures:
+			if start <= self.position:
+				self.srateIdx = self.sampleRates.index(rate)
+				if freq is not None:
+					self.loFreq = freq
+
+	def nextBlock(self, index):
+		""" Address of the next recorded block, queuing the status changes it crosses """
+		reader = self.reader
+		if self.position >= reader.samples:
+			if not self.loop or reader.samples == 0:
+				return None
+			self.position = 0
+			self.rewindSchedule()
+
+		end = self.position + self.iqPairs
+		schedule = self.schedule
+		while schedule and schedule[0][0] < end:
+			start, status, rate, freq = schedule.popleft()
+			if rate is not None:
+				if rate == self.sampleRates[self.srateIdx]:
+					continue
+				self.srateIdx = self.sampleRates.index(rate)
+			if status == self.ExtHWstatus.Changed_LO.value:
+				if freq is None or freq == self.extLOfreq:
+					continue
+				self.extLOfreq = freq
+			self.injectStatus(status)
+
+		block = reader.raw(self.position, self.iqPairs)
+		if block.shape[0] < self.iqPairs:
+			# short last block, pad with zeros
+			self.tailBlock[:block.shape[0]] = block
+			self.tailBlock[block.shape[0]:] = 0
+			block = self.tailBlock
+		self.current = block
+		self.position = end
+		return block.ctypes.data
@@ -0,0 +1,216 @@
+"""
+Streaming polyphase FIR resampling
+
+Resampler changes the rate of a complex stream by up / down with a
+polyphase FIR, so only the taps that land on real input samples are
+ever multiplied. Filter history and the output phase are kept between
+blocks: feeding a stream block by block gives exactly the same samples
+as resampling it in one piece, and the work buffers are reused, so a
+steady block size allocates nothing after the first call.
+
+decimator() splits large decimation factors into a chain of smaller
+stages, which needs far fewer taps than one long filter.
+
+Requires numpy https://numpy.org/
+"""
+
+import fractions
+import math
+
+import numpy as np
+
+def lowpass(cutoff, transition, window = 'blackman'):
+	"""
+	Windowed sinc lowpass with unity DC gain, cutoff and transition width
+	in cycles per sample. The length follows from the transition width.
+	"""
+	widths = {'blackman': 5.5, 'hamming': 3.3, 'hann': 3.1}
+	functions = {'blackman': np.blackman, 'hamming': np.hamming, 'hann': np.hanning}
+	length = int(math.ceil(widths[window] / transition)) | 1
+	t = np.arange(length) - (length - 1) / 2.0
+	taps = 2.0 * cutoff * np.sinc(2.0 * cutoff * t) * functions[window](length)
+	return (taps / np.sum(taps)).astype(np.float32)
+
+def stageFactors(factor, maxStage = 8):
+	""" Splits an integer decimation factor into stage factors of at most maxStage (where possible), largest first """
+	primes = []
+	n = factor
+	p = 2
+	while p * p <= n:
+		while n % p == 0:
+			primes.append(p)
+			n //= p
+		p += 1
+	if n > 1:
+		primes.append(n)
+
+	stages = []
+	for prime in sorted(primes, reverse = True):
+		for i, stage in enumerate(stages):
+			if stage * prime <= maxStage:
+				stages[i] *= prime
+				break
+		else:
+			stages.append(prime)
+	return sorted(stages, reverse = True)
+
+
+class Resampler():
+	""" Rational up / down polyphase resampler for complex64 blocks """
+
+	def __init__(self, up = 1, down = 1, taps = None, passband = 0.8, stopband = 1.0, window = 'blackman'):
+		"""
+		up, down	rate change up / down (reduced by their common divisor)
+		taps		filter at the upsampled rate, default designed from passband and stopband
+		passband	edge of the undistorted band, as a fraction of the lower Nyquist frequency
+		stopband	start of the stopband, as a fraction of the lower Nyquist frequency
+				(values up to 2 - passband let aliases fall into the transition band only)
+		"""
+		common = math.gcd(up, down)
+		self.up = up // common
+		self.down = down // common
+		if taps is None:
+			nyquist = 0.5 / max(self.up, self.down)
+			taps = lowpass((passband + stopband) / 2.0 * nyquist, (stopband - passband) * nyquist, window)
+		taps = np.asarray(taps, dtype = np.float32) * np.float32(self.up)
+		if taps.size % self.up:
+			taps = np.concatenate([taps, np.zeros(self.up - taps.size % self.up, dtype = np.float32)])
+		self.taps = taps
+		# phase p holds taps p, p + up, p + 2 up... newest sample last, so reversed
+		self.phaseTaps = np.ascontiguousarray(taps.reshape(-1, self.up).T[:, ::-1])
+		self.phaseLength = self.phaseTaps.shape[1]
+
+		self.history = np.zeros(0, dtype = np.complex64)
+		self.historyCount = 0
+		self.time = 0
+		self.work = np.empty((0, self.phaseLength), dtype = np.complex64)
+		self.out = np.empty(0, dtype = np.complex64)
+		self.reset()
+
+	@classmethod
+	def forRates(cls, inputRate, outputRate, maxDenominator = 1000, **options):
+		""" Resampler from inputRate to (close to) outputRate, e.g. from a rate listed by ExtIoGetSrates """
+		ratio = fractions.Fraction(outputRate / inputRate).limit_denominator(maxDenominator)
+		return cls(ratio.numerator, ratio.denominator, **options)
+
+	@property
+	def delay(self):
+		""" Group delay in input samples """
+		return (self.taps.size - 1) / 2.0 / self.up
+
+	def outputRate(self, sampleRate):
+		return sampleRate * self.up / self.down
+
+	def reset(self):
+		""" Clears the filter history (zeros), e.g. after a gap in the stream """
+		self.historyCount = self.phaseLength - 1
+		if self.history.size < self.historyCount:
+			self.history = np.zeros(self.historyCount, dtype = np.complex64)
+		self.history[:self.historyCount] = 0
+		# position of the next output in upsampled samples, counted from the first new input
+		self.time = 0
+
+	def push(self, iq):
+		"""
+		Adds a block of complex samples and returns the resampled ones.
+		The returned array is reused by the next call, copy it to keep it.
+		"""
+		iq = np.asarray(iq, dtype = np.complex64)
+		length = self.phaseLength
+		total = self.historyCount + iq.size
+		if self.history.size < total:
+			grown = np.empty(max(total, 2 * self.history.size), dtype = np.complex64)
+			grown[:self.historyCount] = self.history[:self.historyCount]
+			self.history = grown
+		self.history[self.historyCount:total] = iq
+
+		# output m uses input (length - 1) + (time + m down) // up, which must be available
+		available = (total - length + 1) * self.up - self.time
+		count = max(0, -(-available // self.down))
+		if self.out.size < count:
+			self.out = np.empty(count, dtype = np.complex64)
+		out = self.out[:count]
+
+		if count:
+			windows = np.lib.stride_tricks.sliding_window_view(self.history[:total], length)
+			# outputs r, r + up, r + 2 up... share a phase and step down inputs at a time
+			for r in range(min(self.up, count)):
+				t = self.time + r * self.down
+				outputs = out[r::self.up]
+				n = outputs.size
+				if self.work.shape[0] < n:
+					self.work = np.empty((n, length), dtype = np.complex64)
+				work = self.work[:n]
+				start = t // self.up
+				np.multiply(windows[start:start + (n - 1) * self.down + 1:self.down], self.phaseTaps[t % self.up], out = work)
+				np.sum(work, axis = 1, out = outputs)
+
+		# drop the inputs no later output needs
+		self.time += count * self.down
+		consumed = self.time // self.up
+		self.time -= consumed * self.up
+		remaining = total - consumed
+		self.history[:remaining] = self.history[consumed:total]
+		self.historyCount = remaining
+		return out
+
+
+class ResamplerChain():
+	""" Resamplers run one after the other """
+
+	def __init__(self, stages):
+		self.stages = list(stages)
+
+	@property
+	def up(self):
+		return math.prod(stage.up for stage in self.stages)
+
+	@property
+	def down(self):
+		return math.prod(stage.down for stage in self.stages)
+
+	@property
+	def delay(self):
+		""" Group delay in input samples """
+		delay = 0.0
+		ratio = 1.0
+		for stage in self.stages:
+			delay += stage.delay * ratio
+			ratio *= stage.down / stage.up
+		return delay
+
+	def outputRate(self, sampleRate):
+		for stage in self.stages:
+			sampleRate = stage.outputRate(sampleRate)
+		return sampleRate
+
+	def reset(self):
+		for stage in self.stages:
+			stage.reset()
+
+	def push(self, iq):
+		""" Runs a block through every stage, the returned array is reused by the next call """
+		for stage in self.stages:
+			iq = stage.push(iq)
+		return iq
+
+def decimator(factor, passband = 0.8, stopband = 1.0, maxStage = 8, window = 'blackman'):
+	"""
+	Decimates by an integer factor in stages of at most maxStage (when the
+	factor allows). Early stages only protect the final passband, letting
+	aliases fall where later stages remove them, so their filters stay short.
+	"""
+	factors = stageFactors(factor, maxStage)
+	stages = []
+	done = 1
+	for stageFactor in factors:
+		done *= stageFactor
+		if done == factor:
+			stages.append(Resampler(1, stageFactor, passband = passband, stopband = stopband, window = window))
+		else:
+			# final passband edge as a fraction of this stage's output Nyquist frequency
+			edge = passband * done / factor
+			stages.append(Resampler(1, stageFactor, passband = edge, stopband = 2.0 - edge, window = window))
+	if len(stages) == 1:
+		return stages[0]
+	return ResamplerChain(stages)
@@ -0,0 +1,227 @@
+"""
+Frequency sweep engine
+
+Scanner steps the LO across a band through IQStream.setLO(), throws
+away the samples that arrive before the hardware has settled (a fixed
+settle interval after the retune, and optionally the wait for the
+driver's Lock_LO status), averages a Welch PSD over the valid samples
+of each step and stitches the steps into one wideband spectrum.
+
+Steps are spaced by a whole number of FFT bins and only the middle
+usable fraction of each step's spectrum is kept, so the stitched bins
+lie on one uniform grid with no overlap and without the roll-off of the
+radio's anti-alias filter. The next retune is issued as soon as a
+step's samples are in, and the step's FFTs run in a worker thread while
+the radio settles on the next frequency (NumPy releases the GIL in the
+FFT), so sweep time is close to (settle + capture) per step.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+from time import perf_counter_ns
+
+import numpy as np
+
+from .extio import ExtIO
+from .decode import Decoder
+from .psd import PSDAccumulator
+
+LOCK_LO = ExtIO.ExtHWstatus.Lock_LO.value
+UNLOCK_LO = ExtIO.ExtHWstatus.Unlock_LO.value
+
+# one stitched spectrum: bin frequencies (Hz), mean power (dBFS), sweep
+# duration in seconds and the LO of every step
+Sweep = collections.namedtuple('Sweep', ['frequencies', 'power', 'seconds', 'steps'])
+
+
+def frequencyPlan(start, stop, sampleRate, fftSize = 1024, usable = 0.8):
+	"""
+	Returns (LO frequencies, bins kept per step) covering start to stop,
+	steps are spaced by the kept bins so their spectra abut exactly
+	"""
+	if stop <= start:
+		raise ValueError('stop must be above start')
+	if not 0.0 < usable <= 1.0:
+		raise ValueError('usable must be between 0 and 1')
+	bins = int(usable * fftSize) // 2 * 2
+	if bins == 0:
+		raise ValueError('usable * fftSize must be at least 2 bins')
+	binWidth = sampleRate / fftSize
+	stepWidth = bins * binWidth
+	steps = max(1, math.ceil((stop - start) / stepWidth))
+	# the first kept bin of the first step sits on start
+	return [int(round(start + (step + 0.5) * stepWidth)) for step in range(steps)], bins
+
+
+class Scanner():
+	""" Sweeps an IQStream's radio across a band and stitches the PSDs """
+
+	def __init__(self, stream, start, stop, fftSize = 1024, frames = 16, usable = 0.8, settle = 0.005,
+			waitLock = False, stepTimeout = 2.0, window = 'hann'):
+		"""
+		stream		a started IQStream (fanout streams are read through their own Subscriber)
+		start, stop	band edges in Hertz
+		frames		FFT frames averaged per step (50% overlap)
+		usable		fraction of each step's spectrum kept, the rest is the filter edges
+		settle		seconds discarded after each retune (after Lock_LO with waitLock)
+		waitLock	also discard samples until the driver reports Lock_LO
+		stepTimeout	seconds without valid samples before a step fails with TimeoutError
+		"""
+		self.stream = stream
+		self.start = start
+		self.stop = stop
+		self.fftSize = fftSize
+		self.frames = frames
+		self.usable = usable
+		self.settleNs = int(settle * 1e9)
+		self.waitLock = waitLock
+		self.stepTimeout = stepTimeout
+
+		self.psd = PSDAccumulator(fftSize, window = window)
+		hop = fftSize - fftSize // 2
+		self.samplesPerStep = fftSize + (frames - 1) * hop
+		self.buffers = [np.empty(self.samplesPerStep, dtype = np.complex64) for i in range(2)]
+		self.worker = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'Scanner')
+
+		self.subscriber = stream.subscribe(name = 'Scanner') if stream.fanout else None
+		self.lockSeq = None
+		self.lockNs = None
+		stream.addListener(self.statusEvent)
+
+		self.sampleRate = None
+		self.plan = None
+		self.discarded = 0		# samples thrown away while settling, over all sweeps
+		self.restarts = 0		# steps restarted because samples were lost mid capture
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def close(self):
+		self.worker.shutdown()
+		self.stream.removeListener(self.statusEvent)
+		if self.subscriber is not None:
+			self.stream.unsubscribe(self.subscriber)
+			self.subscriber = None
+
+	def statusEvent(self, event):
+		""" Stream listener, tracks the LO lock (callback thread) """
+		if event.status == LOCK_LO:
+			self.lockNs = perf_counter_ns()
+			self.lockSeq = event.seq
+		elif event.status == UNLOCK_LO:
+			self.lockSeq = None
+
+	def prepare(self):
+		""" (Re)computes the plan and the stitched grid for the current sample rate """
+		sampleRate = self.stream.sampleRate
+		if sampleRate == self.sampleRate:
+			return
+		self.sampleRate = sampleRate
+		self.plan, self.bins = frequencyPlan(self.start, self.stop, sampleRate, self.fftSize, self.usable)
+		binWidth = sampleRate / self.fftSize
+		offsets = (np.arange(self.bins) - self.bins // 2) * binWidth
+		self.frequencies = (np.array(self.plan, dtype = np.float64)[:, np.newaxis] + offsets).reshape(-1)
+		self.power = np.empty(len(self.plan) * self.bins, dtype = np.float32)
+		first = self.fftSize // 2 - self.bins // 2
+		self.keep = slice(first, first + self.bins)
+		# the last step may run past stop
+		self.inBand = (self.frequencies >= self.start) & (self.frequencies < self.stop)
+
+	def reader(self):
+		return self.subscriber if self.subscriber is not None else self.stream.ring
+
+	def retune(self, frequency):
+		""" Starts the move to frequency, samples count from the returned time on """
+		self.lockSeq = None
+		retVal = self.stream.setLO(frequency)
+		if retVal != 0:
+			raise ValueError('LO ' + str(frequency) + ' Hz is out of range (driver limit ' + str(abs(retVal)) + ' Hz)')
+		self.retuneNs = perf_counter_ns()
+
+	def validFrom(self, seq, info, pairs, frequency):
+		""" Index of the first settled sample in block seq, pairs if none is """
+		if info is None or info.frequency != frequency:
+			return pairs
+		validNs = self.retuneNs
+		if self.waitLock:
+			lockSeq = self.lockSeq
+			if lockSeq is None or seq < lockSeq:
+				return pairs
+			validNs = max(validNs, self.lockNs)
+		validNs += self.settleNs
+		# timeNs is when the block arrived, its first sample is a block duration older
+		firstNs = info.timeNs - pairs / info.sampleRate * 1e9
+		if firstNs >= validNs:
+			return 0
+		return min(pairs, math.ceil((validNs - firstNs) * info.sampleRate / 1e9))
+
+	def capture(self, frequency, buffer):
+		""" Fills buffer with settled, contiguous samples taken at frequency """
+		stream = self.stream
+		filled = 0
+		nextIndex = None
+		deadline = time.monotonic() + self.stepTimeout
+		while filled < buffer.size:
+			reader = self.reader()
+			entry = reader.peek() if reader is not None else None
+			if entry is None:
+				if time.monotonic() > deadline:
+					raise TimeoutError('No settled samples at ' + str(frequency) + ' Hz')
+				stream.wait(timeout = 0.1, reader = self.subscriber)
+				continue
+			seq, block = entry
+			info = reader.info(seq)
+			pairs = block.shape[0]
+			skip = self.validFrom(seq, info, pairs, frequency)
+			self.discarded += skip
+			if skip < pairs:
+				if nextIndex is not None and info.sampleIndex != nextIndex:
+					# lost blocks, the frames must not span the gap
+					self.restarts += 1
+					filled = 0
+				take = min(pairs - skip, buffer.size - filled)
+				self.decoder.decode(block[skip:skip + take], buffer[filled:])
+				filled += take
+				nextIndex = info.sampleIndex + pairs
+			reader.advance(seq)
+
+	def analyze(self, step, buffer):
+		""" Worker thread: PSD of one step into its part of the stitched spectrum """
+		psd = self.psd
+		psd.reset()
+		psd.push(buffer)
+		self.power[step * self.bins:(step + 1) * self.bins] = psd.snapshot()['mean'][self.keep]
+
+	def sweep(self):
+		""" Runs the plan once, returns a Sweep of the band from start to stop """
+		self.prepare()
+		self.decoder = Decoder(self.stream.type)
+		plan = self.plan
+		began = time.perf_counter()
+		pending = None
+		self.retune(plan[0])
+		for step, frequency in enumerate(plan):
+			buffer = self.buffers[step % 2]
+			self.capture(frequency, buffer)
+			# settle on the next frequency while this step is analyzed
+			if step + 1 < len(plan):
+				self.retune(plan[step + 1])
+			if pending is not None:
+				# the previous step's buffer is refilled next
+				pending.result()
+			pending = self.worker.submit(self.analyze, step, buffer)
+		pending.result()
+		seconds = time.perf_counter() - began
+		self.lastSeconds = seconds
+		return Sweep(self.frequencies[self.inBand], self.power[self.inBand].copy(), seconds, list(plan))
+
+	def secondsPerGHz(self):
+		""" Sweep time of the last sweep scaled to 1 GHz of span """
+		return self.lastSeconds / ((self.stop - self.start) / 1e9)
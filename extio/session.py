@@ -0,0 +1,255 @@
+"""
+Several radios in one process
+
+Session opens any number of ExtIO DLLs (or simulated / replayed
+backends), each with its own IQStream: its own callback trampoline
+(the bound iqStreamCallback wrapped by that ExtIO's SetCallback()),
+ring and CallbackStats, so the streams never share state.
+
+An ExtIO DLL keeps its callback and state in module globals, so
+Windows would hand a second load of the same file back as the same
+module. Session loads repeated DLLs from private copies instead, one
+per radio.
+
+All radios share one monotonic clock (perf_counter_ns(), which is what
+IQStream stamps every block with), counted from the session start and
+tied to wall clock time once. Each radio keeps a TimeBase that maps its
+sample counter onto that clock, so samples from different radios can
+be lined up afterwards.
+
+Requires numpy https://numpy.org/
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from time import perf_counter_ns
+
+from .extio import ExtIO
+from .iqring import IQRing
+from .iqstream import IQStream, SAMPLE_DTYPES
+from .simulated import openExtIO
+
+
+class TimeBase():
+	"""
+	Maps one radio's sample counter (BlockInfo.sampleIndex) to the
+	session clock. Callbacks only ever arrive late, so the earliest
+	arrival seen for a sample count is the best estimate of when it was
+	taken: the offset is the lower envelope of arrival time minus
+	sample time.
+	"""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.sampleRate = None
+		self.offsetNs = None		# session clock time of sample 0
+		self.updates = 0
+
+	def update(self, sampleIndex, pairs, timeNs, sampleRate):
+		""" Adds a block of pairs samples starting at sampleIndex that arrived at timeNs (session clock) """
+		if not sampleRate:
+			return
+		if sampleRate != self.sampleRate:
+			# a new rate makes the old estimate meaningless
+			self.reset()
+			self.sampleRate = sampleRate
+		offsetNs = timeNs - (sampleIndex + pairs) * 1e9 / sampleRate
+		if self.offsetNs is None or offsetNs < self.offsetNs:
+			self.offsetNs = offsetNs
+		self.updates += 1
+
+	def sampleTimeNs(self, sampleIndex):
+		""" Session clock time of sample sampleIndex, None before the first block """
+		if self.offsetNs is None:
+			return None
+		return self.offsetNs + sampleIndex * 1e9 / self.sampleRate
+
+	def sampleAt(self, timeNs):
+		""" Sample index taken at session clock time timeNs (fractional), None before the first block """
+		if self.offsetNs is None:
+			return None
+		return (timeNs - self.offsetNs) * self.sampleRate / 1e9
+
+
+class Radio():
+	""" One device of a Session """
+
+	def __init__(self, session, name, extIO, stream):
+		self.session = session
+		self.name = name
+		self.extIO = extIO
+		self.stream = stream
+		self.timeBase = TimeBase()
+		stream.addDataListener(self.blockQueued)
+
+	@property
+	def stats(self):
+		return self.stream.stats
+
+	@property
+	def ring(self):
+		return self.stream.ring
+
+	def blockQueued(self, seq):
+		""" Data listener (callback thread), keeps the TimeBase current """
+		info = self.stream.ring.info(seq)
+		if info is not None:
+			self.timeBase.update(info.sampleIndex, self.stream.entrySize, info.timeNs - self.session.startNs, info.sampleRate)
+
+	def blockTimeNs(self, info):
+		""" Session clock time of the first sample of the block described by info (a BlockInfo) """
+		return self.timeBase.sampleTimeNs(info.sampleIndex)
+
+	def start(self, frequency):
+		""" StartHW and enable the stream, returns the I/Q pairs per block """
+		iqPairs = self.extIO.StartHW(frequency)
+		self.stream.initBuffers()
+		self.timeBase.reset()
+		self.stream.enabled = True
+		return iqPairs
+
+	def stop(self):
+		self.stream.enabled = False
+		self.extIO.StopHW()
+		# let consumers blocked in wait() see the stop
+		self.stream.wake()
+
+
+class Session():
+	""" Opens and runs several radios side by side on one clock """
+
+	def __init__(self, typesSupported = None, queueEntries = 64, policy = IQRing.DROP_NEWEST, **streamOptions):
+		"""
+		typesSupported, queueEntries, policy and streamOptions (fanout,
+		shared, watermark) are the defaults for every radio's IQStream
+		"""
+		self.typesSupported = typesSupported if typesSupported is not None else list(SAMPLE_DTYPES)
+		self.queueEntries = queueEntries
+		self.policy = policy
+		self.streamOptions = streamOptions
+		self.radios = {}
+		self.dllPaths = set()
+		self.copyDir = None
+		# one clock for everyone, anchored to wall time once
+		self.startNs = perf_counter_ns()
+		self.startTimeNs = time.time_ns()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def __iter__(self):
+		return iter(self.radios.values())
+
+	def __getitem__(self, name):
+		return self.radios[name]
+
+	def __len__(self):
+		return len(self.radios)
+
+	def clockNs(self):
+		""" Session clock: nanoseconds since the session started """
+		return perf_counter_ns() - self.startNs
+
+	def wallTimeNs(self, clockNs):
+		""" Wall clock time (ns since the epoch) of a session clock time """
+		return self.startTimeNs + clockNs
+
+	def privateCopy(self, dllName):
+		""" Path to load dllName from, a copy when the same DLL already backs another radio """
+		path = os.path.realpath(dllName)
+		if path not in self.dllPaths:
+			self.dllPaths.add(path)
+			return dllName
+		if self.copyDir is None:
+			self.copyDir = tempfile.mkdtemp(prefix = 'extio-session-')
+		stem, extension = os.path.splitext(os.path.basename(path))
+		copy = os.path.join(self.copyDir, stem + '_' + str(len(self.radios)) + extension)
+		shutil.copyfile(path, copy)
+		return copy
+
+	def add(self, device, name = None, sampleRateIndex = None, **streamOptions):
+		"""
+		Opens a radio and returns its Radio
+
+		device		ExtIO DLL path, 'sim[:hwtype]', 'replay:<recording>', or an ExtIO object
+		name		key in the session (default radio0, radio1...)
+		streamOptions	override the session's IQStream options for this radio
+		"""
+		if name is None:
+			name = 'radio' + str(len(self.radios))
+		if name in self.radios:
+			raise ValueError('A radio named ' + name + ' is already open')
+		if isinstance(device, str):
+			if device.startswith('sim') or device.startswith('replay:'):
+				extIO = openExtIO(device)
+			else:
+				extIO = ExtIO(self.privateCopy(device))
+		else:
+			extIO = device
+
+		extIO.InitHW()
+		options = {'queueEntries': self.queueEntries, 'policy': self.policy}
+		options.update(self.streamOptions)
+		options.update(streamOptions)
+		typesSupported = options.pop('typesSupported', self.typesSupported)
+		if extIO.hwtype not in typesSupported:
+			raise ValueError(name + ': unsupported hardware type ' + str(extIO.hwtype))
+		stream = IQStream(extIO, typesSupported, **options)
+		extIO.SetCallback(stream.iqStreamCallback)
+		if not extIO.OpenHW():
+			raise OSError(name + ': OpenHW failed')
+		capabilities = stream.capabilities.refresh()
+		if sampleRateIndex is not None:
+			capabilities.setSampleRate(sampleRateIndex)
+		stream.type = extIO.hwtype
+		stream.sampleRate = capabilities.sampleRate
+
+		radio = Radio(self, name, extIO, stream)
+		self.radios[name] = radio
+		return radio
+
+	def start(self, frequencies):
+		""" Starts every radio, frequencies is one LO for all or a dict of name: LO """
+		for radio in self:
+			frequency = frequencies[radio.name] if isinstance(frequencies, dict) else frequencies
+			radio.start(frequency)
+
+	def stop(self):
+		for radio in self:
+			if radio.stream.enabled:
+				radio.stop()
+
+	def close(self):
+		""" Stops and closes every radio and removes the DLL copies """
+		self.stop()
+		for radio in self:
+			radio.extIO.CloseHW()
+			radio.stream.close()
+		self.radios = {}
+		if self.copyDir is not None:
+			# still mapped DLLs cannot be deleted on Windows, the temp dir is cleaned later
+			shutil.rmtree(self.copyDir, ignore_errors = True)
+			self.copyDir = None
+
+	def align(self, radio, sampleIndex, other):
+		""" Sample index (fractional) of radio other taken at the same time as sample sampleIndex of radio """
+		timeNs = self[radio].timeBase.sampleTimeNs(sampleIndex)
+		if timeNs is None:
+			return None
+		return self[other].timeBase.sampleAt(timeNs)
+
+	def report(self):
+		""" Human readable timing summary of every radio """
+		lines = []
+		for radio in self:
+			lines.append(radio.name + ' (' + str(radio.extIO.name) + ', ' + str(radio.stream.type.name) + ')')
+			lines.append(radio.stats.report())
+			lines.append('Overruns = ' + str(radio.stream.overruns) + ', lost samples = ' + str(radio.stream.lostSamples))
+		return '\n'.join(lines)
@@ -0,0 +1,307 @@
+"""
+IQ ring in shared memory, for processing in worker processes
+
+SharedRing is a FanoutRing whose slots, sequence numbers and stream
+description live in a multiprocessing.shared_memory block, so the
+callback process only ingests (IQStream copies each block straight into
+the shared slots) while any number of worker processes attach a
+SharedRingReader by name and do the heavy NumPy work outside the
+callback process's GIL. Readers get zero-copy views of the slots and
+detect being lapped through the per-slot sequence numbers, exactly
+like a Subscriber.
+
+Slots are sized for the widest sample format, so a change of sample
+format during streaming reformats the ring in place and readers follow
+it without reattaching.
+
+Requires numpy https://numpy.org/
+"""
+
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .extio import ExtIO
+from .fanout import Subscriber
+from .iqring import BlockInfo
+
+MAGIC = int.from_bytes(b'ExtIOshm', 'little')
+VERSION = 2
+HEADER_BYTES = 128
+DATA_ALIGNMENT = 4096
+MAX_SAMPLE_BYTES = 4
+
+# header words
+MAGIC_WORD = 0
+VERSION_WORD = 1
+ENTRIES_WORD = 2
+SLOT_CAPACITY_WORD = 3
+IQPAIRS_WORD = 4
+DTYPE_WORD = 5
+GENERATION_WORD = 6
+NEXT_SEQ_WORD = 7
+HWTYPE_WORD = 8
+SAMPLE_RATE_WORD = 9			# float64
+FREQUENCY_WORD = 10			# float64
+CLOSED_WORD = 11
+FORMAT_SEQ_WORD = 12			# first block in the current format
+
+# sample storage types, by the code kept in the header
+DTYPE_CODES = [np.dtype(np.uint8), np.dtype(np.int8), np.dtype('<i2'), np.dtype('V3'), np.dtype('<i4'), np.dtype('<f4')]
+
+def attachShared(name):
+	""" Opens an existing SharedMemory block without handing it to this process's resource tracker """
+	try:
+		return shared_memory.SharedMemory(name = name, track = False)
+	except TypeError:
+		pass
+	# before Python 3.13 attaching registers the block (on POSIX), and the
+	# tracker would unlink it when this process exits
+	memory = shared_memory.SharedMemory(name = name)
+	if os.name == 'posix':
+		from multiprocessing import resource_tracker
+		resource_tracker.unregister(memory._name, 'shared_memory')
+	return memory
+
+def trackShared(memory):
+	"""
+	Registers a block the creator is about to unlink: a reader forked
+	from the creator shares its resource tracker and unregistering in
+	attachShared() removed the creator's entry too
+	"""
+	if os.name == 'posix':
+		from multiprocessing import resource_tracker
+		resource_tracker.register(memory._name, 'shared_memory')
+
+class SharedRingView():
+	""" The ring fields of a SharedRing block, as seen by either side """
+
+	def __init__(self, memory):
+		self.memory = memory
+		self.header = np.ndarray((HEADER_BYTES // 8,), dtype = np.int64, buffer = memory.buf)
+		self.floats = self.header.view(np.float64)
+		if self.header[MAGIC_WORD] != MAGIC:
+			raise ValueError(memory.name + ' is not a SharedRing')
+		if self.header[VERSION_WORD] != VERSION:
+			raise ValueError('SharedRing version ' + str(int(self.header[VERSION_WORD])) + ' is not supported')
+		self.entries = int(self.header[ENTRIES_WORD])
+		self.slotCapacity = int(self.header[SLOT_CAPACITY_WORD])
+		self.seq = np.ndarray((self.entries,), dtype = np.int64, buffer = memory.buf, offset = HEADER_BYTES)
+		# per slot sampleIndex, timeNs (int64) and frequency, sampleRate (float64)
+		self.counters = np.ndarray((self.entries, 2), dtype = np.int64, buffer = memory.buf, offset = HEADER_BYTES + 8 * self.entries)
+		self.rates = np.ndarray((self.entries, 2), dtype = np.float64, buffer = memory.buf, offset = HEADER_BYTES + 24 * self.entries)
+		self.dataOffset = dataOffset(self.entries)
+		self.generation = None
+		self.refresh()
+
+	@property
+	def name(self):
+		return self.memory.name
+
+	@property
+	def nextSeq(self):
+		return int(self.header[NEXT_SEQ_WORD])
+
+	@property
+	def closed(self):
+		return bool(self.header[CLOSED_WORD])
+
+	@property
+	def hwtype(self):
+		value = int(self.header[HWTYPE_WORD])
+		return ExtIO.ExtHWtype(value) if value else None
+
+	@property
+	def sampleRate(self):
+		return float(self.floats[SAMPLE_RATE_WORD])
+
+	@property
+	def frequency(self):
+		return float(self.floats[FREQUENCY_WORD])
+
+	def refresh(self):
+		""" Rebuilds the slot views after the producer reformatted the ring, returns True if it did """
+		generation = int(self.header[GENERATION_WORD])
+		if generation == self.generation:
+			return False
+		self.generation = generation
+		self.iqPairs = int(self.header[IQPAIRS_WORD])
+		self.dtype = DTYPE_CODES[int(self.header[DTYPE_WORD])]
+		itemsize = self.dtype.itemsize
+		self.slotBytes = self.iqPairs * 2 * itemsize
+		self.buffer = np.ndarray((self.entries, self.iqPairs, 2), dtype = self.dtype, buffer = self.memory.buf,
+			offset = self.dataOffset, strides = (self.slotCapacity, 2 * itemsize, itemsize))
+		return True
+
+	def info(self, seq):
+		""" BlockInfo of block seq, None if it is gone """
+		slot = seq % self.entries
+		sampleIndex, timeNs = self.counters[slot]
+		frequency, sampleRate = self.rates[slot]
+		if self.seq[slot] != seq or sampleIndex < 0:
+			return None
+		return BlockInfo(seq, int(sampleIndex), int(timeNs), float(frequency), float(sampleRate))
+
+	def release(self):
+		""" Drops the NumPy views so the block can be closed """
+		self.header = None
+		self.floats = None
+		self.seq = None
+		self.counters = None
+		self.rates = None
+		self.buffer = None
+
+def dataOffset(entries):
+	end = HEADER_BYTES + 40 * entries
+	return (end + DATA_ALIGNMENT - 1) // DATA_ALIGNMENT * DATA_ALIGNMENT
+
+
+class SharedRing(SharedRingView):
+	""" Producer side: creates the block and fills it like a FanoutRing """
+
+	def __init__(self, entries, iqPairs, dtype = np.int16, name = None, firstSeq = 0, maxIqPairs = None):
+		"""
+		name		shared memory name for the readers, generated when None (see .name)
+		maxIqPairs	largest block size reformat() will accept, default iqPairs
+		"""
+		if entries < 2:
+			raise ValueError('SharedRing needs at least 2 entries')
+		slotCapacity = (maxIqPairs or iqPairs) * 2 * MAX_SAMPLE_BYTES
+		slotCapacity = (slotCapacity + 63) // 64 * 64
+		size = dataOffset(entries) + entries * slotCapacity
+		memory = shared_memory.SharedMemory(name = name, create = True, size = size)
+
+		header = np.ndarray((HEADER_BYTES // 8,), dtype = np.int64, buffer = memory.buf)
+		header[:] = 0
+		header[MAGIC_WORD] = MAGIC
+		header[VERSION_WORD] = VERSION
+		header[ENTRIES_WORD] = entries
+		header[SLOT_CAPACITY_WORD] = slotCapacity
+		header[NEXT_SEQ_WORD] = firstSeq
+		del header
+		SharedRingView.__init__(self, memory)
+		self.nextSeqLocal = firstSeq
+		self.reformat(iqPairs, dtype)
+
+	@property
+	def nextSeq(self):
+		return self.nextSeqLocal
+
+	@property
+	def overruns(self):
+		""" The producer never waits or drops, readers count their own losses """
+		return 0
+
+	def reformat(self, iqPairs, dtype):
+		""" Changes block size and sample type in place, invalidating the queued blocks """
+		dtype = np.dtype(dtype)
+		if iqPairs * 2 * dtype.itemsize > self.slotCapacity:
+			raise ValueError('Blocks of ' + str(iqPairs) + ' pairs do not fit the SharedRing slots')
+		self.seq[:] = -1
+		self.header[IQPAIRS_WORD] = iqPairs
+		self.header[DTYPE_WORD] = DTYPE_CODES.index(dtype)
+		self.header[FORMAT_SEQ_WORD] = self.nextSeqLocal
+		self.header[GENERATION_WORD] += 1
+		self.refresh()
+		self.addresses = [self.buffer[i].ctypes.data for i in range(self.entries)]
+
+	def describe(self, hwtype, sampleRate, frequency):
+		""" Publishes the stream parameters for the readers """
+		self.header[HWTYPE_WORD] = hwtype.value if hwtype is not None else 0
+		self.floats[SAMPLE_RATE_WORD] = sampleRate or 0.0
+		self.floats[FREQUENCY_WORD] = frequency or 0.0
+
+	def close(self, unlink = True):
+		""" Marks the ring closed for the readers, then releases (and by default removes) the block """
+		if self.header is None:
+			return
+		self.header[CLOSED_WORD] = 1
+		self.release()
+		self.addresses = []
+		self.memory.close()
+		if unlink:
+			trackShared(self.memory)
+			self.memory.unlink()
+
+	# Producer side, same calls as FanoutRing
+
+	def writeSlot(self):
+		slot = self.nextSeqLocal % self.entries
+		self.seq[slot] = -1
+		return self.buffer[slot]
+
+	def writeAddress(self):
+		slot = self.nextSeqLocal % self.entries
+		self.seq[slot] = -1
+		return self.addresses[slot]
+
+	def commit(self, info = None):
+		seq = self.nextSeqLocal
+		slot = seq % self.entries
+		if info is not None:
+			sampleIndex, timeNs, frequency, sampleRate = info
+			counters = self.counters[slot]
+			counters[0] = sampleIndex
+			counters[1] = timeNs
+			rates = self.rates[slot]
+			rates[0] = frequency or 0.0
+			rates[1] = sampleRate or 0.0
+		else:
+			self.counters[slot, 0] = -1
+		self.seq[slot] = seq
+		self.nextSeqLocal = seq + 1
+		self.header[NEXT_SEQ_WORD] = seq + 1
+		return seq
+
+	def put(self, block, info = None):
+		slot = self.writeSlot()
+		slot[...] = np.reshape(block, slot.shape)
+		return self.commit(info)
+
+
+class SharedRingReader(Subscriber):
+	""" Worker process side: a Subscriber attached to a SharedRing by name """
+
+	def __init__(self, name, policy = Subscriber.DROP_OLDEST):
+		Subscriber.__init__(self, policy, name)
+		self.ring = SharedRingView(attachShared(name))
+		self.cursor = self.ring.nextSeq
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	@property
+	def closed(self):
+		return self.ring.closed
+
+	@property
+	def hwtype(self):
+		return self.ring.hwtype
+
+	@property
+	def sampleRate(self):
+		return self.ring.sampleRate
+
+	@property
+	def frequency(self):
+		return self.ring.frequency
+
+	def locate(self):
+		# a reformat invalidated the blocks queued before it
+		if self.ring.refresh():
+			formatSeq = int(self.ring.header[FORMAT_SEQ_WORD])
+			if formatSeq > self.cursor:
+				self.overruns += formatSeq - self.cursor
+				self.cursor = formatSeq
+		return Subscriber.locate(self)
+
+	def close(self):
+		""" Detaches, views returned by peek() must no longer be in use """
+		ring = self.ring
+		if ring is not None and ring.header is not None:
+			ring.release()
+			ring.memory.close()
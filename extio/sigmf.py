@@ -0,0 +1,289 @@
+"""
+SigMF recording of an IQStream
+
+Writes a <name>.sigmf-data file of raw samples and a <name>.sigmf-meta
+JSON file (https://github.com/sigmf/SigMF). Status callbacks from the
+driver become annotations at the exact sample index where they took
+effect; LO and sample rate changes also start a new capture segment.
+SigMF allows one datatype per recording, so a sample format change
+closes the recording and continues in <name>-1, <name>-2, ...
+
+The recorder is a background thread that drains the stream ring and
+writes the data in large chunks.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+import datetime
+import json
+import threading
+import time
+
+import numpy as np
+
+from .extio import ExtIO
+from .decode import Decoder, asBytes
+from .iqstream import CHANGED_SAMPLERATE, CHANGED_LO, FORMAT_STATUS
+from .iqring import GapDetector
+
+HWtype = ExtIO.ExtHWtype
+
+SIGMF_VERSION = '1.0.0'
+
+# SigMF datatype of each hardware type, 24-bit samples are widened to 32 bits
+DATATYPES = {
+	HWtype.USBdataU8:	'cu8',
+	HWtype.USBdataS8:	'ci8',
+	HWtype.USBdata16:	'ci16_le',
+	HWtype.USBdata24:	'ci32_le',
+	HWtype.USBdata32:	'ci32_le',
+	HWtype.FullPCM32:	'ci32_le',
+	HWtype.USBfloat32:	'cf32_le',
+}
+
+# capture segment key for the sample rate, which core SigMF only has globally
+EXTENSION = 'extio'
+SAMPLE_RATE_KEY = EXTENSION + ':sample_rate'
+# original hardware type, ci32_le alone does not tell 24-bit from full range data
+HWTYPE_KEY = EXTENSION + ':hwtype'
+# I/Q pairs per callback, so a replay can use the original block size
+IQPAIRS_KEY = EXTENSION + ':iq_pairs'
+
+def isoNow():
+	return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def statusName(status):
+	try:
+		return ExtIO.ExtHWstatus(status).name
+	except ValueError:
+		return 'status ' + str(status)
+
+
+class SigMFRecorder (threading.Thread):
+	""" Records an IQStream to SigMF data/meta file pairs """
+
+	def __init__(self, basePath, stream, description = None, author = None, chunkBytes = 4 * 1024 * 1024, pollInterval = 1.0):
+		"""
+		basePath	file name without the .sigmf-data / .sigmf-meta extension
+		stream		a plain or fanout IQStream (fanout streams are read through the recorder's own Subscriber)
+		chunkBytes	bytes gathered before each write to disk
+		pollInterval	longest wait for the stream's watermark of blocks, in seconds
+		"""
+		if stream.shared:
+			raise ValueError('SigMFRecorder cannot read a shared stream, record it through a fanout stream instead')
+		threading.Thread.__init__(self)
+		self.basePath = basePath
+		self.stream = stream
+		self.description = description
+		self.author = author
+		self.pollInterval = pollInterval
+		self.stopping = False
+
+		self.chunk = np.empty(chunkBytes, dtype = np.uint8)
+		self.fill = 0
+
+		self.events = collections.deque()
+		self.part = 0
+		self.paths = []
+		self.dataFile = None
+		self.decoder = None
+		self.ring = None
+		self.scratch = None
+
+		self.samples = 0		# samples in the current recording
+		self.totalSamples = 0
+		self.lastSeq = None
+		self.gaps = 0
+		self.gapDetector = GapDetector()
+
+		self.subscriber = stream.subscribe(name = 'SigMFRecorder') if stream.fanout else None
+		self.listener = self.events.append
+		stream.addListener(self.listener)
+
+	@property
+	def stop(self):
+		return self.stopping
+
+	@stop.setter
+	def stop(self, value):
+		""" Setting stop also wakes the recorder from its wait on the stream """
+		self.stopping = value
+		if value:
+			self.stream.wake()
+
+	def partPath(self):
+		if self.part == 0:
+			return self.basePath
+		return self.basePath + '-' + str(self.part)
+
+	def openPart(self):
+		""" Starts a new data/meta pair for the stream's current format """
+		self.hwtype = self.stream.type
+		self.datatype = DATATYPES[self.hwtype]
+		self.decoder = Decoder(self.hwtype) if self.hwtype == HWtype.USBdata24 else None
+		path = self.partPath()
+		self.paths.append(path)
+		self.dataFile = open(path + '.sigmf-data', 'wb')
+		self.samples = 0
+		self.sampleRate = self.stream.sampleRate
+		self.meta = {
+			'global': {
+				'core:datatype': self.datatype,
+				'core:sample_rate': self.sampleRate,
+				'core:version': SIGMF_VERSION,
+				'core:recorder': 'ExtIO-Python',
+				'core:hw': str(self.stream.extIO.name) + ' ' + str(self.stream.extIO.model),
+				'core:extensions': [{'name': EXTENSION, 'version': '1.0.0', 'optional': True}],
+				HWTYPE_KEY: self.hwtype.name,
+				IQPAIRS_KEY: self.stream.entrySize,
+			},
+			'captures': [],
+			'annotations': [],
+		}
+		if self.description is not None:
+			self.meta['global']['core:description'] = self.description
+		if self.author is not None:
+			self.meta['global']['core:author'] = self.author
+		self.addCapture(self.stream.sampleRate, self.stream.loFreq)
+		self.writeMeta()
+
+	def closePart(self):
+		self.flush()
+		self.dataFile.close()
+		self.dataFile = None
+		self.writeMeta()
+		self.part += 1
+
+	def addCapture(self, sampleRate, frequency):
+		capture = {'core:sample_start': self.samples, 'core:datetime': isoNow()}
+		if frequency is not None:
+			capture['core:frequency'] = float(frequency)
+		if sampleRate is not None:
+			capture[SAMPLE_RATE_KEY] = float(sampleRate)
+		captures = self.meta['captures']
+		if captures and captures[-1]['core:sample_start'] == self.samples:
+			# several changes at the same sample merge into one segment
+			captures[-1].update(capture)
+		else:
+			captures.append(capture)
+
+	def annotate(self, comment, count = None):
+		annotation = {'core:sample_start': self.samples, 'core:comment': comment}
+		if count is not None:
+			annotation['core:sample_count'] = count
+		self.meta['annotations'].append(annotation)
+
+	def writeMeta(self):
+		""" Rewrites the meta file, so it is valid at any time """
+		with open(self.paths[-1] + '.sigmf-meta', 'w') as metaFile:
+			json.dump(self.meta, metaFile, indent = 2)
+
+	def applyEvents(self, seq):
+		""" Applies the status events that take effect before block seq """
+		while self.events and self.events[0].seq <= seq:
+			event = self.events.popleft()
+			status = event.status
+			# USBdata24, USBdata32 and FullPCM32 share ci32_le but not their
+			# scaling or decoding, so any hardware type change starts a new part
+			if status in FORMAT_STATUS and event.hwtype != self.hwtype:
+				self.annotate('Format changed to ' + str(event.hwtype) + ', continued in next recording')
+				self.closePart()
+				self.openPart()
+				self.annotate(statusName(status))
+				continue
+			if status == CHANGED_SAMPLERATE or status == CHANGED_LO:
+				self.addCapture(event.sampleRate, event.frequency)
+			self.annotate(statusName(status))
+
+	def write(self, block):
+		""" Adds one block to the chunk buffer, converting 24-bit samples to 32 bits """
+		if self.decoder is not None:
+			block = self.decoder.samples(block)
+		src = asBytes(block)
+		offset = 0
+		while offset < src.size:
+			count = min(src.size - offset, self.chunk.size - self.fill)
+			self.chunk[self.fill:self.fill + count] = src[offset:offset + count]
+			self.fill += count
+			offset += count
+			if self.fill == self.chunk.size:
+				self.flush()
+
+	def flush(self):
+		if self.fill:
+			self.dataFile.write(self.chunk[:self.fill])
+			self.fill = 0
+
+	def take(self, ring):
+		"""
+		Copies the next block out of ring, returns (seq, block, info) or
+		None. The producer does not wait for the recorder: a slot it
+		reused during the copy is dropped, and the next block reports the
+		gap, instead of being written half overwritten.
+		"""
+		entry = ring.peek()
+		while entry is not None:
+			seq, block = entry
+			info = ring.info(seq)
+			scratch = self.scratch
+			if scratch is None or scratch.shape != block.shape or scratch.dtype != block.dtype:
+				scratch = self.scratch = np.empty_like(block)
+			np.copyto(scratch, block)
+			valid = ring.isValid(seq)
+			ring.advance(seq)
+			if valid:
+				return seq, scratch, info
+			entry = ring.peek()
+		return None
+
+	def drain(self, ring):
+		entry = self.take(ring)
+		while entry is not None:
+			seq, block, info = entry
+			self.applyEvents(seq)
+			gap = self.gapDetector.check(info, block.shape[0]) if info is not None else None
+			if gap is not None:
+				# samples were lost to overruns, the data is joined without them
+				self.gaps += 1
+				self.annotate('Gap of ' + str(gap.lostSamples) + ' samples')
+			elif info is None and self.lastSeq is not None and seq != self.lastSeq + 1:
+				self.gaps += 1
+				self.annotate('Gap of ' + str(seq - self.lastSeq - 1) + ' blocks')
+			self.write(block)
+			pairs = block.shape[0]
+			self.samples += pairs
+			self.totalSamples += pairs
+			self.lastSeq = seq
+			entry = self.take(ring)
+
+	def run(self):
+		self.openPart()
+		try:
+			lastMeta = time.monotonic()
+			while True:
+				ring = self.stream.ring
+				if self.subscriber is not None:
+					# the subscriber moves to a new ring by itself
+					self.drain(self.subscriber)
+				elif ring is not None:
+					if self.ring is not None and ring is not self.ring:
+						# the stream replaced its ring, finish the old one first
+						self.drain(self.ring)
+					self.ring = ring
+					self.drain(ring)
+				if self.stop:
+					break
+				if time.monotonic() - lastMeta > 5.0:
+					self.writeMeta()
+					lastMeta = time.monotonic()
+				self.stream.wait(timeout = self.pollInterval, reader = self.subscriber)
+			if self.stream.ring is not None:
+				self.applyEvents(self.stream.ring.nextSeq)
+		finally:
+			# whatever went wrong, keep what was recorded so far
+			if self.dataFile is not None:
+				self.closePart()
+			self.stream.removeListener(self.listener)
+			if self.subscriber is not None:
+				self.stream.unsubscribe(self.subscriber)
@@ -0,0 +1,322 @@
+"""
+Simulated ExtIO driver
+
+SimulatedExtIO has the same surface as ExtIO but runs entirely in
+process: a timer thread calls the registered callback with blocks of
+synthetic IQ data (tone, noise or chirp) in any hardware format, at the
+selected sample rate, with optional jitter and injected status events.
+No DLL or Windows is needed, so the stream, recorder and examples can
+be tested and benchmarked on any host.
+
+The signal is rendered once into a table of blocks when the hardware
+is started, so producing 10+ MS/s costs no more than the callback
+itself.
+
+Requires numpy https://numpy.org/
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+from .extio import ExtIO, CALLBACK_TYPE, PROTOTYPES
+from .decode import encode, SAMPLE_BYTES
+from .iqstream import FORMAT_STATUS
+
+
+class SimulatedExtIO(ExtIO):
+	""" In process stand-in for an ExtIO DLL """
+
+	TONE = 'tone'
+	NOISE = 'noise'
+	CHIRP = 'chirp'
+
+	def __init__(self, hwtype = ExtIO.ExtHWtype.USBdata16, sampleRates = (192000.0, 2.0e6, 5.0e6, 10.0e6), srateIdx = 0,
+			iqPairs = 16384, signal = TONE, toneOffset = 10000.0, amplitude = 0.5, noiseLevel = 0.01, chirpSpan = None,
+			jitter = 0.0, events = (), tableBlocks = 16, loLimits = (100000, 3000000000), seed = 0, paced = True, lockTime = None):
+		"""
+		hwtype		sample format delivered to the callback
+		sampleRates	rates reported by ExtIoGetSrates(), srateIdx selects the starting one
+		iqPairs		I/Q pairs per data callback
+		signal		TONE, NOISE or CHIRP
+		toneOffset	tone frequency relative to the LO in Hertz
+		chirpSpan	chirp sweep width in Hertz (default: 80% of the sample rate)
+		jitter		standard deviation of the callback period jitter in seconds
+		events		(seconds after StartHW, status) pairs sent as status callbacks
+		tableBlocks	number of distinct blocks rendered before the signal repeats
+		paced		False delivers blocks as fast as the callback returns
+		lockTime	seconds from SetHWLO() to a Lock_LO status (after an immediate
+				Unlock_LO), None sends neither
+		"""
+		self.extIo = None
+		self.functions = None
+		self.exports = {name: True for name in PROTOTYPES}
+		self.name = 'Simulated'
+		self.model = 'SimulatedExtIO'
+		self.hwtype = None
+		self.callback = None
+		self.iqPairs = None
+		self.extLOfreq = None
+
+		self.simHwtype = hwtype
+		self.sampleRates = list(sampleRates)
+		self.srateIdx = srateIdx
+		self.simIqPairs = iqPairs
+		self.signal = signal
+		self.toneOffset = toneOffset
+		self.amplitude = amplitude
+		self.noiseLevel = noiseLevel
+		self.chirpSpan = chirpSpan
+		self.jitter = jitter
+		self.events = sorted(events, key = lambda event: event[0])
+		self.tableBlocks = tableBlocks
+		self.loLimits = loLimits
+		self.seed = seed
+		self.paced = paced
+		self.lockTime = lockTime
+		self.lockDue = None
+		self.settings = [
+			{'description': 'Signal', 'value': signal},
+			{'description': 'Tone Offset', 'value': str(toneOffset)},
+			{'description': 'Amplitude', 'value': str(amplitude)},
+		]
+
+		self.opened = False
+		self.running = False
+		self.thread = None
+		self.pendingStatus = collections.deque()
+		self.blocks = None		# (table, block addresses), swapped as one so the thread never sees a freed table
+		self.current = None
+		self.done = threading.Event()
+		self.blocksSent = 0
+		self.lateBlocks = 0
+
+	# Mandatory Functions
+
+	def InitHW(self):
+		""" Returns name, model and hwtype like the DLL call """
+		self.hwtype = self.ExtHWtype(self.simHwtype)
+		return self.name, self.model, self.hwtype
+
+	def SetCallback(self, callbackFunction):
+		""" Wraps the callback in the same C function type the DLL uses """
+		self.callback = CALLBACK_TYPE(callbackFunction)
+
+	def OpenHW(self):
+		self.opened = True
+		return True
+
+	def StartHW(self, extLOfreq):
+		""" Starts the timer thread, returns the number of I/Q pairs per callback """
+		if self.running:
+			self.StopHW()
+		self.iqPairs = self.simIqPairs
+		self.extLOfreq = extLOfreq
+		self.renderTable()
+		self.running = True
+		self.done.clear()
+		self.thread = threading.Thread(target = self.run, name = 'SimulatedExtIO', daemon = True)
+		self.thread.start()
+		return self.iqPairs
+
+	StartHW64 = StartHW
+
+	def StopHW(self):
+		self.running = False
+		if self.thread is not None and self.thread is not threading.current_thread():
+			self.thread.join()
+		self.thread = None
+
+	def CloseHW(self):
+		self.StopHW()
+		self.opened = False
+		return True
+
+	def SetHWLO(self, extLOfreq):
+		""" Same return convention as ExtIO.SetHWLO() """
+		low, high = self.loLimits
+		if extLOfreq < low:
+			return -low
+		if extLOfreq > high:
+			return high
+		self.extLOfreq = extLOfreq
+		if self.lockTime is not None:
+			self.injectStatus(self.ExtHWstatus.Unlock_LO)
+			self.lockDue = time.perf_counter() + self.lockTime
+		return 0
+
+	SetHWLO64 = SetHWLO
+
+	def GetHWLO(self):
+		return self.extLOfreq
+
+	# Optional Functions
+
+	def ExtIoGetSrates(self, idx = None):
+		if idx is None:
+			self.sRates = list(self.sampleRates)
+			return self.sRates
+		if 0 <= idx < len(self.sampleRates):
+			return self.sampleRates[idx]
+		return None
+
+	def ExtIoGetActualSrateIdx(self):
+		self.actualSrateIdx = self.srateIdx
+		return self.actualSrateIdx
+
+	def ExtIoSetSrate(self, idx):
+		""" Changes the rate and reports Changed_SampleRate from the driver thread, like real hardware """
+		if not (0 <= idx < len(self.sampleRates)):
+			return False
+		if idx != self.srateIdx:
+			self.srateIdx = idx
+			if self.running:
+				self.renderTable()
+			self.injectStatus(self.ExtHWstatus.Changed_SampleRate)
+		return True
+
+	def ExtIoGetSetting(self, idx = None):
+		if idx is None:
+			return list(self.settings)
+		if 0 <= idx < len(self.settings):
+			return self.settings[idx]['description'], self.settings[idx]['value']
+		return None, None
+
+	def ExtIoGetFreqRanges(self, idx = None):
+		if idx is None:
+			return [tuple(self.loLimits)]
+		if idx == 0:
+			return tuple(self.loLimits)
+		return None
+
+	def ShowGUI(self):
+		pass
+
+	def HideGUI(self):
+		pass
+
+	def SwitchGUI(self):
+		pass
+
+	# Simulation control
+
+	def injectStatus(self, status):
+		""" Queues a status callback (cnt = -1), delivered before the next data block """
+		if isinstance(status, self.ExtHWstatus):
+			status = status.value
+		self.pendingStatus.append(status)
+
+	def sampleRate(self):
+		return self.sampleRates[self.srateIdx]
+
+	def renderTable(self):
+		""" Renders tableBlocks blocks of the configured signal in the hardware format """
+		sampleRate = self.sampleRate()
+		n = self.simIqPairs * self.tableBlocks
+		rng = np.random.default_rng(self.seed)
+		t = np.arange(n, dtype = np.float64) / sampleRate
+
+		if self.signal == self.NOISE:
+			iq = np.zeros(n, dtype = np.complex128)
+		elif self.signal == self.CHIRP:
+			span = self.chirpSpan if self.chirpSpan is not None else 0.8 * sampleRate
+			duration = n / sampleRate
+			phase = 2.0 * np.pi * (-span / 2.0 * t + span / (2.0 * duration) * t * t)
+			iq = self.amplitude * np.exp(1j * phase)
+		else:
+			# whole number of cycles in the table so it repeats without a phase jump
+			cycles = round(self.toneOffset * n / sampleRate)
+			iq = self.amplitude * np.exp(2j * np.pi * cycles * np.arange(n) / n)
+
+		if self.noiseLevel > 0.0 or self.signal == self.NOISE:
+			level = self.noiseLevel if self.signal != self.NOISE else self.amplitude
+			iq = iq + level * (rng.standard_normal(n) + 1j * rng.standard_normal(n)) / np.sqrt(2.0)
+
+		hwtype = self.ExtHWtype(self.simHwtype)
+		table = encode(iq, hwtype)
+		blockBytes = self.simIqPairs * 2 * SAMPLE_BYTES[hwtype]
+		table = table.reshape(self.tableBlocks, blockBytes)
+		self.blocks = (table, [table[i].ctypes.data for i in range(self.tableBlocks)])
+
+	def run(self):
+		""" Timer thread, delivers one block per period """
+		rng = np.random.default_rng(self.seed + 1)
+		events = collections.deque(self.events)
+		start = time.perf_counter()
+		nextTime = start
+		index = 0
+
+		while self.running:
+			now = time.perf_counter()
+			while events and (now - start) >= events[0][0]:
+				self.injectStatus(events.popleft()[1])
+			if self.lockDue is not None and now >= self.lockDue:
+				self.lockDue = None
+				self.injectStatus(self.ExtHWstatus.Lock_LO)
+			self.deliverStatus()
+
+			address = self.nextBlock(index)
+			# changes found while fetching the block go out ahead of it
+			self.deliverStatus()
+			if address is None:
+				# nothing left to deliver
+				self.callback(-1, self.ExtHWstatus.Stop.value, 0.0, None)
+				self.running = False
+				break
+			self.callback(self.iqPairs, 0, 0.0, address)
+			index += 1
+			self.blocksSent += 1
+
+			if not self.paced:
+				continue
+
+			period = self.iqPairs / self.sampleRate()
+			if self.jitter > 0.0:
+				nextTime += max(0.0, period + rng.normal(0.0, self.jitter))
+			else:
+				nextTime += period
+
+			delay = nextTime - time.perf_counter()
+			if delay > 0.0:
+				time.sleep(delay)
+			elif delay < -0.1:
+				# fell too far behind (consumer too slow), resynchronize instead of bursting
+				self.lateBlocks += 1
+				nextTime = time.perf_counter()
+
+		self.done.set()
+
+	def deliverStatus(self):
+		""" Sends the queued status callbacks """
+		while self.pendingStatus:
+			status = self.pendingStatus.popleft()
+			if status in FORMAT_STATUS:
+				# switch the delivered format along with the announcement
+				self.simHwtype = FORMAT_STATUS[status]
+				self.hwtype = self.simHwtype
+				self.renderTable()
+			self.callback(-1, status, 0.0, None)
+
+	def nextBlock(self, index):
+		""" Address of data block index, or None at the end of the data """
+		# keep the table referenced while the callback reads from it
+		self.current, addresses = self.blocks
+		return addresses[index % len(addresses)]
+
+
+def openExtIO(dllName):
+	"""
+	Returns an ExtIO for dllName, a SimulatedExtIO when dllName is
+	'sim' or 'sim:<ExtHWtype name>' (for example 'sim:USBdata24'), or
+	a ReplayExtIO when it is 'replay:<recording>'
+	"""
+	if dllName.startswith('replay:'):
+		from .replay import ReplayExtIO
+		return ReplayExtIO(dllName.split(':', 1)[1])
+	if dllName == 'sim' or dllName.startswith('sim:'):
+		if ':' in dllName:
+			return SimulatedExtIO(hwtype = ExtIO.ExtHWtype[dllName.split(':', 1)[1]])
+		return SimulatedExtIO()
+	return ExtIO(dllName)
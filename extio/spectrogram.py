@@ -0,0 +1,180 @@
+"""
+Batched spectrogram (waterfall) engine
+
+Frames are strided views over the incoming samples, so one windowed,
+batched FFT call handles every frame of a block. Everything stays in
+complex64/float32 and all work buffers are reused, so a Spectrogram
+can be fed one stream block at a time and keep up at full sample rate.
+
+Requires numpy https://numpy.org/ (NumPy 2 runs the FFT in single
+precision; older versions compute it in double precision)
+"""
+
+import numpy as np
+
+try:
+	np.fft.fft(np.zeros(2, dtype = np.complex64), out = np.empty(2, dtype = np.complex64))
+	FFT_OUT = True
+except TypeError:
+	FFT_OUT = False
+
+def makeWindow(window, size):
+	""" Returns a float32 window from a name ('hann', 'hamming', 'blackman', 'rect') or an array """
+	if window is None or (isinstance(window, str) and window in ('rect', 'none')):
+		return np.ones(size, dtype = np.float32)
+	if isinstance(window, str):
+		functions = {'hann': np.hanning, 'hanning': np.hanning, 'hamming': np.hamming, 'blackman': np.blackman}
+		if window not in functions:
+			raise ValueError('Unknown window ' + window)
+		return functions[window](size).astype(np.float32)
+	window = np.asarray(window, dtype = np.float32)
+	if window.shape != (size,):
+		raise ValueError('window must have fftSize values')
+	return window
+
+def fftBatch(frames, out):
+	""" FFT along the last axis into out """
+	if FFT_OUT:
+		return np.fft.fft(frames, axis = -1, out = out)
+	out[...] = np.fft.fft(frames, axis = -1)
+	return out
+
+
+class Spectrogram():
+	""" Streaming power spectrogram in dB, one row per averaged group of frames """
+
+	def __init__(self, fftSize = 1024, overlap = 0, window = 'hann', average = 1, floor = -200.0):
+		"""
+		overlap		samples shared by consecutive frames
+		average		frames averaged (in power) into each output row
+		floor		lowest dB value reported, instead of log10(0) errors on gaps or silence
+		"""
+		if not 0 <= overlap < fftSize:
+			raise ValueError('overlap must be between 0 and fftSize - 1')
+		self.fftSize = fftSize
+		self.hop = fftSize - overlap
+		self.average = average
+		self.floor = floor
+		self.window = makeWindow(window, fftSize)
+		# full scale complex tone reads 0 dB, and sums of average frames become means
+		self.scale = np.float32(1.0 / (float(np.sum(self.window)) ** 2 * average))
+		self.floorPower = np.float32(10.0 ** (floor / 10.0))
+
+		self.pending = np.empty(0, dtype = np.complex64)
+		self.pendingCount = 0
+		self.frames = None
+		self.spectrum = None
+		self.powers = None
+		self.rows = None
+		self.sums = None
+
+	def buffers(self, frameCount):
+		""" Grows the work buffers to hold frameCount frames """
+		if self.frames is None or self.frames.shape[0] < frameCount:
+			self.frames = np.empty((frameCount, self.fftSize), dtype = np.complex64)
+			self.spectrum = np.empty((frameCount, self.fftSize), dtype = np.complex64)
+			self.powers = np.empty((frameCount, self.fftSize), dtype = np.float32)
+			self.rows = np.empty((frameCount // self.average, self.fftSize), dtype = np.float32)
+			self.sums = np.empty((frameCount // self.average, self.fftSize), dtype = np.float32)
+
+	def frequencies(self, sampleRate, centerFrequency = 0.0):
+		""" Frequency of each output column in Hertz """
+		return centerFrequency + np.fft.fftshift(np.fft.fftfreq(self.fftSize, 1.0 / sampleRate))
+
+	def rowTime(self, sampleRate):
+		""" Seconds covered by one output row """
+		return self.hop * self.average / sampleRate
+
+	def reset(self):
+		""" Drops buffered samples, e.g. after a gap in the stream """
+		self.pendingCount = 0
+
+	def push(self, iq):
+		"""
+		Adds a block of complex samples and returns the rows it completes,
+		shape (rows, fftSize) in dB with DC in the middle. The returned
+		array is reused by the next call, copy it to keep it.
+		"""
+		return self.pushFrames(iq, self.compute)
+
+	def pushPower(self, iq):
+		"""
+		Adds a block of complex samples and returns the unscaled |FFT|^2
+		of every frame it completes, shape (frames, fftSize) in FFT order
+		(DC first). The returned array is reused by the next call.
+		"""
+		return self.pushFrames(iq, self.power)
+
+	def pushFrames(self, iq, process):
+		""" Buffers iq and runs process(samples, frameCount) on the complete frames """
+		iq = np.asarray(iq, dtype = np.complex64)
+		total = self.pendingCount + iq.size
+		if self.pending.size < total:
+			grown = np.empty(max(total, 2 * self.pending.size), dtype = np.complex64)
+			grown[:self.pendingCount] = self.pending[:self.pendingCount]
+			self.pending = grown
+		self.pending[self.pendingCount:total] = iq
+
+		frameCount = self.frameCount(total)
+		if frameCount == 0:
+			self.pendingCount = total
+			return np.empty((0, self.fftSize), dtype = np.float32)
+
+		result = process(self.pending[:total], frameCount)
+
+		# keep the samples the next frame starts with
+		consumed = frameCount * self.hop
+		remaining = total - consumed
+		self.pending[:remaining] = self.pending[consumed:total]
+		self.pendingCount = remaining
+		return result
+
+	def frameCount(self, samples):
+		""" Number of frames (a multiple of average) that fit in samples """
+		frameCount = 0 if samples < self.fftSize else (samples - self.fftSize) // self.hop + 1
+		return frameCount - frameCount % self.average
+
+	def power(self, iq, frameCount = None):
+		""" Unscaled |FFT|^2 of each windowed frame of iq, in FFT order """
+		iq = np.asarray(iq, dtype = np.complex64)
+		if frameCount is None:
+			frameCount = self.frameCount(iq.size)
+		self.buffers(frameCount)
+
+		view = np.lib.stride_tricks.sliding_window_view(iq, self.fftSize)[::self.hop][:frameCount]
+		frames = self.frames[:frameCount]
+		np.multiply(view, self.window, out = frames)
+		spectrum = fftBatch(frames, self.spectrum[:frameCount])
+
+		power = self.powers[:frameCount]
+		np.square(spectrum.real, out = power)
+		# the frames are no longer needed, use them as scratch for imag^2
+		scratch = frames.real
+		np.square(spectrum.imag, out = scratch)
+		power += scratch
+		return power
+
+	def compute(self, iq, frameCount = None):
+		""" Spectrogram rows of iq on its own, without the samples buffered by push() """
+		iq = np.asarray(iq, dtype = np.complex64)
+		if frameCount is None:
+			frameCount = self.frameCount(iq.size)
+		power = self.power(iq, frameCount)
+
+		rowCount = frameCount // self.average
+		grouped = power.reshape(rowCount, self.average, self.fftSize)
+		rows = self.rows[:rowCount]
+		# average and fftshift in one pass, np.fft.fftshift splits at (n + 1) // 2 for odd n
+		half = (self.fftSize + 1) // 2
+		if self.average == 1:
+			rows[:, :self.fftSize - half] = grouped[:, 0, half:]
+			rows[:, self.fftSize - half:] = grouped[:, 0, :half]
+		else:
+			sums = np.sum(grouped, axis = 1, out = self.sums[:rowCount])
+			rows[:, :self.fftSize - half] = sums[:, half:]
+			rows[:, self.fftSize - half:] = sums[:, :half]
+		np.multiply(rows, self.scale, out = rows)
+		np.maximum(rows, self.floorPower, out = rows)
+		np.log10(rows, out = rows)
+		np.multiply(rows, np.float32(10.0), out = rows)
+		return rows
@@ -0,0 +1,181 @@
+"""
+Fixed memory callback timing statistics
+
+LatencyHistogram counts nanosecond values in logarithmic buckets
+(subBuckets per power of two, so every bucket is within 1 / subBuckets
+of its values) held in one preallocated list: recording is a handful of
+integer operations, memory does not grow however long it runs, and
+percentiles can be read from any thread at any time.
+
+CallbackStats keeps one histogram of callback execution times and one
+of the intervals between callbacks, plus deadline misses and
+throughput. IQStream records into one for every data callback.
+"""
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram():
+	""" Log bucketed histogram of positive integers (nanoseconds) """
+
+	def __init__(self, subBits = 4, maxBits = 40):
+		"""
+		subBits		2 ** subBits buckets per power of two
+		maxBits		values from 2 ** maxBits (about 18 minutes in ns) on share the last bucket
+		"""
+		self.subBits = subBits
+		self.subBuckets = 1 << subBits
+		self.mask = self.subBuckets - 1
+		self.maxValue = (1 << maxBits) - 1
+		self.counts = [0] * self.bucketIndex(self.maxValue) + [0]
+		self.count = 0
+		self.total = 0
+		self.max = 0
+		self.min = None
+
+	def reset(self):
+		self.counts = [0] * len(self.counts)
+		self.count = 0
+		self.total = 0
+		self.max = 0
+		self.min = None
+
+	def bucketIndex(self, value):
+		""" Exact buckets below subBuckets, then subBuckets per power of two """
+		if value < self.subBuckets:
+			return value
+		shift = value.bit_length() - 1 - self.subBits
+		return ((shift + 1) << self.subBits) + ((value >> shift) & self.mask)
+
+	def bucketRange(self, index):
+		""" Lowest value and width of bucket index """
+		if index < self.subBuckets:
+			return index, 1
+		shift = (index >> self.subBits) - 1
+		return (self.subBuckets + (index & self.mask)) << shift, 1 << shift
+
+	def record(self, value):
+		if value < 0:
+			value = 0
+		elif value > self.maxValue:
+			value = self.maxValue
+		# inlined bucketIndex(), this runs in the callback
+		if value < self.subBuckets:
+			index = value
+		else:
+			shift = value.bit_length() - 1 - self.subBits
+			index = ((shift + 1) << self.subBits) + ((value >> shift) & self.mask)
+		self.counts[index] += 1
+		self.count += 1
+		self.total += value
+		if value > self.max:
+			self.max = value
+		if self.min is None or value < self.min:
+			self.min = value
+
+	def percentile(self, percent, counts = None):
+		""" Value below which percent of the recorded values fall (bucket midpoint), None if empty """
+		if counts is None:
+			counts = list(self.counts)
+		total = sum(counts)
+		if total == 0:
+			return None
+		rank = percent / 100.0 * total
+		seen = 0
+		for index, n in enumerate(counts):
+			seen += n
+			if n and seen >= rank:
+				low, width = self.bucketRange(index)
+				return min(low + (width - 1) / 2.0, self.max)
+		return self.max
+
+	def mean(self):
+		return self.total / self.count if self.count else None
+
+	def snapshot(self, percentiles = PERCENTILES):
+		""" Dict of count, min, mean, max and the percentiles ('p50', 'p99', 'p99.9'...) """
+		counts = list(self.counts)
+		result = {'count': self.count, 'min': self.min, 'mean': self.mean(), 'max': self.max}
+		for percent in percentiles:
+			result['p' + format(percent, 'g')] = self.percentile(percent, counts)
+		return result
+
+	def buckets(self):
+		""" (low, width, count) of every non-empty bucket, for plotting """
+		return [self.bucketRange(index) + (n,) for index, n in enumerate(list(self.counts)) if n]
+
+
+class CallbackStats():
+	""" Execution time, interval, deadline and throughput statistics of data callbacks """
+
+	def __init__(self, deadlineNs = None):
+		"""
+		deadlineNs	time one block lasts (iqPairs / sampleRate), a callback
+				running longer than that is a deadline miss
+		"""
+		self.deadlineNs = deadlineNs
+		self.execution = LatencyHistogram()
+		self.interval = LatencyHistogram()
+		self.reset()
+
+	def reset(self):
+		self.execution.reset()
+		self.interval.reset()
+		self.blocks = 0
+		self.samples = 0
+		self.misses = 0			# callbacks longer than the deadline
+		self.lateIntervals = 0		# gaps between callbacks longer than twice the deadline
+		self.firstNs = None
+		self.lastNs = None
+
+	def record(self, startNs, durationNs, pairs):
+		""" Adds one data callback that started at startNs (perf_counter_ns) and delivered pairs I/Q pairs """
+		self.execution.record(durationNs)
+		lastNs = self.lastNs
+		if lastNs is None:
+			self.firstNs = startNs
+		else:
+			interval = startNs - lastNs
+			self.interval.record(interval)
+			if self.deadlineNs is not None and interval > 2 * self.deadlineNs:
+				self.lateIntervals += 1
+		self.lastNs = startNs
+		self.blocks += 1
+		self.samples += pairs
+		if self.deadlineNs is not None and durationNs > self.deadlineNs:
+			self.misses += 1
+
+	def samplesPerSecond(self):
+		""" Average I/Q pairs per second between the first and the last callback """
+		if self.firstNs is None or self.lastNs == self.firstNs:
+			return 0.0
+		# the last block's samples arrive after lastNs, count one block less
+		return (self.samples - self.samples / self.blocks) / ((self.lastNs - self.firstNs) / 1e9)
+
+	def snapshot(self):
+		""" Dict of all the statistics, times in nanoseconds """
+		return {
+			'blocks': self.blocks,
+			'samples': self.samples,
+			'samplesPerSecond': self.samplesPerSecond(),
+			'deadlineNs': self.deadlineNs,
+			'misses': self.misses,
+			'lateIntervals': self.lateIntervals,
+			'execution': self.execution.snapshot(),
+			'interval': self.interval.snapshot(),
+		}
+
+	def report(self):
+		""" Human readable summary, times in microseconds """
+		snapshot = self.snapshot()
+		lines = ['Blocks = ' + str(snapshot['blocks']) + ', ' + format(snapshot['samplesPerSecond'] / 1e6, '.3f') + ' MS/s']
+		if self.deadlineNs is not None:
+			lines.append('Deadline (us) = ' + format(self.deadlineNs / 1e3, '.1f') +
+				', misses = ' + str(self.misses) + ', late intervals = ' + str(self.lateIntervals))
+		for name in ('execution', 'interval'):
+			values = snapshot[name]
+			if values['count'] == 0:
+				continue
+			fields = [key + ' ' + format(values[key] / 1e3, '.1f') for key in ('p50', 'p99', 'p99.9', 'max')]
+			lines.append(name.capitalize() + ' (us): ' + ', '.join(fields))
+		return '\n'.join(lines)
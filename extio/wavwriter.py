@@ -0,0 +1,197 @@
+"""
+Streaming WAV / RF64 writer for IQ recordings
+
+Blocks from the stream are gathered into large, aligned chunks before
+they reach the disk, so a recording costs one write() per chunk rather
+than one per callback. The header reserves room for an RF64 ds64 chunk
+(EBU Tech 3306), so captures that grow past 4 GiB are converted to RF64
+in place when the header is finalized. The header is also refreshed
+periodically while recording, so a crashed capture stays readable up
+to the last refresh.
+
+Formats: 8-bit (signed data is stored offset binary, as WAV requires),
+16-bit PCM, packed 24-bit, 32-bit PCM (24 valid bits for USBdata32)
+via WAVE_FORMAT_EXTENSIBLE, and 32-bit IEEE float.
+
+Requires numpy https://numpy.org/
+"""
+
+import os
+import struct
+import time
+
+import numpy as np
+
+from .extio import ExtIO
+from .decode import asBytes, SAMPLE_BYTES
+
+HWtype = ExtIO.ExtHWtype
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# tail of the KSDATAFORMAT_SUBTYPE_xxx GUIDs, the format tag goes in front
+GUID_TAIL = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+SPEAKER_FRONT_LEFT_RIGHT = 0x3
+
+RIFF_MAX = 0xFFFFFFFF
+DS64_SIZE = 28
+
+# (format tag, valid bits per sample) for each hardware type
+WAV_FORMATS = {
+	HWtype.USBdataU8:	(WAVE_FORMAT_PCM, 8),
+	HWtype.USBdataS8:	(WAVE_FORMAT_PCM, 8),
+	HWtype.USBdata16:	(WAVE_FORMAT_PCM, 16),
+	HWtype.USBdata24:	(WAVE_FORMAT_PCM, 24),
+	HWtype.USBdata32:	(WAVE_FORMAT_PCM, 24),
+	HWtype.FullPCM32:	(WAVE_FORMAT_PCM, 32),
+	HWtype.USBfloat32:	(WAVE_FORMAT_IEEE_FLOAT, 32),
+}
+
+
+class WavWriter():
+	""" Writes raw IQ blocks of one hardware type to a WAV (or RF64) file """
+
+	def __init__(self, fileName, hwtype, sampleRate, chunkBytes = 4 * 1024 * 1024, alignment = 4096, headerInterval = 5.0):
+		"""
+		chunkBytes	bytes gathered before each write to disk (rounded to alignment)
+		alignment	file offset alignment of the sample data and of every chunk write
+		headerInterval	seconds between header refreshes while recording (None to only write it on close)
+		"""
+		if hwtype not in WAV_FORMATS:
+			raise ValueError('No WAV format for hardware type ' + str(hwtype))
+
+		self.fileName = fileName
+		self.hwtype = hwtype
+		self.sampleRate = int(sampleRate)
+		self.sampleBytes = SAMPLE_BYTES[hwtype]
+		self.blockAlign = 2 * self.sampleBytes
+		self.alignment = alignment
+		self.headerInterval = headerInterval
+
+		chunkBytes = max(alignment, chunkBytes - chunkBytes % alignment)
+		self.chunk = np.empty(chunkBytes, dtype = np.uint8)
+		self.fill = 0
+
+		self.dataBytes = 0		# sample bytes already on disk
+		self.rf64 = False
+		self.lastHeader = time.monotonic()
+
+		self.file = open(fileName, 'wb')
+		self.header = self.buildHeader()
+		self.dataOffset = len(self.header)
+		self.file.write(self.header)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	@property
+	def samples(self):
+		""" I/Q pairs written so far, including data still in the chunk buffer """
+		return (self.dataBytes + self.fill) // self.blockAlign
+
+	def buildHeader(self):
+		""" Returns the header for the current data size """
+		tag, validBits = WAV_FORMATS[self.hwtype]
+		bits = 8 * self.sampleBytes
+		extensible = bits > 16 or validBits != bits or tag != WAVE_FORMAT_PCM
+
+		if extensible:
+			fmt = struct.pack('<HHIIHHHHI', WAVE_FORMAT_EXTENSIBLE, 2, self.sampleRate, self.sampleRate * self.blockAlign,
+				self.blockAlign, bits, 22, validBits, SPEAKER_FRONT_LEFT_RIGHT)
+			fmt += struct.pack('<H', tag) + GUID_TAIL
+		else:
+			fmt = struct.pack('<HHIIHH', tag, 2, self.sampleRate, self.sampleRate * self.blockAlign, self.blockAlign, bits)
+
+		samples = self.dataBytes // self.blockAlign
+		dataSize = self.dataBytes
+		chunks = []
+		if self.rf64:
+			chunks.append(b'ds64' + struct.pack('<IQQQI', DS64_SIZE, 0, dataSize, samples, 0))
+		else:
+			# placeholder, becomes ds64 if the file grows past 4 GiB
+			chunks.append(b'JUNK' + struct.pack('<I', DS64_SIZE) + bytes(DS64_SIZE))
+		chunks.append(b'fmt ' + struct.pack('<I', len(fmt)) + fmt)
+		if tag != WAVE_FORMAT_PCM:
+			chunks.append(b'fact' + struct.pack('<II', 4, min(samples, RIFF_MAX)))
+
+		body = b''.join(chunks)
+		# pad so the sample data starts on an alignment boundary
+		used = 12 + len(body) + 8
+		pad = (-used) % self.alignment
+		if pad:
+			if pad < 8:
+				pad += self.alignment
+			body += b'JUNK' + struct.pack('<I', pad - 8) + bytes(pad - 8)
+
+		fileSize = 12 + len(body) + 8 + dataSize
+		if self.rf64:
+			header = b'RF64' + struct.pack('<I', RIFF_MAX) + b'WAVE' + body + b'data' + struct.pack('<I', RIFF_MAX)
+			# real RIFF size goes in the ds64 chunk
+			header = header[:20] + struct.pack('<Q', fileSize - 8) + header[28:]
+		else:
+			header = b'RIFF' + struct.pack('<I', fileSize - 8) + b'WAVE' + body + b'data' + struct.pack('<I', dataSize)
+		return header
+
+	def write(self, block):
+		""" Queues one raw block (ndarray or bytes-like in the hardware format) """
+		src = asBytes(block)
+		offset = 0
+		while offset < src.size:
+			count = min(src.size - offset, self.chunk.size - self.fill)
+			dst = self.chunk[self.fill:self.fill + count]
+			if self.hwtype == HWtype.USBdataS8:
+				# WAV 8-bit PCM is unsigned
+				np.bitwise_xor(src[offset:offset + count], 0x80, out = dst)
+			else:
+				dst[...] = src[offset:offset + count]
+			self.fill += count
+			offset += count
+			if self.fill == self.chunk.size:
+				self.flush()
+
+	def flush(self):
+		""" Writes the gathered chunk to disk """
+		if self.fill:
+			self.file.write(self.chunk[:self.fill])
+			self.dataBytes += self.fill
+			self.fill = 0
+		if self.headerInterval is not None and time.monotonic() - self.lastHeader >= self.headerInterval:
+			self.updateHeader()
+
+	def updateHeader(self, sync = False):
+		""" Rewrites the header for the data written so far """
+		if not self.rf64 and self.dataOffset + self.dataBytes - 8 > RIFF_MAX:
+			self.rf64 = True
+		header = self.buildHeader()
+		if len(header) != self.dataOffset:
+			raise RuntimeError('WAV header size changed')
+		self.file.flush()
+		if sync:
+			os.fsync(self.file.fileno())
+		position = self.file.tell()
+		self.file.seek(0)
+		self.file.write(header)
+		self.file.seek(position)
+		self.file.flush()
+		if sync:
+			os.fsync(self.file.fileno())
+		self.lastHeader = time.monotonic()
+
+	def close(self):
+		""" Flushes the remaining data and finalizes the header """
+		if self.file is None:
+			return
+		if self.fill:
+			self.file.write(self.chunk[:self.fill])
+			self.dataBytes += self.fill
+			self.fill = 0
+		# data reaches the disk before the header that describes it
+		self.updateHeader(sync = True)
+		self.file.close()
+		self.file = None
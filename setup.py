@@ -27,6 +27,7 @@ Python package and examples to work with ExtIO driver based Software Defined Rad
     long_description_content_type="text/markdown",
     url="https://github.com/robojay/ExtIO-Python",
     packages=setuptools.find_packages(),
+    install_requires=["numpy"],
     classifiers=[
         "Programming Language :: Python :: 3.8",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,40 @@
+"""
+AsyncIQStream delivers status events in order with the blocks, even when the consumer never has to await
+"""
+
+import asyncio
+import time
+
+from extio import *
+
+
+def test_events_with_busy_consumer():
+	changedLO = ExtIO.ExtHWstatus.Changed_LO.value
+	extIO = SimulatedExtIO(iqPairs = 1024, paced = False, events = [(0.002 * i, changedLO) for i in range(1, 100)])
+
+	async def consume():
+		radio = AsyncRadio(extIO, queueEntries = 256)
+		await radio.open()
+		emitted = []
+		radio.iqStream.addListener(emitted.append)
+		await radio.start(7000000)
+		seen = []
+		lastSeq = None
+		began = time.monotonic()
+		async for item in radio.stream(withEvents = True):
+			if isinstance(item, StreamEvent):
+				# never after a block it applies to
+				assert lastSeq is None or item.seq > lastSeq
+				seen.append(item)
+			else:
+				lastSeq = item[0]
+				# slower than the driver, so the ring never runs dry and blocks() never awaits
+				time.sleep(0.0002)
+			if len(seen) == 99 or time.monotonic() - began > 5.0:
+				break
+		await radio.close()
+		return emitted, seen
+
+	emitted, seen = asyncio.run(consume())
+	assert len(emitted) == 99
+	assert [event.seq for event in seen] == [event.seq for event in emitted]
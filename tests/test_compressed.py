@@ -0,0 +1,22 @@
+"""
+CompressedWriter / CompressedReader round trip
+"""
+
+import numpy as np
+
+from extio import *
+
+
+def test_length_is_samples(tmp_path):
+	path = str(tmp_path / 'capture.iqz')
+	rng = np.random.default_rng(0)
+	data = rng.integers(-2000, 2000, size = (10000, 2), dtype = np.int16)
+	writer = CompressedWriter(path, ExtIO.ExtHWtype.USBdata16, 1.0e6, 7000000, delta = True, chunkBytes = 4096)
+	for start in range(0, data.shape[0], 1024):
+		writer.write(data[start:start + 1024])
+	writer.close()
+
+	with CompressedReader(path) as reader:
+		assert len(reader) == data.shape[0]
+		assert reader.chunkCount == -(-data.nbytes // 4096)
+		np.testing.assert_array_equal(reader.read(0, len(reader)), data)
@@ -0,0 +1,17 @@
+"""
+Decoder.toInt16 and Decoder.decode agree on the sample centre
+"""
+
+import numpy as np
+
+from extio import *
+
+
+def test_u8_int16_has_no_dc_offset():
+	decoder = Decoder(ExtIO.ExtHWtype.USBdataU8)
+	raw = np.arange(256, dtype = np.uint8).repeat(2).reshape(-1, 2)
+	values = decoder.toInt16(raw)
+	# every code maps to (code - 127.5) * 256, symmetric around zero like decode()
+	np.testing.assert_array_equal(values[:, 0], (np.arange(256) * 256 - 32640).astype(np.int16))
+	assert values.astype(np.int64).sum() == 0
+	assert decoder.decode(raw).real.sum() == 0.0
@@ -0,0 +1,45 @@
+"""
+Several consumers of one fanout stream: a SigMF recording and a live display side by side
+"""
+
+import numpy as np
+
+from extio import *
+from test_stream_wait import startStream, stopStream
+
+
+def test_record_and_display(tmp_path):
+	extIO, stream = startStream(fanout = True)
+	basePath = str(tmp_path / 'capture')
+	try:
+		recorder = SigMFRecorder(basePath, stream, pollInterval = 0.1)
+		display = stream.subscribe(Subscriber.SKIP_TO_LATEST, name = 'display')
+		spectrogram = Spectrogram(256)
+		decoder = Decoder(stream.type)
+		iqComplex = np.empty(stream.entrySize, dtype = np.complex64)
+		recorder.start()
+
+		rows = 0
+		while rows < 64:
+			assert stream.wait(1, timeout = 2.0, reader = display) >= 1
+			entry = display.peek()
+			while entry is not None:
+				seq, block = entry
+				decoder.decode(block, iqComplex)
+				display.advance(seq)
+				rows += len(spectrogram.push(iqComplex))
+				entry = display.peek()
+
+		recorder.stop = True
+		recorder.join(timeout = 5.0)
+		assert not recorder.is_alive()
+		stream.unsubscribe(display)
+	finally:
+		stopStream(extIO, stream)
+
+	# the recorder read its own Subscriber, the display did not take blocks from it
+	assert recorder.totalSamples > 0
+	assert recorder.gaps == 0
+	assert recorder.subscriber not in stream.subscribers
+	with IQFileReader(basePath + '.sigmf-meta') as reader:
+		assert len(reader) == recorder.totalSamples
@@ -0,0 +1,51 @@
+"""
+Replay of a SigMF recording that continued in a second part after a sample format change
+"""
+
+import time
+
+from extio import *
+from extio.iqstream import SAMPLE_DTYPES
+
+
+def test_replay_part_after_format_change(tmp_path):
+	extIO = SimulatedExtIO(sampleRates = [1.0e6], iqPairs = 4096, events = [(0.05, ExtIO.ExtHWstatus.SampleFmt_IQ_INT24)])
+	extIO.InitHW()
+	stream = IQStream(extIO, list(SAMPLE_DTYPES), queueEntries = 64)
+	extIO.SetCallback(stream.iqStreamCallback)
+	extIO.OpenHW()
+	stream.sampleRate = stream.capabilities.refresh().sampleRate
+	basePath = str(tmp_path / 'sg')
+	recorder = SigMFRecorder(basePath, stream, pollInterval = 0.05)
+	recorder.start()
+	extIO.StartHW(7000000)
+	stream.initBuffers()
+	stream.enabled = True
+	time.sleep(0.2)
+	stream.enabled = False
+	extIO.StopHW()
+	recorder.stop = True
+	recorder.join()
+	extIO.CloseHW()
+	assert recorder.paths == [basePath, basePath + '-1']
+
+	# the second part starts with the format annotation, which must not be replayed
+	replay = ReplayExtIO(basePath + '-1.sigmf-meta', paced = False)
+	hwtype = replay.reader.hwtype
+	replay.InitHW()
+	events = []
+	stream = IQStream(replay, list(SAMPLE_DTYPES), queueEntries = 64, policy = IQRing.DROP_OLDEST)
+	stream.addListener(events.append)
+	replay.SetCallback(stream.iqStreamCallback)
+	replay.OpenHW()
+	stream.sampleRate = stream.capabilities.refresh().sampleRate
+	replay.StartHW(7000000)
+	stream.initBuffers()
+	stream.enabled = True
+	assert replay.done.wait(5.0)
+	replay.CloseHW()
+	stream.close()
+
+	assert stream.type == hwtype
+	assert replay.hwtype == hwtype
+	assert all(event.hwtype == hwtype for event in events)
@@ -0,0 +1,62 @@
+"""
+SigMFRecorder drops blocks the producer overwrote while they were being recorded
+"""
+
+import numpy as np
+
+from extio import *
+from test_stream_wait import startStream, stopStream
+
+
+class LappingReader():
+	""" Subscriber whose producer laps it while block lapSeq is being copied """
+
+	def __init__(self, ring, subscriber, lapSeq, iqPairs):
+		self.ring = ring
+		self.subscriber = subscriber
+		self.lapSeq = lapSeq
+		self.iqPairs = iqPairs
+		self.lapped = False
+
+	def publish(self, count):
+		for i in range(count):
+			seq = self.ring.nextSeq
+			self.ring.put(np.full((self.iqPairs, 2), seq, dtype = np.int16), (seq * self.iqPairs, 0, 7000000, 1.0e6))
+
+	def peek(self):
+		return self.subscriber.peek()
+
+	def info(self, seq):
+		return self.subscriber.info(seq)
+
+	def advance(self, seq = None):
+		self.subscriber.advance(seq)
+
+	def isValid(self, seq):
+		if seq == self.lapSeq and not self.lapped:
+			self.lapped = True
+			self.publish(self.ring.entries)
+		return self.subscriber.isValid(seq)
+
+
+def test_lapped_block_is_not_recorded(tmp_path):
+	extIO, stream = startStream()
+	stream.enabled = False
+	basePath = str(tmp_path / 'lapped')
+	try:
+		recorder = SigMFRecorder(basePath, stream)
+		recorder.openPart()
+		ring = FanoutRing(4, 16, np.int16)
+		reader = LappingReader(ring, ring.subscribe(), 1, 16)
+		reader.publish(3)
+		recorder.drain(reader)
+		recorder.closePart()
+	finally:
+		stopStream(extIO, stream)
+
+	# block 1 was overwritten during its copy, 2 and 3 before they were read
+	data = np.fromfile(basePath + '.sigmf-data', dtype = np.int16).reshape(-1, 16, 2)
+	assert list(data[:, 0, 0]) == [0, 4, 5, 6]
+	assert all((block == block[0, 0]).all() for block in data)
+	assert recorder.gaps == 1
+	assert any(annotation['core:comment'] == 'Gap of 48 samples' for annotation in recorder.meta['annotations'])
@@ -0,0 +1,20 @@
+"""
+Spectrogram columns line up with frequencies() for even and odd FFT sizes
+"""
+
+import numpy as np
+import pytest
+
+from extio import *
+
+
+@pytest.mark.parametrize('fftSize', [5, 7, 8])
+@pytest.mark.parametrize('average', [1, 2])
+def test_columns_match_frequencies(fftSize, average):
+	sampleRate = 1000.0
+	spectrogram = Spectrogram(fftSize, window = 'rect', average = average, floor = -300.0)
+	frequencies = spectrogram.frequencies(sampleRate)
+	for tone in np.fft.fftfreq(fftSize, 1.0 / sampleRate):
+		iq = np.exp(2j * np.pi * tone * np.arange(4 * average * fftSize) / sampleRate).astype(np.complex64)
+		rows = spectrogram.compute(iq)
+		assert frequencies[np.argmax(rows[0])] == tone
@@ -0,0 +1,59 @@
+"""
+IQStream.wait() / read() on plain, fanout and shared streams, driven by SimulatedExtIO
+"""
+
+import pytest
+
+from extio import *
+
+
+def startStream(**options):
+	extIO = SimulatedExtIO(sampleRates = [1.0e6], iqPairs = 4096)
+	extIO.InitHW()
+	stream = IQStream(extIO, [extIO.hwtype], queueEntries = 16, **options)
+	extIO.SetCallback(stream.iqStreamCallback)
+	extIO.OpenHW()
+	stream.sampleRate = stream.capabilities.refresh().sampleRate
+	extIO.StartHW(7000000)
+	stream.initBuffers()
+	stream.enabled = True
+	return extIO, stream
+
+def stopStream(extIO, stream):
+	stream.enabled = False
+	extIO.StopHW()
+	extIO.CloseHW()
+	stream.close()
+
+
+def test_wait_plain_stream():
+	extIO, stream = startStream()
+	try:
+		assert stream.wait(4, timeout = 2.0) >= 4
+		assert len(stream.read(4, timeout = 2.0)) == 4
+	finally:
+		stopStream(extIO, stream)
+
+def test_wait_fanout_stream():
+	extIO, stream = startStream(fanout = True)
+	try:
+		subscriber = stream.subscribe()
+		with pytest.raises(ValueError):
+			stream.wait(timeout = 0.1)
+		assert stream.wait(4, timeout = 2.0, reader = subscriber) >= 4
+		blocks = stream.read(4, timeout = 2.0, reader = subscriber)
+		assert len(blocks) == 4
+		assert [seq for seq, block in blocks] == list(range(blocks[0][0], blocks[0][0] + 4))
+	finally:
+		stopStream(extIO, stream)
+
+def test_wait_shared_stream():
+	extIO, stream = startStream(shared = True)
+	try:
+		with pytest.raises(ValueError):
+			stream.wait(timeout = 0.1)
+		with SharedRingReader(stream.ring.name) as reader:
+			assert stream.wait(4, timeout = 2.0, reader = reader) >= 4
+			assert len(stream.read(4, timeout = 2.0, reader = reader)) == 4
+	finally:
+		stopStream(extIO, stream)